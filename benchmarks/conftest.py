@@ -0,0 +1,405 @@
+"""
+富途接口性能测试公共设置
+
+依赖pytest-benchmark，不在默认测试路径中，需要单独运行。基准结果与机器相关，不提交到仓库，
+先在修改前的代码上保存基准，再在修改后比较：
+    pytest benchmarks --save-baseline                  保存本机结果为基准
+    pytest benchmarks                                  与基准比较，超过阈值时失败
+    pytest benchmarks --regression-threshold=0.5       放宽回退阈值，p99按两倍阈值判断
+
+每项测试除pytest-benchmark的计时外，另外统计：
+    throughput      每秒处理的条数，按最快一轮计算，受机器负载的影响较小
+    p99_us          单条处理耗时的99分位数（微秒）
+    peak_kb         处理一遍全部数据的内存分配峰值（KB，tracemalloc）
+"""
+
+import json
+import platform
+import tracemalloc
+from pathlib import Path
+from time import perf_counter_ns
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pytest
+from pandas import DataFrame, date_range
+
+from vnpy.event import EventEngine
+
+from futu.common.pb.Qot_UpdateBasicQot_pb2 import Response as QuoteResponse
+from futu.common.pb.Qot_UpdateOrderBook_pb2 import Response as OrderBookResponse
+from futu.common.pb.Trd_UpdateOrder_pb2 import Response as OrderResponse
+from futu.common.pb.Trd_UpdateOrderFill_pb2 import Response as DealResponse
+
+from vnpy_futu import FutuGateway
+
+
+BASELINE_PATH: Path = Path(__file__).parent.joinpath("baseline.json")
+PUSH_COUNT: int = 1000                  # 每项推送测试的推送条数
+CODE_COUNT: int = 200                   # 推送轮流涉及的合约数
+KLINE_ROWS: int = 60000                 # 历史K线转换测试的行数
+BASICINFO_ROWS: int = 20000             # 合约信息转换测试的行数
+LATENCY_PASSES: int = 5                 # 统计单条耗时分布时遍历数据的次数
+
+# 本次运行的统计结果，测试名 -> 指标
+RESULTS: Dict[str, Dict[str, float]] = {}
+
+
+def pytest_addoption(parser) -> None:
+    """性能测试命令行选项"""
+    parser.addoption("--baseline-file", default=str(BASELINE_PATH), help="基准结果文件")
+    parser.addoption("--save-baseline", action="store_true", help="保存本次结果为基准")
+    parser.addoption("--regression-threshold", type=float, default=0.3, help="判定回退的相对变化阈值")
+
+
+@pytest.fixture
+def measure(benchmark, request) -> Callable:
+    """
+    运行一项性能测试并记录统计结果。
+
+    measure(process, payloads, rows=1, reset=None)
+        process     处理单条数据的函数
+        payloads    数据列表，每次计时处理全部数据
+        rows        每条数据包含的行数，用于计算吞吐量
+        reset       每遍处理前调用，用于清除去重等状态
+    """
+    def run(
+        process: Callable[[Any], Any],
+        payloads: List[Any],
+        rows: int = 1,
+        reset: Optional[Callable[[], Any]] = None
+    ) -> None:
+        def process_all() -> None:
+            if reset:
+                reset()
+            for payload in payloads:
+                process(payload)
+
+        # 分配统计单独运行，避免tracemalloc影响计时
+        process_all()
+        tracemalloc.start()
+        process_all()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        # 单条耗时分布，只有一条数据时使用每轮计时
+        latencies: List[int] = []
+        if len(payloads) > 1:
+            for _ in range(LATENCY_PASSES):
+                if reset:
+                    reset()
+                for payload in payloads:
+                    start: int = perf_counter_ns()
+                    process(payload)
+                    latencies.append(perf_counter_ns() - start)
+
+        benchmark(process_all)
+
+        if not benchmark.stats:
+            return
+        stats: Any = benchmark.stats.stats
+
+        if not latencies:
+            latencies = [t * 1e9 for t in stats.data]
+
+        result: Dict[str, float] = {
+            "throughput": len(payloads) * rows / stats.min,
+            "p99_us": float(np.percentile(latencies, 99)) / 1000,
+            "peak_kb": peak / 1024,
+        }
+        benchmark.extra_info.update(result)
+        RESULTS[request.node.name] = result
+
+    return run
+
+
+def compare_results(baseline: Dict[str, Dict[str, float]], threshold: float) -> List[str]:
+    """与基准比较，返回回退的指标描述"""
+    regressions: List[str] = []
+
+    for name, result in RESULTS.items():
+        base: Optional[Dict[str, float]] = baseline.get(name, None)
+        if not base:
+            continue
+
+        if result["throughput"] < base["throughput"] * (1 - threshold):
+            regressions.append(f"{name} throughput {base['throughput']:.0f} -> {result['throughput']:.0f}")
+        if result["p99_us"] > base["p99_us"] * (1 + threshold * 2):
+            regressions.append(f"{name} p99_us {base['p99_us']:.1f} -> {result['p99_us']:.1f}")
+        if result["peak_kb"] > base["peak_kb"] * (1 + threshold):
+            regressions.append(f"{name} peak_kb {base['peak_kb']:.0f} -> {result['peak_kb']:.0f}")
+
+    return regressions
+
+
+def pytest_sessionfinish(session, exitstatus) -> None:
+    """保存基准或与基准比较，出现回退时测试失败"""
+    config = session.config
+    config.futu_regressions = []
+    config.futu_baseline = {}
+
+    if not RESULTS:
+        return
+
+    path: Path = Path(config.getoption("--baseline-file"))
+
+    if config.getoption("--save-baseline"):
+        data: dict = {
+            "machine": platform.platform(),
+            "python": platform.python_version(),
+            "results": RESULTS,
+        }
+        with open(path, mode="w", encoding="UTF-8") as f:
+            json.dump(data, f, indent=4)
+        return
+
+    if not path.exists():
+        return
+
+    with open(path, encoding="UTF-8") as f:
+        config.futu_baseline = json.load(f)["results"]
+
+    config.futu_regressions = compare_results(config.futu_baseline, config.getoption("--regression-threshold"))
+    if config.futu_regressions and session.exitstatus == 0:
+        session.exitstatus = 1
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config) -> None:
+    """输出吞吐量、p99耗时和内存分配，以及相对基准的变化"""
+    if not RESULTS:
+        return
+
+    baseline: Dict[str, Dict[str, float]] = getattr(config, "futu_baseline", {})
+
+    terminalreporter.section("futu benchmark")
+    terminalreporter.write_line(f"{'name':<32}{'rows/s':>14}{'p99_us':>10}{'peak_kb':>10}{'vs baseline':>14}")
+
+    for name, result in RESULTS.items():
+        base: Optional[Dict[str, float]] = baseline.get(name, None)
+        change: str = f"{result['throughput'] / base['throughput'] - 1:+.1%}" if base else "-"
+        terminalreporter.write_line(
+            f"{name:<32}{result['throughput']:>14,.0f}{result['p99_us']:>10.1f}{result['peak_kb']:>10.0f}{change:>14}"
+        )
+
+    if not baseline and not config.getoption("--save-baseline"):
+        terminalreporter.write_line("未找到基准结果，使用--save-baseline保存")
+
+    for regression in getattr(config, "futu_regressions", []):
+        terminalreporter.write_line(f"REGRESSION {regression}", red=True)
+
+
+@pytest.fixture
+def gateway() -> FutuGateway:
+    """创建网关，事件输出替换为空函数，只统计网关自身的处理耗时"""
+    gateway: FutuGateway = FutuGateway(EventEngine(), "FUTU")
+    for name in ("on_tick", "on_order", "on_trade", "on_contract", "on_event", "write_log"):
+        setattr(gateway, name, lambda *args: None)
+    return gateway
+
+
+def generate_codes() -> List[str]:
+    """推送涉及的港股代码"""
+    return [f"{i:05d}" for i in range(1, CODE_COUNT + 1)]
+
+
+@pytest.fixture(scope="session")
+def quote_pushes() -> List[Any]:
+    """报价推送，每条包含一个合约"""
+    pushes: List[Any] = []
+
+    for i, code in zip(range(PUSH_COUNT), generate_codes() * (PUSH_COUNT // CODE_COUNT)):
+        rsp: Any = QuoteResponse()
+        rsp.retType = 0
+
+        quote: Any = rsp.s2c.basicQotList.add()
+        quote.security.market = 1
+        quote.security.code = code
+        quote.isSuspended = False
+        quote.listTime = "2000-01-01"
+        quote.priceSpread = 0.02
+        quote.updateTime = f"2025-01-02 10:{i // 600:02d}:{i // 10 % 60:02d}.{i % 10}00"
+        quote.highPrice = 101 + i * 0.01
+        quote.openPrice = 100
+        quote.lowPrice = 99
+        quote.curPrice = 100 + i * 0.01
+        quote.lastClosePrice = 99.5
+        quote.volume = 10000 + i * 100
+        quote.turnover = (10000 + i * 100) * 100.0
+        quote.turnoverRate = 0.01
+        quote.amplitude = 2
+
+        pushes.append(rsp)
+
+    return pushes
+
+
+@pytest.fixture(scope="session")
+def orderbook_pushes() -> List[Any]:
+    """十档盘口推送"""
+    pushes: List[Any] = []
+
+    for i, code in zip(range(PUSH_COUNT), generate_codes() * (PUSH_COUNT // CODE_COUNT)):
+        rsp: Any = OrderBookResponse()
+        rsp.retType = 0
+        rsp.s2c.security.market = 1
+        rsp.s2c.security.code = code
+
+        for n in range(10):
+            bid: Any = rsp.s2c.orderBookBidList.add()
+            bid.price = 100 - n * 0.02 + i % 7 * 0.02
+            bid.volume = 1000 * (n + 1)
+            bid.orederCount = n + 1
+
+            ask: Any = rsp.s2c.orderBookAskList.add()
+            ask.price = 100.02 + n * 0.02 + i % 7 * 0.02
+            ask.volume = 1000 * (n + 1)
+            ask.orederCount = n + 1
+
+        pushes.append(rsp)
+
+    return pushes
+
+
+@pytest.fixture(scope="session")
+def order_pushes() -> List[Any]:
+    """委托推送，状态在已提交、部分成交、全部成交之间轮换"""
+    pushes: List[Any] = []
+
+    for i, code in zip(range(PUSH_COUNT), generate_codes() * (PUSH_COUNT // CODE_COUNT)):
+        rsp: Any = OrderResponse()
+        rsp.retType = 0
+        rsp.s2c.header.trdEnv = 1
+        rsp.s2c.header.accID = 1
+        rsp.s2c.header.trdMarket = 1
+
+        order: Any = rsp.s2c.order
+        order.trdSide = 1 + i % 2
+        order.orderType = 1
+        order.orderStatus = (5, 10, 11)[i % 3]
+        order.orderID = i + 1
+        order.orderIDEx = str(i + 1)
+        order.code = code
+        order.name = ""
+        order.qty = 1000
+        order.price = 100 + i % 50 * 0.02
+        order.createTime = f"2025-01-02 10:{i // 600:02d}:{i // 10 % 60:02d}.{i % 10}00"
+        order.updateTime = order.createTime
+        order.fillQty = (0, 500, 1000)[i % 3]
+        order.secMarket = 1
+
+        pushes.append(rsp)
+
+    return pushes
+
+
+@pytest.fixture(scope="session")
+def deal_pushes() -> List[Any]:
+    """成交推送"""
+    pushes: List[Any] = []
+
+    for i, code in zip(range(PUSH_COUNT), generate_codes() * (PUSH_COUNT // CODE_COUNT)):
+        rsp: Any = DealResponse()
+        rsp.retType = 0
+        rsp.s2c.header.trdEnv = 1
+        rsp.s2c.header.accID = 1
+        rsp.s2c.header.trdMarket = 1
+
+        deal: Any = rsp.s2c.orderFill
+        deal.trdSide = 1 + i % 2
+        deal.fillID = i + 1
+        deal.fillIDEx = str(i + 1)
+        deal.orderIDEx = str(i // 2 + 1)
+        deal.code = code
+        deal.name = ""
+        deal.qty = 500
+        deal.price = 100 + i % 50 * 0.02
+        deal.createTime = f"2025-01-02 10:{i // 600:02d}:{i // 10 % 60:02d}"
+        deal.secMarket = 1
+
+        pushes.append(rsp)
+
+    return pushes
+
+
+@pytest.fixture(scope="session")
+def order_frames(order_pushes) -> List[DataFrame]:
+    """SDK委托查询结果，每个DataFrame一行，与推送内容相同"""
+    return [
+        DataFrame([{
+            "code": f"HK.{rsp.s2c.order.code}",
+            "order_id": rsp.s2c.order.orderIDEx,
+            "trd_side": ("BUY", "SELL")[rsp.s2c.order.trdSide - 1],
+            "order_status": {5: "SUBMITTED", 10: "FILLED_PART", 11: "FILLED_ALL"}[rsp.s2c.order.orderStatus],
+            "price": rsp.s2c.order.price,
+            "qty": rsp.s2c.order.qty,
+            "dealt_qty": rsp.s2c.order.fillQty,
+            "create_time": rsp.s2c.order.createTime,
+        }])
+        for rsp in order_pushes
+    ]
+
+
+@pytest.fixture(scope="session")
+def deal_frames(deal_pushes) -> List[DataFrame]:
+    """SDK成交查询结果，每个DataFrame一行，与推送内容相同"""
+    return [
+        DataFrame([{
+            "code": f"HK.{rsp.s2c.orderFill.code}",
+            "deal_id": rsp.s2c.orderFill.fillID,
+            "order_id": rsp.s2c.orderFill.orderIDEx,
+            "trd_side": ("BUY", "SELL")[rsp.s2c.orderFill.trdSide - 1],
+            "price": rsp.s2c.orderFill.price,
+            "qty": rsp.s2c.orderFill.qty,
+            "create_time": rsp.s2c.orderFill.createTime,
+        }])
+        for rsp in deal_pushes
+    ]
+
+
+@pytest.fixture(scope="session")
+def kline_frame() -> DataFrame:
+    """SDK历史K线查询结果"""
+    index: np.ndarray = np.arange(KLINE_ROWS)
+    close: np.ndarray = 100 + np.sin(index / 100)
+
+    return DataFrame({
+        "code": "HK.00700",
+        "name": "腾讯控股",
+        "time_key": date_range("2020-01-02 09:31", periods=KLINE_ROWS, freq="min").strftime("%Y-%m-%d %H:%M:%S"),
+        "open": close - 0.01,
+        "close": close,
+        "high": close + 0.05,
+        "low": close - 0.05,
+        "pe_ratio": 20.0,
+        "turnover_rate": 0.001,
+        "volume": 1000 + index % 100,
+        "turnover": (1000 + index % 100) * close,
+        "change_rate": 0.0,
+        "last_close": close - 0.01,
+    })
+
+
+@pytest.fixture(scope="session")
+def basicinfo_frame() -> DataFrame:
+    """SDK合约信息查询结果"""
+    index: np.ndarray = np.arange(BASICINFO_ROWS)
+
+    return DataFrame({
+        "code": [f"HK.{i:05d}" for i in index + 1],
+        "name": [f"合约{i}" for i in index + 1],
+        "lot_size": 100 * (1 + index % 10),
+        "stock_type": "STOCK",
+        "stock_child_type": "N/A",
+        "stock_owner": "",
+        "option_type": "N/A",
+        "strike_time": "",
+        "strike_price": np.nan,
+        "suspension": False,
+        "listing_date": "2000-01-01",
+        "stock_id": index + 1,
+        "delisting": False,
+        "index_option_type": "N/A",
+        "main_contract": False,
+        "last_trade_time": "",
+        "exchange_type": "HK_MAINBOARD",
+    })
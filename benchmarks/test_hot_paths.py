@@ -0,0 +1,97 @@
+"""
+富途接口热点路径性能测试
+"""
+
+from datetime import datetime
+from functools import partial
+
+from vnpy.trader.constant import Exchange, Interval
+from vnpy.trader.object import HistoryRequest
+
+from vnpy_futu.vnpy_futu.futu_gateway import (
+    FutuQuoteHandler, FutuOrderBookHandler, FutuOrderHandler, FutuDealHandler,
+    convert_kline_array, convert_contract_rows
+)
+from vnpy_futu.vnpy_futu.push_parser import FutuQuoteRecord, FutuOrderBookRecord
+
+
+def test_quote_push(measure, gateway, quote_pushes):
+    """报价推送，快速解析"""
+    handler = FutuQuoteHandler(gateway.quote_api)
+    measure(handler.on_recv_rsp, quote_pushes)
+
+
+def test_quote_push_sdk(measure, gateway, quote_pushes):
+    """报价推送，SDK解析，速度较慢只取前200条"""
+    gateway.quote_api.fast_push = False
+    handler = FutuQuoteHandler(gateway.quote_api)
+    measure(handler.on_recv_rsp, quote_pushes[:200])
+
+
+def test_process_quote(measure, gateway, quote_pushes):
+    """处理SDK解析的报价字典"""
+    payloads = []
+    for rsp in quote_pushes:
+        record = FutuQuoteRecord.from_pb(rsp.s2c.basicQotList[0])
+        payloads.append((record.code, {key: getattr(record, key) for key in FutuQuoteRecord.__slots__}))
+
+    measure(lambda payload: gateway.quote_api.process_quote(*payload), payloads)
+
+
+def test_orderbook_push(measure, gateway, orderbook_pushes):
+    """十档盘口推送，快速解析"""
+    handler = FutuOrderBookHandler(gateway.quote_api)
+    measure(handler.on_recv_rsp, orderbook_pushes)
+
+
+def test_process_orderbook(measure, gateway, orderbook_pushes):
+    """处理SDK解析的盘口字典"""
+    payloads = []
+    for rsp in orderbook_pushes:
+        record = FutuOrderBookRecord.from_pb(rsp.s2c)
+        payloads.append({"code": record.code, "Bid": record.bids, "Ask": record.asks})
+
+    measure(gateway.quote_api.process_orderbook, payloads)
+
+
+def test_order_push(measure, gateway, order_pushes):
+    """委托推送，快速解析"""
+    handler = FutuOrderHandler(gateway.trade_api)
+    measure(handler.on_recv_rsp, order_pushes)
+
+
+def test_process_order(measure, gateway, order_frames):
+    """处理SDK返回的委托DataFrame"""
+    measure(gateway.trade_api.process_order, order_frames)
+
+
+def test_deal_push(measure, gateway, deal_pushes):
+    """成交推送，快速解析，每遍处理前清除成交去重记录"""
+    handler = FutuDealHandler(gateway.trade_api)
+    measure(handler.on_recv_rsp, deal_pushes, reset=gateway.trade_api.trades.clear)
+
+
+def test_process_deal(measure, gateway, deal_frames):
+    """处理SDK返回的成交DataFrame，每遍处理前清除成交去重记录"""
+    measure(gateway.trade_api.process_deal, deal_frames, reset=gateway.trade_api.trades.clear)
+
+
+def test_history_conversion(measure, gateway, kline_frame):
+    """历史K线DataFrame转换为BarData列表"""
+    req = HistoryRequest(
+        symbol="00700",
+        exchange=Exchange.SEHK,
+        interval=Interval.MINUTE,
+        start=datetime(2020, 1, 2),
+        end=datetime(2020, 3, 1),
+    )
+
+    def convert(data):
+        return gateway.quote_api.generate_bars(req, convert_kline_array(data))
+
+    measure(convert, [kline_frame], rows=len(kline_frame))
+
+
+def test_contract_conversion(measure, basicinfo_frame):
+    """合约信息DataFrame转换为合约信息表"""
+    measure(partial(convert_contract_rows, security_type="STOCK"), [basicinfo_frame], rows=len(basicinfo_frame))
@@ -44,32 +44,37 @@ def run():
     sleep(5)
 
     # 设置下载参数
-    symbol = "700"
-    exchange = Exchange.HKEX
+    symbols = ["00700", "09988", "03690"]
+    exchange = Exchange.SEHK
     interval = Interval.DAILY
 
     end = datetime.now()
     start = end - timedelta(days=365)  # 下载过去一年的数据
 
     # 创建历史数据请求
-    req = HistoryRequest(
-        symbol=symbol,
-        exchange=exchange,
-        interval=interval,
-        start=start,
-        end=end
-    )
-
-    # 获取历史数据
-    bars = main_engine.query_history(req, "FUTU")
-
-    if not bars:
-        print("获取历史数据失败")
-    else:
-        print(f"成功获取历史数据: {len(bars)}条")
+    reqs = [
+        HistoryRequest(
+            symbol=symbol,
+            exchange=exchange,
+            interval=interval,
+            start=start,
+            end=end
+        )
+        for symbol in symbols
+    ]
+
+    # 并发获取历史数据，每完成一个合约立即保存
+    gateway = main_engine.get_gateway("FUTU")
+
+    for req, bars in gateway.query_history_batch(reqs):
+        if not bars:
+            print(f"获取历史数据失败: {req.vt_symbol}")
+            continue
+
+        print(f"成功获取{req.vt_symbol}历史数据: {len(bars)}条")
 
         # 将数据保存到CSV文件
-        filename = f"{symbol}_{exchange.value}_{interval.value}.csv"
+        filename = f"{req.symbol}_{exchange.value}_{interval.value}.csv"
         with open(filename, "w", newline="") as f:
             writer = csv.writer(f)
             writer.writerow(["datetime", "open", "high", "low", "close", "volume"])
@@ -25,7 +25,7 @@ setuptools.setup(
         "Source Code": "https://github.com/vnpy/vnpy_futu",
         "Bug Tracker": "https://github.com/vnpy/vnpy_futu/issues",
     },
-    packages=setuptools.find_packages(exclude=["tests", "examples"]),
+    packages=setuptools.find_packages(exclude=["tests", "benchmarks", "examples"]),
     include_package_data=True,
     package_data={"": ["*.json", "*.mo", "*.md"]},
     zip_safe=False,
@@ -0,0 +1,1014 @@
+"""
+富途OpenD本地模拟服务
+
+实现OpenQuoteContext和Open*TradeContext用到的FT协议子集，用于离线集成测试和压力测试：
+    连接：InitConnect、KeepAlive
+    行情：Qot_Sub、Qot_GetSubInfo、Qot_GetStaticInfo、Qot_GetSecuritySnapshot、
+          Qot_RequestHistoryKL、Qot_RequestHistoryKLQuota
+    行情推送：Qot_UpdateBasicQot、Qot_UpdateOrderBook、Qot_UpdateTicker
+    交易：Trd_GetAccList、Trd_UnlockTrade、Trd_SubAccPush、Trd_GetFunds、Trd_GetPositionList、
+          Trd_GetOrderList、Trd_GetOrderFillList、Trd_PlaceOrder、Trd_ModifyOrder（含全部撤单）
+    交易推送：Trd_UpdateOrder、Trd_UpdateOrderFill
+
+只支持不加密的protobuf格式，与未配置RSA私钥的OpenD一致，其他协议返回错误。
+
+命令行启动压力测试服务：
+    python -m vnpy_futu.tests.opend_stub --port 11111 --rate 1000:60 --rate 20000:10 HK.00700 HK.09988
+"""
+
+import socket
+import struct
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from hashlib import sha1
+from importlib import import_module
+from itertools import cycle
+from threading import Thread, Lock, Event
+from time import perf_counter, sleep, time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from futu.common.constant import MESSAGE_HEAD_FMT, ProtoId
+from futu.common.utils import split_stock_str
+import futu.common.pb.Qot_Common_pb2 as Qot_Common
+import futu.common.pb.Trd_Common_pb2 as Trd_Common
+from futu.common.pb.Trd_UpdateOrder_pb2 import S2C as OrderS2C
+from futu.common.pb.Trd_UpdateOrderFill_pb2 import S2C as OrderFillS2C
+
+
+HEAD_SIZE: int = struct.calcsize(MESSAGE_HEAD_FMT)
+PROTO_NAMES: Dict[int, str] = {
+    value: name for name, value in vars(ProtoId).items()
+    if isinstance(value, int) and not name.startswith("_")
+}
+
+ACC_ID_SIMULATE: int = 10001            # 模拟环境账户
+ACC_ID_REAL: int = 20001                # 正式环境账户
+ACC_MARKETS: List[int] = [
+    Trd_Common.TrdMarket_HK,
+    Trd_Common.TrdMarket_US,
+    Trd_Common.TrdMarket_CN,
+    Trd_Common.TrdMarket_HKCC,
+]
+
+# K线类型对应的分钟数，日K线用0表示
+KL_MINUTES: Dict[int, int] = {
+    Qot_Common.KLType_1Min: 1,
+    Qot_Common.KLType_3Min: 3,
+    Qot_Common.KLType_5Min: 5,
+    Qot_Common.KLType_15Min: 15,
+    Qot_Common.KLType_30Min: 30,
+    Qot_Common.KLType_60Min: 60,
+    Qot_Common.KLType_Day: 0,
+}
+KL_SESSIONS: List[Tuple[int, int]] = [(9 * 60 + 30, 12 * 60), (13 * 60, 16 * 60)]
+
+ORDERBOOK_DEPTH: int = 10
+
+# pb文件之间按顶层模块名互相引用，消息类要从引用它的消息上获取，才能直接CopyFrom
+Order: type = type(OrderS2C().order)
+OrderFill: type = type(OrderFillS2C().orderFill)
+TrdHeader: type = type(OrderS2C().header)
+
+
+def get_security(code: str) -> Tuple[int, str]:
+    """富途代码拆分为(行情市场, 代码)"""
+    _, (market, symbol) = split_stock_str(code)
+    return market, symbol
+
+
+def get_trd_sec_market(qot_market: int) -> int:
+    """行情市场转换为交易证券市场"""
+    return {
+        Qot_Common.QotMarket_HK_Security: Trd_Common.TrdSecMarket_HK,
+        Qot_Common.QotMarket_US_Security: Trd_Common.TrdSecMarket_US,
+        Qot_Common.QotMarket_CNSH_Security: Trd_Common.TrdSecMarket_CN_SH,
+        Qot_Common.QotMarket_CNSZ_Security: Trd_Common.TrdSecMarket_CN_SZ,
+    }.get(qot_market, Trd_Common.TrdSecMarket_Unknown)
+
+
+def get_trd_market(trd_sec_market: int) -> int:
+    """交易证券市场转换为交易市场"""
+    return {
+        Trd_Common.TrdSecMarket_HK: Trd_Common.TrdMarket_HK,
+        Trd_Common.TrdSecMarket_US: Trd_Common.TrdMarket_US,
+        Trd_Common.TrdSecMarket_CN_SH: Trd_Common.TrdMarket_CN,
+        Trd_Common.TrdSecMarket_CN_SZ: Trd_Common.TrdMarket_CN,
+    }.get(trd_sec_market, Trd_Common.TrdMarket_Unknown)
+
+
+def get_qot_market(trd_sec_market: int, symbol: str) -> int:
+    """交易证券市场转换为行情市场，未填写市场时按代码判断"""
+    if trd_sec_market == Trd_Common.TrdSecMarket_HK:
+        return Qot_Common.QotMarket_HK_Security
+    elif trd_sec_market == Trd_Common.TrdSecMarket_US:
+        return Qot_Common.QotMarket_US_Security
+    elif trd_sec_market == Trd_Common.TrdSecMarket_CN_SH:
+        return Qot_Common.QotMarket_CNSH_Security
+    elif trd_sec_market == Trd_Common.TrdSecMarket_CN_SZ:
+        return Qot_Common.QotMarket_CNSZ_Security
+    elif symbol.isdigit() and len(symbol) == 6:
+        return Qot_Common.QotMarket_CNSH_Security if symbol.startswith("6") else Qot_Common.QotMarket_CNSZ_Security
+    elif symbol.isdigit():
+        return Qot_Common.QotMarket_HK_Security
+    return Qot_Common.QotMarket_US_Security
+
+
+def now_str() -> str:
+    """当前时间，精确到毫秒"""
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+class StubContract:
+    """模拟合约及其行情状态"""
+
+    def __init__(self, code: str, name: str, lot_size: int, sec_type: int, price: float) -> None:
+        """构造函数"""
+        self.code: str = code
+        self.market, self.symbol = get_security(code)
+        self.id: int = 0
+        self.name: str = name
+        self.lot_size: int = lot_size
+        self.sec_type: int = sec_type
+
+        self.pre_close: float = price
+        self.open_price: float = price
+        self.high_price: float = price
+        self.low_price: float = price
+        self.last_price: float = price
+        self.volume: int = 0
+        self.turnover: float = 0
+        self.sequence: int = 0
+
+    def fill_security(self, security: Any) -> None:
+        """填写Qot_Common.Security"""
+        security.market = self.market
+        security.code = self.symbol
+
+    def tick(self, step: int) -> None:
+        """按步数确定性地更新一笔成交"""
+        move: float = ((step * 7919) % 21 - 10) * 0.01
+        self.last_price = round(max(self.last_price + move, 0.01), 3)
+        self.high_price = max(self.high_price, self.last_price)
+        self.low_price = min(self.low_price, self.last_price)
+
+        volume: int = self.lot_size * (1 + step % 5)
+        self.volume += volume
+        self.turnover += volume * self.last_price
+        self.sequence += 1
+
+
+class StubConnection:
+    """客户端连接，响应和推送通过同一把锁写入"""
+
+    def __init__(self, server: "OpenDStub", sock: socket.socket, conn_id: int) -> None:
+        """构造函数"""
+        self.server: OpenDStub = server
+        self.sock: socket.socket = sock
+        self.conn_id: int = conn_id
+        self.lock: Lock = Lock()
+
+        self.subscriptions: Dict[int, Set[str]] = {}
+        self.acc_push: bool = False
+        self.active: bool = True
+
+        self.thread: Thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        """接收请求并分发处理"""
+        try:
+            while self.active:
+                head: bytes = self.recv(HEAD_SIZE)
+                _, _, proto_id, _, _, serial_no, body_len, _, _ = struct.unpack(MESSAGE_HEAD_FMT, head)
+                body: bytes = self.recv(body_len)
+                self.server.process_request(self, proto_id, serial_no, body)
+        except (OSError, ConnectionError):
+            pass
+        finally:
+            self.close()
+
+    def recv(self, size: int) -> bytes:
+        """接收定长数据"""
+        data: bytes = b""
+        while len(data) < size:
+            chunk: bytes = self.sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("connection closed")
+            data += chunk
+        return data
+
+    def send(self, proto_id: int, pb: Any, serial_no: int = 0) -> bool:
+        """发送一个数据包，连接已断开时返回False"""
+        body: bytes = pb.SerializeToString()
+        head: bytes = struct.pack(
+            MESSAGE_HEAD_FMT, b"F", b"T", proto_id, 0, 0, serial_no, len(body), sha1(body).digest(), b"\x00" * 8
+        )
+        try:
+            with self.lock:
+                self.sock.sendall(head + body)
+        except OSError:
+            self.close()
+            return False
+        return True
+
+    def is_subscribed(self, subtype: int, code: str) -> bool:
+        """是否订阅了合约的某种推送"""
+        codes: Optional[Set[str]] = self.subscriptions.get(subtype, None)
+        return bool(codes) and code in codes
+
+    def close(self) -> None:
+        """关闭连接"""
+        if not self.active:
+            return
+        self.active = False
+
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self.server.remove_connection(self)
+
+
+class OpenDStub:
+    """本地OpenD模拟服务"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, fill_mode: bool = True) -> None:
+        """构造函数，port为0时自动分配端口，fill_mode为True时委托提交后立即全部成交"""
+        self.host: str = host
+        self.port: int = port
+        self.fill_mode: bool = fill_mode
+
+        self.server_sock: Optional[socket.socket] = None
+        self.accept_thread: Optional[Thread] = None
+        self.active: bool = False
+
+        self.connections: List[StubConnection] = []
+        self.connection_lock: Lock = Lock()
+        self.conn_count: int = 0
+
+        self.contracts: Dict[str, StubContract] = {}
+
+        self.trade_lock: Lock = Lock()
+        self.orders: Dict[str, Any] = {}
+        self.fills: List[Any] = []
+        self.order_count: int = 0
+        self.fill_count: int = 0
+
+        # 收到的请求次数，按协议名统计
+        self.request_counts: Dict[str, int] = {}
+        self.unknown_protos: Set[int] = set()
+
+        # 推送生成
+        self.push_thread: Optional[Thread] = None
+        self.push_stop: Event = Event()
+        self.push_count: int = 0
+
+        self.handlers: Dict[int, Callable[[StubConnection, Any, Any], None]] = {
+            ProtoId.InitConnect: self.on_init_connect,
+            ProtoId.KeepAlive: self.on_keep_alive,
+            ProtoId.Qot_Sub: self.on_sub,
+            ProtoId.Qot_GetSubInfo: self.on_get_sub_info,
+            ProtoId.Qot_GetStaticInfo: self.on_get_static_info,
+            ProtoId.Qot_GetSecuritySnapshot: self.on_get_security_snapshot,
+            ProtoId.Qot_RequestHistoryKL: self.on_request_history_kl,
+            ProtoId.Qot_RequestHistoryKLQuota: self.on_request_history_kl_quota,
+            ProtoId.Trd_GetAccList: self.on_get_acc_list,
+            ProtoId.Trd_UnlockTrade: self.on_empty_request,
+            ProtoId.Trd_SubAccPush: self.on_sub_acc_push,
+            ProtoId.Trd_GetFunds: self.on_get_funds,
+            ProtoId.Trd_GetPositionList: self.on_get_position_list,
+            ProtoId.Trd_GetOrderList: self.on_get_order_list,
+            ProtoId.Trd_GetOrderFillList: self.on_get_order_fill_list,
+            ProtoId.Trd_PlaceOrder: self.on_place_order,
+            ProtoId.Trd_ModifyOrder: self.on_modify_order,
+        }
+
+    def start(self) -> int:
+        """启动监听，返回实际端口"""
+        self.server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_sock.bind((self.host, self.port))
+        self.server_sock.listen()
+        self.port = self.server_sock.getsockname()[1]
+
+        self.active = True
+        self.accept_thread = Thread(target=self.run_accept, daemon=True)
+        self.accept_thread.start()
+
+        return self.port
+
+    def stop(self) -> None:
+        """停止推送、断开全部连接并停止监听"""
+        self.stop_pushes()
+
+        self.active = False
+        if self.server_sock:
+            self.server_sock.close()
+            self.server_sock = None
+
+        if self.accept_thread:
+            self.accept_thread.join()
+            self.accept_thread = None
+
+        for conn in list(self.connections):
+            conn.close()
+
+    def run_accept(self) -> None:
+        """接受客户端连接"""
+        self.server_sock.settimeout(0.2)
+
+        while self.active:
+            try:
+                sock, _ = self.server_sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+
+            sock.settimeout(None)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            with self.connection_lock:
+                self.conn_count += 1
+                self.connections.append(StubConnection(self, sock, self.conn_count))
+
+    def remove_connection(self, conn: StubConnection) -> None:
+        """移除已断开的连接"""
+        with self.connection_lock:
+            if conn in self.connections:
+                self.connections.remove(conn)
+
+    def process_request(self, conn: StubConnection, proto_id: int, serial_no: int, body: bytes) -> None:
+        """解析请求，调用对应的处理函数并回复"""
+        name: str = PROTO_NAMES.get(proto_id, str(proto_id))
+        self.request_counts[name] = self.request_counts.get(name, 0) + 1
+
+        module: Any = import_module(f"futu.common.pb.{name}_pb2") if proto_id in PROTO_NAMES else None
+        handler: Optional[Callable] = self.handlers.get(proto_id, None)
+
+        if not module or not handler:
+            self.unknown_protos.add(proto_id)
+            if module:
+                rsp: Any = module.Response()
+                rsp.retType = -1
+                rsp.retMsg = f"OpenDStub不支持的协议: {name}"
+                conn.send(proto_id, rsp, serial_no)
+            return
+
+        req: Any = module.Request.FromString(body)
+        rsp = module.Response()
+        rsp.retType = 0
+
+        handler(conn, req.c2s, rsp)
+        conn.send(proto_id, rsp, serial_no)
+
+    def broadcast(self, proto_id: int, rsp: Any, check: Callable[[StubConnection], bool]) -> int:
+        """向符合条件的连接发送推送，返回发送数"""
+        count: int = 0
+        for conn in list(self.connections):
+            if check(conn) and conn.send(proto_id, rsp):
+                count += 1
+        return count
+
+    def add_contract(
+        self,
+        code: str,
+        name: str = "",
+        lot_size: int = 100,
+        sec_type: int = Qot_Common.SecurityType_Eqty,
+        price: float = 100.0
+    ) -> StubContract:
+        """添加合约"""
+        contract: StubContract = StubContract(code, name or code, lot_size, sec_type, price)
+        contract.id = len(self.contracts) + 1
+        self.contracts[code] = contract
+        return contract
+
+    def generate_contracts(self, market: str, count: int, sec_type: int = Qot_Common.SecurityType_Eqty) -> None:
+        """批量生成合约，用于合约信息查询的压力测试"""
+        for i in range(count):
+            if market == "US":
+                symbol: str = f"S{i:05d}"
+            elif market == "SH":
+                symbol = f"{600000 + i:06d}"
+            elif market == "SZ":
+                symbol = f"{i + 1:06d}"
+            else:
+                symbol = f"{i + 1:05d}"
+            self.add_contract(f"{market}.{symbol}", sec_type=sec_type, price=10.0 + i % 100)
+
+    def get_contract(self, market: int, symbol: str) -> StubContract:
+        """按行情市场和代码获取合约，不存在时自动添加"""
+        for code, contract in self.contracts.items():
+            if contract.market == market and contract.symbol == symbol:
+                return contract
+
+        prefix: str = {
+            Qot_Common.QotMarket_HK_Security: "HK",
+            Qot_Common.QotMarket_US_Security: "US",
+            Qot_Common.QotMarket_CNSH_Security: "SH",
+            Qot_Common.QotMarket_CNSZ_Security: "SZ",
+        }.get(market, "HK")
+        return self.add_contract(f"{prefix}.{symbol}")
+
+    def on_init_connect(self, conn: StubConnection, c2s: Any, rsp: Any) -> None:
+        """初始化连接"""
+        rsp.s2c.serverVer = 900
+        rsp.s2c.loginUserID = 1
+        rsp.s2c.connID = conn.conn_id
+        rsp.s2c.connAESKey = "0" * 16
+        rsp.s2c.keepAliveInterval = 10
+
+    def on_keep_alive(self, conn: StubConnection, c2s: Any, rsp: Any) -> None:
+        """心跳"""
+        rsp.s2c.time = int(time())
+
+    def on_empty_request(self, conn: StubConnection, c2s: Any, rsp: Any) -> None:
+        """无需返回数据的请求"""
+        pass
+
+    def on_sub(self, conn: StubConnection, c2s: Any, rsp: Any) -> None:
+        """订阅或反订阅"""
+        if c2s.isUnsubAll:
+            conn.subscriptions.clear()
+            return
+
+        for security in c2s.securityList:
+            code: str = self.get_contract(security.market, security.code).code
+            for subtype in c2s.subTypeList:
+                codes: Set[str] = conn.subscriptions.setdefault(subtype, set())
+                if c2s.isSubOrUnSub:
+                    codes.add(code)
+                else:
+                    codes.discard(code)
+
+    def on_get_sub_info(self, conn: StubConnection, c2s: Any, rsp: Any) -> None:
+        """查询订阅信息"""
+        total: int = 0
+
+        for other in list(self.connections):
+            if not c2s.isReqAllConn and other is not conn:
+                continue
+
+            conn_info: Any = rsp.s2c.connSubInfoList.add()
+            used: int = 0
+            for subtype, codes in other.subscriptions.items():
+                if not codes:
+                    continue
+                sub_info: Any = conn_info.subInfoList.add()
+                sub_info.subType = subtype
+                for code in codes:
+                    self.contracts[code].fill_security(sub_info.securityList.add())
+                used += len(codes)
+
+            conn_info.usedQuota = used
+            conn_info.isOwnConnData = other is conn
+            total += used
+
+        rsp.s2c.totalUsedQuota = total
+        rsp.s2c.remainQuota = max(1000 - total, 0)
+
+    def on_get_static_info(self, conn: StubConnection, c2s: Any, rsp: Any) -> None:
+        """查询合约信息"""
+        if c2s.securityList:
+            contracts: List[StubContract] = [self.get_contract(s.market, s.code) for s in c2s.securityList]
+        else:
+            contracts = [
+                c for c in self.contracts.values()
+                if c.market == c2s.market and c.sec_type == c2s.secType
+            ]
+
+        for contract in contracts:
+            basic: Any = rsp.s2c.staticInfoList.add().basic
+            contract.fill_security(basic.security)
+            basic.id = contract.id
+            basic.lotSize = contract.lot_size
+            basic.secType = contract.sec_type
+            basic.name = contract.name
+            basic.listTime = "2000-01-01"
+            basic.delisting = False
+
+    def on_get_security_snapshot(self, conn: StubConnection, c2s: Any, rsp: Any) -> None:
+        """查询快照"""
+        update_time: str = now_str()[:19]
+
+        for security in c2s.securityList:
+            contract: StubContract = self.get_contract(security.market, security.code)
+
+            basic: Any = rsp.s2c.snapshotList.add().basic
+            contract.fill_security(basic.security)
+            basic.name = contract.name
+            basic.type = contract.sec_type
+            basic.isSuspend = False
+            basic.listTime = "2000-01-01"
+            basic.lotSize = contract.lot_size
+            basic.priceSpread = 0.01
+            basic.updateTime = update_time
+            basic.highPrice = contract.high_price
+            basic.openPrice = contract.open_price
+            basic.lowPrice = contract.low_price
+            basic.lastClosePrice = contract.pre_close
+            basic.curPrice = contract.last_price
+            basic.volume = contract.volume
+            basic.turnover = contract.turnover
+            basic.turnoverRate = 0
+            basic.askPrice = contract.last_price + 0.01
+            basic.bidPrice = contract.last_price - 0.01
+            basic.askVol = contract.lot_size
+            basic.bidVol = contract.lot_size
+
+    def generate_klines(self, begin: str, end: str, kl_type: int) -> List[str]:
+        """生成[begin, end]区间内的K线时间，分钟线按港股交易时段生成，日线跳过周末"""
+        minutes: int = KL_MINUTES.get(kl_type, 0)
+        day: datetime = datetime.strptime(begin[:10], "%Y-%m-%d")
+        last_day: datetime = datetime.strptime(end[:10], "%Y-%m-%d")
+
+        times: List[str] = []
+        while day <= last_day:
+            if day.weekday() < 5:
+                if not minutes:
+                    times.append(day.strftime("%Y-%m-%d 00:00:00"))
+                else:
+                    for session_start, session_end in KL_SESSIONS:
+                        for minute in range(session_start + minutes, session_end + 1, minutes):
+                            bar_time: datetime = day + timedelta(minutes=minute)
+                            times.append(bar_time.strftime("%Y-%m-%d %H:%M:%S"))
+            day += timedelta(days=1)
+
+        return times
+
+    def on_request_history_kl(self, conn: StubConnection, c2s: Any, rsp: Any) -> None:
+        """分页查询历史K线，nextReqKey为下一页起始位置"""
+        contract: StubContract = self.get_contract(c2s.security.market, c2s.security.code)
+        contract.fill_security(rsp.s2c.security)
+        rsp.s2c.name = contract.name
+
+        times: List[str] = self.generate_klines(c2s.beginTime, c2s.endTime, c2s.klType)
+        start: int = int(c2s.nextReqKey.decode()) if c2s.nextReqKey else 0
+        count: int = c2s.maxAckKLNum if c2s.HasField("maxAckKLNum") and c2s.maxAckKLNum else 1000
+        stop: int = min(start + count, len(times))
+
+        for i in range(start, stop):
+            price: float = round(contract.pre_close + (i % 200 - 100) * 0.01, 3)
+
+            kline: Any = rsp.s2c.klList.add()
+            kline.time = times[i]
+            kline.isBlank = False
+            kline.openPrice = price
+            kline.highPrice = price + 0.05
+            kline.lowPrice = price - 0.05
+            kline.closePrice = price + 0.01
+            kline.lastClosePrice = price
+            kline.volume = 1000 + i % 100
+            kline.turnover = kline.volume * price
+            kline.turnoverRate = 0
+            kline.pe = 0
+            kline.changeRate = 0
+
+        if stop < len(times):
+            rsp.s2c.nextReqKey = str(stop).encode()
+
+    def on_request_history_kl_quota(self, conn: StubConnection, c2s: Any, rsp: Any) -> None:
+        """查询历史K线额度"""
+        rsp.s2c.usedQuota = 0
+        rsp.s2c.remainQuota = 1000
+
+    def on_get_acc_list(self, conn: StubConnection, c2s: Any, rsp: Any) -> None:
+        """查询账户列表，模拟和正式环境各一个账户"""
+        for trd_env, acc_id in ((Trd_Common.TrdEnv_Simulate, ACC_ID_SIMULATE), (Trd_Common.TrdEnv_Real, ACC_ID_REAL)):
+            acc: Any = rsp.s2c.accList.add()
+            acc.trdEnv = trd_env
+            acc.accID = acc_id
+            acc.trdMarketAuthList.extend(ACC_MARKETS)
+            acc.accType = Trd_Common.TrdAccType_Cash
+            acc.accStatus = Trd_Common.TrdAccStatus_Active
+
+    def on_sub_acc_push(self, conn: StubConnection, c2s: Any, rsp: Any) -> None:
+        """订阅交易推送"""
+        conn.acc_push = bool(c2s.accIDList)
+
+    def fill_header(self, header: Any, c2s_header: Any) -> None:
+        """回填交易请求头"""
+        header.trdEnv = c2s_header.trdEnv
+        header.accID = c2s_header.accID
+        header.trdMarket = c2s_header.trdMarket
+
+    def on_get_funds(self, conn: StubConnection, c2s: Any, rsp: Any) -> None:
+        """查询资金，初始资金1000000，按成交记录扣减，不计手续费"""
+        self.fill_header(rsp.s2c.header, c2s.header)
+
+        with self.trade_lock:
+            cost: float = sum(
+                fill.qty * fill.price * (1 if fill.trdSide == Trd_Common.TrdSide_Buy else -1)
+                for fill in self.fills
+            )
+        cash: float = 1_000_000 - cost
+
+        funds: Any = rsp.s2c.funds
+        funds.power = cash
+        funds.totalAssets = 1_000_000
+        funds.cash = cash
+        funds.marketVal = cost
+        funds.frozenCash = 0
+        funds.debtCash = 0
+        funds.avlWithdrawalCash = cash
+
+    def on_get_position_list(self, conn: StubConnection, c2s: Any, rsp: Any) -> None:
+        """查询持仓，按成交记录汇总"""
+        self.fill_header(rsp.s2c.header, c2s.header)
+
+        positions: Dict[str, List[float]] = {}
+        with self.trade_lock:
+            for fill in self.fills:
+                pos: List[float] = positions.setdefault(fill.code, [fill.secMarket, 0, 0])
+                sign: int = 1 if fill.trdSide == Trd_Common.TrdSide_Buy else -1
+                pos[1] += sign * fill.qty
+                pos[2] += sign * fill.qty * fill.price
+
+        for i, (symbol, (sec_market, qty, cost)) in enumerate(positions.items()):
+            if not qty:
+                continue
+
+            position: Any = rsp.s2c.positionList.add()
+            position.positionID = i + 1
+            position.positionSide = Trd_Common.PositionSide_Long if qty > 0 else Trd_Common.PositionSide_Short
+            position.code = symbol
+            position.name = symbol
+            position.qty = abs(qty)
+            position.canSellQty = abs(qty)
+            position.price = cost / qty
+            position.costPrice = cost / qty
+            position.val = cost
+            position.plVal = 0
+            position.secMarket = int(sec_market)
+
+    def match_filter(self, pb: Any, c2s: Any) -> bool:
+        """检查委托或成交是否符合查询的过滤条件"""
+        if not c2s.HasField("filterConditions"):
+            return True
+
+        conditions: Any = c2s.filterConditions
+        if conditions.codeList and pb.code not in conditions.codeList:
+            return False
+        if conditions.orderIDExList and pb.orderIDEx not in conditions.orderIDExList:
+            return False
+        if conditions.idList and pb.orderID not in conditions.idList:
+            return False
+        return True
+
+    def on_get_order_list(self, conn: StubConnection, c2s: Any, rsp: Any) -> None:
+        """查询委托"""
+        self.fill_header(rsp.s2c.header, c2s.header)
+
+        with self.trade_lock:
+            for order in self.orders.values():
+                if self.match_filter(order, c2s):
+                    rsp.s2c.orderList.add().CopyFrom(order)
+
+    def on_get_order_fill_list(self, conn: StubConnection, c2s: Any, rsp: Any) -> None:
+        """查询成交"""
+        self.fill_header(rsp.s2c.header, c2s.header)
+
+        with self.trade_lock:
+            for fill in self.fills:
+                if self.match_filter(fill, c2s):
+                    rsp.s2c.orderFillList.add().CopyFrom(fill)
+
+    def on_place_order(self, conn: StubConnection, c2s: Any, rsp: Any) -> None:
+        """下单，回复后推送委托状态，fill_mode为True时随后全部成交"""
+        self.fill_header(rsp.s2c.header, c2s.header)
+
+        qot_market: int = get_qot_market(c2s.secMarket, c2s.code)
+        contract: StubContract = self.get_contract(qot_market, c2s.code)
+        update_time: str = now_str()
+
+        with self.trade_lock:
+            self.order_count += 1
+            order: Any = Order()
+            order.trdSide = c2s.trdSide
+            order.orderType = c2s.orderType
+            order.orderStatus = Trd_Common.OrderStatus_Submitted
+            order.orderID = self.order_count
+            order.orderIDEx = str(self.order_count)
+            order.code = contract.symbol
+            order.name = contract.name
+            order.qty = c2s.qty
+            order.price = c2s.price if c2s.HasField("price") else contract.last_price
+            order.createTime = update_time
+            order.updateTime = update_time
+            order.fillQty = 0
+            order.fillAvgPrice = 0
+            order.secMarket = get_trd_sec_market(contract.market)
+            self.orders[order.orderIDEx] = order
+
+        rsp.s2c.orderID = order.orderID
+        rsp.s2c.orderIDEx = order.orderIDEx
+
+        # 推送在回复之后发出，与OpenD的顺序一致
+        header: Any = TrdHeader()
+        self.fill_header(header, c2s.header)
+        Thread(target=self.run_order_pushes, args=(header, order.orderIDEx), daemon=True).start()
+
+    def run_order_pushes(self, header: Any, order_id: str) -> None:
+        """推送新委托状态，按需成交"""
+        self.push_order(header, order_id)
+        if self.fill_mode:
+            self.fill_order(order_id, header=header)
+
+    def on_modify_order(self, conn: StubConnection, c2s: Any, rsp: Any) -> None:
+        """改单或撤单"""
+        self.fill_header(rsp.s2c.header, c2s.header)
+        rsp.s2c.orderID = c2s.orderID
+
+        if c2s.forAll:
+            self.cancel_all_orders(c2s)
+            return
+
+        with self.trade_lock:
+            order: Optional[Any] = self.orders.get(c2s.orderIDEx, None)
+            if not order or order.orderStatus not in (
+                Trd_Common.OrderStatus_Submitted, Trd_Common.OrderStatus_Filled_Part
+            ):
+                rsp.retType = -1
+                rsp.retMsg = f"委托不存在或已结束: {c2s.orderIDEx}"
+                return
+
+            if c2s.modifyOrderOp == Trd_Common.ModifyOrderOp_Cancel:
+                if order.fillQty:
+                    order.orderStatus = Trd_Common.OrderStatus_Cancelled_Part
+                else:
+                    order.orderStatus = Trd_Common.OrderStatus_Cancelled_All
+            elif c2s.modifyOrderOp == Trd_Common.ModifyOrderOp_Normal:
+                order.qty = c2s.qty
+                order.price = c2s.price
+            else:
+                rsp.retType = -1
+                rsp.retMsg = f"OpenDStub不支持的改单操作: {c2s.modifyOrderOp}"
+                return
+
+            order.updateTime = now_str()
+
+        rsp.s2c.orderIDEx = order.orderIDEx
+
+        header: Any = TrdHeader()
+        self.fill_header(header, c2s.header)
+        Thread(target=self.push_order, args=(header, order.orderIDEx), daemon=True).start()
+
+    def cancel_all_orders(self, c2s: Any) -> None:
+        """全部撤单，trdMarket不为0时只撤销该交易市场的委托"""
+        cancelled: List[str] = []
+        with self.trade_lock:
+            for order in self.orders.values():
+                if order.orderStatus not in (Trd_Common.OrderStatus_Submitted, Trd_Common.OrderStatus_Filled_Part):
+                    continue
+                if c2s.trdMarket and get_trd_market(order.secMarket) != c2s.trdMarket:
+                    continue
+
+                if order.fillQty:
+                    order.orderStatus = Trd_Common.OrderStatus_Cancelled_Part
+                else:
+                    order.orderStatus = Trd_Common.OrderStatus_Cancelled_All
+                order.updateTime = now_str()
+                cancelled.append(order.orderIDEx)
+
+        header: Any = TrdHeader()
+        self.fill_header(header, c2s.header)
+        for order_id in cancelled:
+            Thread(target=self.push_order, args=(header, order_id), daemon=True).start()
+
+    def push_order(self, header: Any, order_id: str) -> int:
+        """推送委托状态"""
+        from futu.common.pb.Trd_UpdateOrder_pb2 import Response
+
+        rsp: Any = Response()
+        rsp.retType = 0
+        rsp.s2c.header.CopyFrom(header)
+        with self.trade_lock:
+            rsp.s2c.order.CopyFrom(self.orders[order_id])
+
+        return self.broadcast(ProtoId.Trd_UpdateOrder, rsp, lambda conn: conn.acc_push)
+
+    def fill_order(
+        self,
+        order_id: str,
+        qty: float = 0,
+        price: float = 0,
+        header: Optional[Any] = None
+    ) -> None:
+        """成交委托，qty为0时成交全部剩余数量，price为0时按委托价成交，推送成交和委托状态"""
+        from futu.common.pb.Trd_UpdateOrderFill_pb2 import Response
+
+        if header is None:
+            header = TrdHeader()
+            header.trdEnv = Trd_Common.TrdEnv_Simulate
+            header.accID = ACC_ID_SIMULATE
+            header.trdMarket = Trd_Common.TrdMarket_HK
+
+        with self.trade_lock:
+            order: Any = self.orders[order_id]
+            qty = min(qty or order.qty - order.fillQty, order.qty - order.fillQty)
+            if qty <= 0:
+                return
+            price = price or order.price
+
+            self.fill_count += 1
+            fill: Any = OrderFill()
+            fill.trdSide = order.trdSide
+            fill.fillID = self.fill_count
+            fill.fillIDEx = str(self.fill_count)
+            fill.orderID = order.orderID
+            fill.orderIDEx = order.orderIDEx
+            fill.code = order.code
+            fill.name = order.name
+            fill.qty = qty
+            fill.price = price
+            fill.createTime = now_str()
+            fill.secMarket = order.secMarket
+            self.fills.append(fill)
+
+            order.fillAvgPrice = (order.fillAvgPrice * order.fillQty + price * qty) / (order.fillQty + qty)
+            order.fillQty += qty
+            if order.fillQty >= order.qty:
+                order.orderStatus = Trd_Common.OrderStatus_Filled_All
+            else:
+                order.orderStatus = Trd_Common.OrderStatus_Filled_Part
+            order.updateTime = fill.createTime
+
+        rsp: Any = Response()
+        rsp.retType = 0
+        rsp.s2c.header.CopyFrom(header)
+        rsp.s2c.orderFill.CopyFrom(fill)
+        self.broadcast(ProtoId.Trd_UpdateOrderFill, rsp, lambda conn: conn.acc_push)
+
+        self.push_order(header, order_id)
+
+    def push_quote(self, contract: StubContract) -> int:
+        """推送报价"""
+        from futu.common.pb.Qot_UpdateBasicQot_pb2 import Response
+
+        rsp: Any = Response()
+        rsp.retType = 0
+
+        quote: Any = rsp.s2c.basicQotList.add()
+        contract.fill_security(quote.security)
+        quote.name = contract.name
+        quote.isSuspended = False
+        quote.listTime = "2000-01-01"
+        quote.priceSpread = 0.01
+        quote.updateTime = now_str()
+        quote.highPrice = contract.high_price
+        quote.openPrice = contract.open_price
+        quote.lowPrice = contract.low_price
+        quote.curPrice = contract.last_price
+        quote.lastClosePrice = contract.pre_close
+        quote.volume = contract.volume
+        quote.turnover = contract.turnover
+        quote.turnoverRate = 0
+        quote.amplitude = 0
+
+        return self.broadcast(
+            ProtoId.Qot_UpdateBasicQot, rsp,
+            lambda conn: conn.is_subscribed(Qot_Common.SubType_Basic, contract.code)
+        )
+
+    def push_orderbook(self, contract: StubContract) -> int:
+        """推送十档盘口"""
+        from futu.common.pb.Qot_UpdateOrderBook_pb2 import Response
+
+        rsp: Any = Response()
+        rsp.retType = 0
+        contract.fill_security(rsp.s2c.security)
+        rsp.s2c.name = contract.name
+
+        for n in range(ORDERBOOK_DEPTH):
+            bid: Any = rsp.s2c.orderBookBidList.add()
+            bid.price = round(contract.last_price - 0.01 * (n + 1), 3)
+            bid.volume = contract.lot_size * (n + 1)
+            bid.orederCount = n + 1
+
+            ask: Any = rsp.s2c.orderBookAskList.add()
+            ask.price = round(contract.last_price + 0.01 * (n + 1), 3)
+            ask.volume = contract.lot_size * (n + 1)
+            ask.orederCount = n + 1
+
+        return self.broadcast(
+            ProtoId.Qot_UpdateOrderBook, rsp,
+            lambda conn: conn.is_subscribed(Qot_Common.SubType_OrderBook, contract.code)
+        )
+
+    def push_ticker(self, contract: StubContract) -> int:
+        """推送逐笔成交"""
+        from futu.common.pb.Qot_UpdateTicker_pb2 import Response
+
+        rsp: Any = Response()
+        rsp.retType = 0
+        contract.fill_security(rsp.s2c.security)
+        rsp.s2c.name = contract.name
+
+        ticker: Any = rsp.s2c.tickerList.add()
+        ticker.time = now_str()
+        ticker.sequence = contract.sequence
+        ticker.dir = Qot_Common.TickerDirection_Bid if contract.sequence % 2 else Qot_Common.TickerDirection_Ask
+        ticker.price = contract.last_price
+        ticker.volume = contract.lot_size
+        ticker.turnover = contract.lot_size * contract.last_price
+
+        return self.broadcast(
+            ProtoId.Qot_UpdateTicker, rsp,
+            lambda conn: conn.is_subscribed(Qot_Common.SubType_Ticker, contract.code)
+        )
+
+    def push_market(self, code: str) -> None:
+        """合约产生一笔成交，推送报价、盘口和逐笔"""
+        contract: StubContract = self.contracts.get(code, None) or self.add_contract(code)
+        contract.tick(self.push_count)
+        self.push_count += 1
+
+        self.push_quote(contract)
+        self.push_orderbook(contract)
+        self.push_ticker(contract)
+
+    def start_pushes(self, codes: List[str], script: List[Tuple[float, float]]) -> None:
+        """
+        按脚本在后台生成行情推送。
+
+        script为[(每秒推送次数, 持续秒数), ...]，依次执行，持续秒数为0时一直执行到stop_pushes。
+        每次推送轮流选择一个合约，向订阅了该合约的连接发送报价、盘口和逐笔推送。
+        """
+        self.stop_pushes()
+        self.push_stop.clear()
+        self.push_thread = Thread(target=self.run_pushes, args=(list(codes), list(script)), daemon=True)
+        self.push_thread.start()
+
+    def run_pushes(self, codes: List[str], script: List[Tuple[float, float]]) -> None:
+        """推送生成线程，落后于计划时不休眠，直到追上计划速率"""
+        code_cycle = cycle(codes)
+
+        for rate, duration in script:
+            start: float = perf_counter()
+            count: int = 0
+
+            while not self.push_stop.is_set():
+                elapsed: float = perf_counter() - start
+                if duration and elapsed >= duration:
+                    break
+
+                target: int = int(elapsed * rate) + 1
+                while count < target:
+                    self.push_market(next(code_cycle))
+                    count += 1
+
+                wait: float = count / rate - (perf_counter() - start)
+                if wait > 0:
+                    sleep(min(wait, 0.1))
+
+    def wait_pushes(self, timeout: Optional[float] = None) -> None:
+        """等待推送脚本执行完成"""
+        if self.push_thread:
+            self.push_thread.join(timeout)
+
+    def stop_pushes(self) -> None:
+        """停止推送生成"""
+        if self.push_thread:
+            self.push_stop.set()
+            self.push_thread.join()
+            self.push_thread = None
+
+
+def parse_rate(text: str) -> Tuple[float, float]:
+    """解析命令行的推送速率，格式为"每秒次数:持续秒数"，省略持续秒数时一直执行"""
+    rate, _, duration = text.partition(":")
+    return float(rate), float(duration or 0)
+
+
+def main() -> None:
+    """命令行启动模拟服务"""
+    parser: ArgumentParser = ArgumentParser(description="富途OpenD本地模拟服务")
+    parser.add_argument("codes", nargs="*", default=["HK.00700"], help="推送的合约代码")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11111)
+    parser.add_argument("--rate", action="append", type=parse_rate, help="推送速率，可重复填写组成脚本")
+    parser.add_argument("--no-fill", action="store_true", help="委托提交后不自动成交")
+    args = parser.parse_args()
+
+    stub: OpenDStub = OpenDStub(args.host, args.port, fill_mode=not args.no_fill)
+    for code in args.codes:
+        stub.add_contract(code)
+
+    port: int = stub.start()
+    print(f"OpenDStub listening on {args.host}:{port}")
+
+    if args.rate:
+        stub.start_pushes(args.codes, args.rate)
+
+    try:
+        while True:
+            sleep(1)
+            print(f"pushes={stub.push_count} connections={len(stub.connections)}")
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
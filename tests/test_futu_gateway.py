@@ -3,14 +3,114 @@
 """
 
 import unittest
+from datetime import date, datetime
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from concurrent.futures import Future
+from threading import Event, Thread
+from time import sleep, time
 from unittest.mock import MagicMock, patch
 
+import numpy as np
+from pandas import DataFrame
+
 from vnpy.event import EventEngine
-from vnpy.trader.constant import Exchange, Interval
-from vnpy.trader.object import SubscribeRequest, HistoryRequest, OrderRequest, Direction, OrderType
+from vnpy.trader.constant import Exchange, Interval, Status
+from vnpy.trader.object import (
+    SubscribeRequest, HistoryRequest, OrderRequest, CancelRequest, Direction, OrderType,
+    OrderData, TradeData, PositionData
+)
+
+from futu.common.pb.Qot_UpdateBasicQot_pb2 import Response as QuoteResponse
+from futu.common.pb.Qot_UpdateOrderBook_pb2 import Response as OrderBookResponse
+from futu.common.pb.Trd_UpdateOrder_pb2 import Response as OrderResponse
+from futu.common.pb.Trd_UpdateOrderFill_pb2 import Response as DealResponse
 
 from vnpy_futu import FutuGateway
-from vnpy_futu.vnpy_futu.futu_gateway import FutuQuoteApi, FutuTradeApi
+from vnpy_futu.vnpy_futu.tick_bus import FutuTickBusReader
+from vnpy_futu.vnpy_futu.push_parser import FutuOrderRecord, FutuDealRecord
+from vnpy_futu.vnpy_futu.recorder import FutuRecorder, FutuReplayer, RECORD_ORDER
+from vnpy_futu.vnpy_futu.ledger import FutuLedger
+from vnpy_futu.vnpy_futu.scheduler import FutuRequestScheduler, PRIORITY_CANCEL, PRIORITY_PLACE, PRIORITY_QUERY, PRIORITY_HISTORY
+from vnpy_futu.tests.opend_stub import OpenDStub
+from vnpy_futu.vnpy_futu.futu_gateway import (
+    FutuQuoteApi, FutuTradeApi, FutuQuoteHandler, FutuOrderHandler, FutuDealHandler, RET_OK, RET_ERROR, CHINA_TZ, Market, SubType, REQUEST_LIMITS, ModifyOrderOp,
+    FutuTickerBuffer, TICKER_DTYPE, EVENT_FUTU_BAR, EVENT_FUTU_BAR_UPDATE, QUOTE_MODE_SNAPSHOT,
+    FutuBatchResult, convert_kline_array
+)
+
+
+def wait_until(condition, timeout: float = 5) -> bool:
+    """等待条件成立，超时返回False"""
+    end = time() + timeout
+    while time() < end:
+        if condition():
+            return True
+        sleep(0.02)
+    return False
+
+
+def generate_kline_frame(start: int, count: int, base: float = 100.0) -> DataFrame:
+    """生成测试用的历史K线数据"""
+    rows = []
+    for i in range(start, start + count):
+        rows.append({
+            "code": "HK.00700",
+            "time_key": f"2025-01-02 09:{i // 60:02d}:{i % 60:02d}",
+            "open": base + i,
+            "high": base + 1 + i,
+            "low": base - 1 + i,
+            "close": base + 0.5 + i,
+            "volume": 1000 + i,
+            "turnover": 100000.0 + i,
+        })
+    return DataFrame(rows)
+
+
+def generate_rehab_frame(factor: float) -> DataFrame:
+    """生成测试用的复权因子数据"""
+    return DataFrame([{
+        "ex_div_date": "2024-05-17",
+        "forward_adj_factorA": factor,
+        "forward_adj_factorB": 0.0,
+    }])
+
+
+def generate_quote_pb():
+    """生成测试用的报价推送protobuf"""
+    quote_pb = QuoteResponse()
+    quote_pb.retType = RET_OK
+    record = quote_pb.s2c.basicQotList.add()
+    record.security.market = 1
+    record.security.code = "00700"
+    record.isSuspended = False
+    record.listTime = ""
+    record.priceSpread = 0.2
+    record.updateTime = "2025-01-02 09:30:01.123"
+    record.highPrice = 385.0
+    record.openPrice = 380.0
+    record.lowPrice = 379.0
+    record.curPrice = 383.2
+    record.lastClosePrice = 381.0
+    record.volume = 120000
+    record.turnover = 4.6e7
+    record.turnoverRate = 0
+    record.amplitude = 0
+    return quote_pb
+
+
+def generate_orderbook_pb():
+    """生成测试用的盘口推送protobuf"""
+    orderbook_pb = OrderBookResponse()
+    orderbook_pb.retType = RET_OK
+    orderbook_pb.s2c.security.market = 1
+    orderbook_pb.s2c.security.code = "00700"
+    for price, volume in ((383.0, 1000), (382.8, 2000)):
+        level = orderbook_pb.s2c.orderBookBidList.add()
+        level.price = price
+        level.volume = volume
+        level.orederCount = 1
+    return orderbook_pb
 
 
 class TestFutuGateway(unittest.TestCase):
@@ -103,7 +203,7 @@ class TestFutuGateway(unittest.TestCase):
 
         self.gateway.query_history(req)
 
-        self.gateway.quote_api.query_history.assert_called_once_with(req)
+        self.gateway.quote_api.query_history.assert_called_once_with(req, None)
 
 
 class TestFutuQuoteApi(unittest.TestCase):
@@ -150,5 +250,1489 @@ class TestFutuQuoteApi(unittest.TestCase):
         self.assertIsNone(self.quote_api.quote_ctx)
 
 
+class TestFutuQuoteApiHistory(unittest.TestCase):
+    """
+    测试富途行情API历史数据下载
+    """
+
+    def setUp(self):
+        """
+        测试前准备
+        """
+        self.event_engine = EventEngine()
+        self.gateway = FutuGateway(self.event_engine, "FUTU")
+        self.gateway.write_log = MagicMock()
+
+        self.quote_api = FutuQuoteApi(self.gateway)
+        self.quote_api.quote_ctx = MagicMock()
+
+        self.req = HistoryRequest(
+            symbol="00700",
+            exchange=Exchange.SEHK,
+            interval=Interval.MINUTE,
+            start=datetime(2025, 1, 2),
+            end=datetime(2025, 1, 3),
+        )
+
+    def test_query_history_pages(self):
+        """
+        测试按page_req_key分页下载
+        """
+        self.quote_api.quote_ctx.request_history_kline.side_effect = [
+            (RET_OK, generate_kline_frame(0, 2), b"page2"),
+            (RET_OK, generate_kline_frame(2, 2), b"page3"),
+            (RET_OK, generate_kline_frame(4, 1), None),
+        ]
+        progress = []
+
+        bars = self.quote_api.query_history(self.req, lambda page, count: progress.append((page, count)))
+
+        self.assertEqual(len(bars), 5)
+        self.assertEqual(bars[-1].close_price, 104.5)
+        self.assertEqual(progress, [(1, 2), (2, 4), (3, 5)])
+
+        calls = self.quote_api.quote_ctx.request_history_kline.call_args_list
+        self.assertEqual([c.kwargs["page_req_key"] for c in calls], [None, b"page2", b"page3"])
+
+    def test_query_history_page_error(self):
+        """
+        测试分页下载中途失败
+        """
+        self.quote_api.quote_ctx.request_history_kline.side_effect = [
+            (RET_OK, generate_kline_frame(0, 2), b"page2"),
+            (RET_ERROR, "内部错误", None),
+        ]
+
+        bars = self.quote_api.query_history(self.req)
+
+        self.assertIsNone(bars)
+        self.gateway.write_log.assert_called_with("历史数据查询失败: HK.00700 第2页 内部错误")
+
+    def test_query_history_not_connected(self):
+        """
+        测试未连接时返回空列表
+        """
+        self.quote_api.quote_ctx = None
+
+        self.assertEqual(self.quote_api.query_history(self.req), [])
+
+    def test_query_history_array(self):
+        """
+        测试直接返回K线数组
+        """
+        self.quote_api.quote_ctx.request_history_kline.side_effect = [
+            (RET_OK, generate_kline_frame(0, 3), None),
+        ]
+
+        array = self.quote_api.query_history_array(self.req)
+
+        self.assertEqual(array["datetime"][1], np.datetime64("2025-01-02T09:00:01"))
+        self.assertEqual(array["close"].tolist(), [100.5, 101.5, 102.5])
+
+        bars = self.quote_api.generate_bars(self.req, array)
+        self.assertEqual(bars[1].datetime, CHINA_TZ.localize(datetime(2025, 1, 2, 9, 0, 1)))
+        self.assertEqual(bars[2].volume, 1002)
+
+    def test_query_history_cache(self):
+        """
+        测试本地缓存命中与增量补齐
+        """
+        with TemporaryDirectory() as path:
+            self.quote_api.init_bar_cache(path)
+            self.quote_api.quote_ctx.get_rehab.return_value = (RET_OK, generate_rehab_frame(1.0))
+            request = self.quote_api.quote_ctx.request_history_kline
+            request.side_effect = [
+                (RET_OK, generate_kline_frame(0, 3), None),
+                (RET_OK, DataFrame(), None),
+            ]
+
+            bars = self.quote_api.query_history(self.req)
+            self.assertEqual(len(bars), 3)
+            self.assertEqual(request.call_count, 1)
+
+            # 已覆盖的区间直接读取缓存
+            bars = self.quote_api.query_history(self.req)
+            self.assertEqual(len(bars), 3)
+            self.assertEqual(request.call_count, 1)
+
+            # 只请求缓存之后缺失的区间
+            self.req.end = datetime(2025, 1, 5)
+            bars = self.quote_api.query_history(self.req)
+            self.assertEqual(len(bars), 3)
+            self.assertEqual(request.call_count, 2)
+            self.assertEqual(request.call_args.kwargs["start"], "2025-01-04")
+            self.assertEqual(request.call_args.kwargs["end"], "2025-01-05")
+
+    def test_query_history_cache_rehab(self):
+        """
+        测试复权因子变化后清除缓存并重新下载全部区间
+        """
+        with TemporaryDirectory() as path:
+            self.quote_api.init_bar_cache(path)
+            rehab = self.quote_api.quote_ctx.get_rehab
+            rehab.return_value = (RET_OK, generate_rehab_frame(1.0))
+            request = self.quote_api.quote_ctx.request_history_kline
+            request.side_effect = [
+                (RET_OK, generate_kline_frame(0, 3), None),
+                (RET_OK, generate_kline_frame(0, 3, 50), None),
+            ]
+
+            bars = self.quote_api.query_history(self.req)
+            self.assertEqual(bars[0].close_price, 100.5)
+
+            # 除权除息后前复权价格整体改变，不能沿用旧缓存
+            rehab.return_value = (RET_OK, generate_rehab_frame(0.5))
+            bars = self.quote_api.query_history(self.req)
+
+            self.assertEqual(request.call_count, 2)
+            self.assertEqual(request.call_args.kwargs["start"], "2025-01-02")
+            self.assertEqual([bar.close_price for bar in bars], [50.5, 51.5, 52.5])
+
+            # 复权因子查询失败时不记录覆盖区间
+            rehab.return_value = (RET_ERROR, "内部错误")
+            request.side_effect = [(RET_OK, generate_kline_frame(0, 3, 50), None)]
+            self.quote_api.query_history(self.req)
+            self.assertIsNone(self.quote_api.bar_cache.get_coverage("HK.00700_K_1M_qfq"))
+
+    def test_bar_cache_replace_during_load(self):
+        """
+        测试分段读取缓存期间文件被替换，后续分段从新文件继续读取且不重复
+        """
+        with TemporaryDirectory() as path:
+            self.quote_api.init_bar_cache(path)
+            cache = self.quote_api.bar_cache
+            key = "HK.00700_K_1M_qfq"
+
+            with cache.get_lock(key):
+                cache.update(key, convert_kline_array(generate_kline_frame(0, 3)), date(2025, 1, 2), date(2025, 1, 2))
+
+            chunks = cache.iter_load(key, date(2025, 1, 2), date(2025, 1, 2), 2)
+            first = next(chunks)
+
+            with cache.get_lock(key):
+                cache.update(key, convert_kline_array(generate_kline_frame(0, 5)))
+
+            rest = list(chunks)
+            self.assertEqual(len(first), 2)
+            self.assertEqual(sum(len(chunk) for chunk in rest), 3)
+            self.assertEqual(rest[0]["datetime"][0], np.datetime64("2025-01-02T09:00:02"))
+
+    def test_iter_history(self):
+        """
+        测试流式查询按固定条数分段返回
+        """
+        self.quote_api.quote_ctx.request_history_kline.side_effect = [
+            (RET_OK, generate_kline_frame(0, 3), b"page2"),
+            (RET_OK, generate_kline_frame(3, 2), None),
+        ]
+
+        chunks = list(self.quote_api.iter_history(self.req, chunk_size=2))
+
+        self.assertEqual([len(bars) for bars in chunks], [2, 2, 1])
+        self.assertEqual(chunks[1][0].open_price, 102.0)
+
+    def test_iter_history_page_error(self):
+        """
+        测试流式查询中途失败时提示数据不完整
+        """
+        self.quote_api.quote_ctx.request_history_kline.side_effect = [
+            (RET_OK, generate_kline_frame(0, 2), b"page2"),
+            (RET_ERROR, "内部错误", None),
+        ]
+
+        chunks = list(self.quote_api.iter_history(self.req))
+
+        self.assertEqual([len(bars) for bars in chunks], [2])
+        self.gateway.write_log.assert_called_with("00700.SEHK历史数据下载中断，已返回的数据不完整")
+
+    @patch("vnpy_futu.vnpy_futu.futu_gateway.sleep")
+    def test_query_history_retry(self, mock_sleep):
+        """
+        测试触发频率限制后退避重试
+        """
+        self.quote_api.quote_ctx.request_history_kline.side_effect = [
+            (RET_ERROR, "请求频率太高", None),
+            (RET_ERROR, "请求频率太高", None),
+            (RET_OK, generate_kline_frame(0, 2), None),
+        ]
+
+        bars = self.quote_api.query_history(self.req)
+
+        self.assertEqual(len(bars), 2)
+        self.assertEqual([c.args[0] for c in mock_sleep.call_args_list], [1, 2])
+
+    def test_query_history_batch(self):
+        """
+        测试多合约并发下载与额度检查
+        """
+        self.quote_api.quote_ctx.get_history_kl_quota.return_value = (
+            RET_OK, (1, 1, [{"code": "HK.00700", "name": "", "request_time": ""}])
+        )
+        self.quote_api.quote_ctx.request_history_kline.side_effect = (
+            lambda *args, **kwargs: (RET_OK, generate_kline_frame(0, 2), None)
+        )
+
+        reqs = []
+        for symbol in ["00700", "00005", "00001"]:
+            reqs.append(HistoryRequest(
+                symbol=symbol,
+                exchange=Exchange.SEHK,
+                interval=Interval.MINUTE,
+                start=datetime(2025, 1, 2),
+                end=datetime(2025, 1, 3),
+            ))
+
+        results = dict((req.symbol, bars) for req, bars in self.quote_api.query_history_batch(reqs, 2))
+
+        # 00700已在额度明细中，剩余额度只够再下载一个合约
+        self.assertEqual(sorted(results), ["00005", "00700"])
+        self.assertEqual(len(results["00005"]), 2)
+
+
+class TestFutuSubscriptionManager(unittest.TestCase):
+    """
+    测试富途行情订阅管理
+    """
+
+    def setUp(self):
+        """
+        测试前准备
+        """
+        self.event_engine = EventEngine()
+        self.gateway = FutuGateway(self.event_engine, "FUTU")
+        self.gateway.write_log = MagicMock()
+        self.gateway.on_contract = MagicMock()
+
+        self.quote_api = FutuQuoteApi(self.gateway)
+        self.quote_api.quote_ctx = MagicMock()
+        self.quote_api.quote_ctx.subscribe.return_value = (RET_OK, None)
+        self.quote_api.quote_ctx.unsubscribe.return_value = (RET_OK, None)
+
+    def tearDown(self):
+        """
+        测试后清理
+        """
+        self.gateway.scheduler.close()
+
+    def test_subscribe_batch(self):
+        """
+        测试批量订阅合并为一次请求，重复订阅不再发送请求
+        """
+        self.quote_api.quote_ctx.query_subscription.return_value = (RET_OK, {"remain": 100})
+        reqs = [SubscribeRequest(symbol, Exchange.SEHK) for symbol in ["00700", "00005", "00001"]]
+
+        self.quote_api.subscribe_batch(reqs)
+        self.quote_api.subscribe_batch(reqs)
+
+        self.quote_api.quote_ctx.subscribe.assert_called_once_with(
+            ["HK.00700", "HK.00005", "HK.00001"], [SubType.QUOTE, SubType.ORDER_BOOK]
+        )
+        self.assertEqual(len(self.quote_api.subscribed), 3)
+
+        # 订阅额度查询和订阅请求都经过调度器
+        self.assertEqual(self.gateway.get_request_metrics()["query"]["count"], 2)
+
+    def test_subscription_usage(self):
+        """
+        测试订阅额度来自query_subscription，并按服务端记录校正本地订阅
+        """
+        manager = self.quote_api.subscription_manager
+        manager.subscriptions["HK.00700"] = {SubType.QUOTE: time(), SubType.ORDER_BOOK: time()}
+        manager.subscriptions["HK.00005"] = {SubType.QUOTE: time()}
+        self.quote_api.subscribed.add("00005.SEHK")
+
+        self.quote_api.quote_ctx.query_subscription.return_value = (RET_OK, {
+            "total_used": 5,
+            "own_used": 3,
+            "remain": 995,
+            "sub_list": {SubType.QUOTE: ["HK.00700", "HK.00001"], SubType.ORDER_BOOK: ["HK.00700"]},
+        })
+
+        usage = manager.get_usage()
+
+        self.assertEqual(usage, {
+            SubType.QUOTE: 2, SubType.ORDER_BOOK: 1, "total_used": 5, "own_used": 3, "remain": 995
+        })
+        self.quote_api.quote_ctx.query_subscription.assert_called_once_with(False)
+        self.assertEqual(set(manager.subscriptions), {"HK.00700", "HK.00001"})
+        self.assertNotIn("00005.SEHK", self.quote_api.subscribed)
+
+    def test_subscribe_evict(self):
+        """
+        测试额度不足时回收最久未使用且已满一分钟的订阅
+        """
+        manager = self.quote_api.subscription_manager
+        self.quote_api.quote_ctx.query_subscription.return_value = (RET_OK, {"remain": 0})
+
+        manager.subscriptions["HK.00001"] = {SubType.QUOTE: time() - 120}
+        manager.subscriptions["HK.00005"] = {SubType.QUOTE: time()}
+        manager.subscriptions["HK.00700"] = {SubType.QUOTE: time() - 120}
+        manager.touch("HK.00001")
+
+        done = manager.subscribe(["HK.09988"], [SubType.QUOTE])
+
+        self.assertEqual(done, ["HK.09988"])
+        self.quote_api.quote_ctx.unsubscribe.assert_called_once_with(["HK.00700"], [SubType.QUOTE])
+        self.assertEqual(set(manager.subscriptions), {"HK.00005", "HK.00001", "HK.09988"})
+
+    def test_subscribe_evict_by_push(self):
+        """
+        测试收到推送的代码视为最近使用，先订阅但仍有推送的代码不被回收
+        """
+        manager = self.quote_api.subscription_manager
+        self.quote_api.quote_ctx.query_subscription.return_value = (RET_OK, {"remain": 0})
+        self.gateway.on_tick = MagicMock()
+
+        manager.subscriptions["HK.00001"] = {SubType.QUOTE: time() - 120}
+        manager.subscriptions["HK.00700"] = {SubType.QUOTE: time() - 120}
+        manager.last_used["HK.00001"] = time() - 120
+        manager.last_used["HK.00700"] = time() - 60
+
+        self.quote_api.process_quote("HK.00001", {
+            "data_date": "2025-01-02", "data_time": "09:30:01", "last_price": 383.2, "price_spread": 0.2
+        })
+        manager.subscribe(["HK.09988"], [SubType.QUOTE])
+
+        self.quote_api.quote_ctx.unsubscribe.assert_called_once_with(["HK.00700"], [SubType.QUOTE])
+        self.assertIn("HK.00001", manager.subscriptions)
+
+
+class TestFutuQuoteApiPush(unittest.TestCase):
+    """
+    测试富途行情API推送处理
+    """
+
+    def setUp(self):
+        """
+        测试前准备
+        """
+        self.event_engine = EventEngine()
+        self.gateway = FutuGateway(self.event_engine, "FUTU")
+        self.gateway.write_log = MagicMock()
+        self.gateway.on_tick = MagicMock()
+        self.gateway.on_contract = MagicMock()
+
+        self.quote_api = FutuQuoteApi(self.gateway)
+
+        self.quote = {
+            "data_date": "2025-01-02",
+            "data_time": "09:30:01.123",
+            "open_price": 380.0,
+            "high_price": 385.0,
+            "low_price": 379.0,
+            "prev_close_price": 381.0,
+            "last_price": 383.2,
+            "volume": 120000,
+            "price_spread": 0.2,
+        }
+        self.orderbook = {
+            "code": "HK.00700",
+            "Bid": [(383.0, 1000, 3, {}), (382.8, 2000, 5, {})],
+            "Ask": [(383.2, 500, 1, {})],
+        }
+
+    def test_process_quote(self):
+        """
+        测试报价推送转换为Tick
+        """
+        self.quote_api.process_quote("HK.00700", self.quote)
+
+        tick = self.gateway.on_tick.call_args.args[0]
+        self.assertEqual(tick.vt_symbol, "00700.SEHK")
+        self.assertEqual(tick.datetime, CHINA_TZ.localize(datetime(2025, 1, 2, 9, 30, 1)))
+        self.assertEqual(tick.last_price, 383.2)
+        self.assertEqual(tick.pre_close, 381.0)
+        self.assertEqual(tick.volume, 120000)
+
+    def test_process_quote_partial(self):
+        """
+        测试缺少字段的报价推送
+        """
+        self.quote_api.process_quote("HK.00700", self.quote)
+        self.quote_api.process_quote("HK.00700", {
+            "data_date": "2025-01-02",
+            "data_time": "09:31:00",
+            "last_price": 384.0,
+        })
+
+        tick = self.gateway.on_tick.call_args.args[0]
+        self.assertEqual(tick.datetime, CHINA_TZ.localize(datetime(2025, 1, 2, 9, 31, 0)))
+        self.assertEqual(tick.last_price, 384.0)
+        self.assertEqual(tick.open_price, 0)
+
+    def test_process_orderbook(self):
+        """
+        测试全档位盘口原地更新，单边盘口清除旧档位
+        """
+        self.orderbook["Bid"] = [(383.0 - i * 0.2, 100 * (i + 1), i + 1, {}) for i in range(10)]
+        self.quote_api.process_orderbook(self.orderbook)
+
+        orderbook = self.quote_api.get_orderbook("00700.SEHK")
+        prices, volumes, orders = orderbook.get_bids()
+        self.assertEqual(len(prices), 10)
+        self.assertEqual(orders[9], 10)
+        self.assertFalse(prices.flags.writeable)
+
+        tick = self.gateway.on_tick.call_args.args[0]
+        self.assertEqual(tick.bid_volume_5, 500)
+        self.assertEqual(tick.ask_price_1, 383.2)
+
+        self.orderbook["Bid"] = []
+        self.quote_api.process_orderbook(self.orderbook)
+
+        self.assertEqual(prices[0], 0)
+        tick = self.gateway.on_tick.call_args.args[0]
+        self.assertEqual(tick.bid_price_1, 0)
+        self.assertEqual(tick.ask_price_1, 383.2)
+
+    def test_process_ticker(self):
+        """
+        测试逐笔写入环形缓冲区并批量推送，重复序号被跳过
+        """
+        self.gateway.on_event = MagicMock()
+        data = DataFrame([
+            {"code": "HK.00700", "time": f"2025-01-02 09:30:0{i}", "price": 383.0 + i, "volume": 100,
+             "ticker_direction": direction, "sequence": 10 + i}
+            for i, direction in enumerate(["BUY", "SELL", "NEUTRAL"])
+        ])
+
+        self.quote_api.process_ticker(data)
+        self.quote_api.process_ticker(data)
+
+        self.assertEqual(self.gateway.on_event.call_count, 2)
+        update = self.gateway.on_event.call_args.args[1]
+        array = update.get_data()
+        self.assertEqual(array["direction"].tolist(), [1, -1, 0])
+        self.assertEqual(array["datetime"][2], np.datetime64("2025-01-02T09:30:02"))
+
+    def test_process_kline(self):
+        """
+        测试实时K线推送：同一根K线只推送更新，时间前进后输出已完成K线
+        """
+        self.gateway.on_event = MagicMock()
+
+        def push(time_key, close, volume):
+            data = DataFrame([{
+                "code": "HK.00700", "name": "", "time_key": time_key, "open": 380.0, "close": close,
+                "high": 385.0, "low": 379.0, "volume": volume, "turnover": volume * close,
+                "k_type": SubType.K_1M, "last_close": 381.0
+            }])
+            self.quote_api.process_kline(data)
+
+        push("2025-01-02 09:31:00", 383.0, 100)
+        push("2025-01-02 09:31:00", 384.0, 300)
+        push("2025-01-02 09:30:00", 382.0, 50)
+        push("2025-01-02 09:32:00", 384.2, 10)
+
+        events = [call.args for call in self.gateway.on_event.call_args_list]
+        finished = [bar for event_type, bar in events if event_type == EVENT_FUTU_BAR + "K_1M.00700.SEHK"]
+        updates = [bar for event_type, bar in events if event_type == EVENT_FUTU_BAR_UPDATE + "K_1M."]
+
+        self.assertEqual(len(finished), 1)
+        self.assertEqual(len(updates), 3)
+        self.assertEqual(finished[0].close_price, 384.0)
+        self.assertEqual(finished[0].volume, 300)
+        self.assertEqual(finished[0].interval, Interval.MINUTE)
+        self.assertEqual(finished[0].datetime, CHINA_TZ.localize(datetime(2025, 1, 2, 9, 31)))
+
+    def test_process_snapshot(self):
+        """
+        测试快照轮询模式：订阅不占用额度，只为变化的代码输出Tick
+        """
+        self.quote_api.quote_ctx = MagicMock()
+        self.quote_api.init_quote_mode(QUOTE_MODE_SNAPSHOT, 3)
+
+        reqs = [SubscribeRequest(symbol=symbol, exchange=Exchange.SEHK) for symbol in ("00700", "00005")]
+        self.quote_api.subscribe_batch(reqs)
+        self.quote_api.quote_ctx.subscribe.assert_not_called()
+        self.assertEqual(list(self.quote_api.snapshot_codes), ["HK.00700", "HK.00005"])
+
+        def snapshot(price):
+            return DataFrame([
+                {"code": code, "update_time": "2025-01-02 09:30:01", "last_price": last_price,
+                 "open_price": 1.0, "high_price": 1.0, "low_price": 1.0, "prev_close_price": 1.0,
+                 "volume": 100, "turnover": 100.0, "bid_price": 1.0, "bid_vol": 10,
+                 "ask_price": 1.1, "ask_vol": 10}
+                for code, last_price in (("HK.00700", price), ("HK.00005", 60.0))
+            ])
+
+        self.quote_api.process_snapshot(snapshot(383.0))
+        self.assertEqual(self.gateway.on_tick.call_count, 2)
+
+        self.quote_api.process_snapshot(snapshot(383.2))
+        self.assertEqual(self.gateway.on_tick.call_count, 3)
+
+        tick = self.gateway.on_tick.call_args.args[0]
+        self.assertEqual(tick.vt_symbol, "00700.SEHK")
+        self.assertEqual(tick.last_price, 383.2)
+        self.assertEqual(tick.datetime, CHINA_TZ.localize(datetime(2025, 1, 2, 9, 30, 1)))
+
+    def test_tick_bus(self):
+        """
+        测试Tick写入共享内存总线，读取方按序号读取并跳过被覆盖的记录
+        """
+        name = f"futu_test_{int(time() * 1000)}"
+        self.quote_api.init_tick_bus(name, capacity=4)
+        reader = FutuTickBusReader(name)
+
+        try:
+            for i in range(6):
+                self.quote["last_price"] = 380.0 + i
+                self.quote_api.process_quote("HK.00700", self.quote)
+
+            records, sequence = reader.read(0)
+            self.assertEqual(sequence, 6)
+            self.assertEqual(reader.dropped, 2)
+            self.assertEqual(records["last_price"].tolist(), [382.0, 383.0, 384.0, 385.0])
+            self.assertEqual(records["vt_symbol"][0], b"00700.SEHK")
+
+            records, sequence = reader.read(sequence)
+            self.assertEqual(len(records), 0)
+        finally:
+            reader.close()
+            self.quote_api.close()
+
+    def test_ticker_buffer_wrap(self):
+        """
+        测试环形缓冲区写满后覆盖最旧记录
+        """
+        buffer = FutuTickerBuffer("00700.SEHK", capacity=4)
+
+        for i in range(3):
+            array = np.zeros(2, dtype=TICKER_DTYPE)
+            array["sequence"] = [i * 2, i * 2 + 1]
+            array["price"] = [i * 2, i * 2 + 1]
+            buffer.append(array)
+
+        self.assertEqual(buffer.count, 6)
+        self.assertEqual(buffer.get_latest(10)["price"].tolist(), [2, 3, 4, 5])
+        self.assertEqual(buffer.get_range(0, 3)["price"].tolist(), [2])
+
+    def test_conflation_batch(self):
+        """
+        测试按推送批次合并报价和盘口
+        """
+        self.quote_api.init_conflation("推送批次", 100)
+
+        self.quote_api.process_quote("HK.00700", self.quote)
+        self.quote_api.process_orderbook(self.orderbook)
+        self.gateway.on_tick.assert_not_called()
+
+        self.quote_api.on_push_batch()
+
+        self.gateway.on_tick.assert_called_once()
+        tick = self.gateway.on_tick.call_args.args[0]
+        self.assertEqual(tick.last_price, 383.2)
+        self.assertEqual(tick.bid_price_1, 383.0)
+        self.assertEqual(
+            self.quote_api.get_conflation_stats(),
+            {"received": 2, "emitted": 1, "coalesced": 1}
+        )
+
+
+class TestFutuPushParser(unittest.TestCase):
+    """
+    测试推送快速解析与SDK解析结果一致
+    """
+
+    def setUp(self):
+        """
+        测试前准备
+        """
+        self.event_engine = EventEngine()
+        self.gateway = FutuGateway(self.event_engine, "FUTU")
+        self.gateway.write_log = MagicMock()
+        self.gateway.on_tick = MagicMock()
+        self.gateway.on_order = MagicMock()
+        self.gateway.on_trade = MagicMock()
+        self.gateway.on_contract = MagicMock()
+
+    def test_quote_handler(self):
+        """
+        测试报价推送两种解析方式生成相同的Tick
+        """
+        ticks = []
+        for fast_push in (True, False):
+            quote_api = FutuQuoteApi(self.gateway)
+            quote_api.fast_push = fast_push
+            FutuQuoteHandler(quote_api).on_recv_rsp(generate_quote_pb())
+            ticks.append(self.gateway.on_tick.call_args.args[0])
+
+        fast_tick, sdk_tick = ticks
+        self.assertEqual(fast_tick.vt_symbol, "00700.SEHK")
+        self.assertEqual(fast_tick.last_price, 383.2)
+        self.assertEqual(fast_tick.datetime, CHINA_TZ.localize(datetime(2025, 1, 2, 9, 30, 1)))
+        for attr in ("datetime", "last_price", "open_price", "pre_close", "volume", "limit_up"):
+            self.assertEqual(getattr(fast_tick, attr), getattr(sdk_tick, attr))
+
+    def test_order_handler(self):
+        """
+        测试委托和成交推送两种解析方式生成相同的数据
+        """
+        order_pb = OrderResponse()
+        order_pb.retType = RET_OK
+        order_pb.s2c.header.trdEnv = 1
+        order_pb.s2c.header.accID = 1
+        order_pb.s2c.header.trdMarket = 1
+        order = order_pb.s2c.order
+        order.trdSide = 1
+        order.orderType = 1
+        order.orderStatus = 11
+        order.orderID = 8
+        order.orderIDEx = "8"
+        order.code = "00700"
+        order.name = ""
+        order.qty = 100
+        order.price = 383.2
+        order.createTime = "2025-01-02 09:30:01.123"
+        order.updateTime = "2025-01-02 09:30:02"
+        order.fillQty = 100
+        order.secMarket = 1
+
+        deal_pb = DealResponse()
+        deal_pb.retType = RET_OK
+        deal_pb.s2c.header.CopyFrom(order_pb.s2c.header)
+        deal = deal_pb.s2c.orderFill
+        deal.trdSide = 1
+        deal.fillID = 9
+        deal.fillIDEx = "9"
+        deal.orderIDEx = "8"
+        deal.code = "00700"
+        deal.name = ""
+        deal.qty = 100
+        deal.price = 383.2
+        deal.createTime = "2025-01-02 09:30:01"
+        deal.secMarket = 1
+
+        orders = []
+        trades = []
+        for fast_push in (True, False):
+            trade_api = FutuTradeApi(self.gateway)
+            trade_api.fast_push = fast_push
+            FutuOrderHandler(trade_api).on_recv_rsp(order_pb)
+            FutuDealHandler(trade_api).on_recv_rsp(deal_pb)
+            orders.append(self.gateway.on_order.call_args.args[0])
+            trades.append(self.gateway.on_trade.call_args.args[0])
+
+        self.assertEqual(orders[0].vt_orderid, "FUTU.8")
+        self.assertEqual(orders[0].status, Status.ALLTRADED)
+        self.assertEqual(trades[0].tradeid, "9")
+        self.assertEqual(trades[0].orderid, "8")
+        for attr in ("orderid", "direction", "price", "volume", "traded", "status", "datetime"):
+            self.assertEqual(getattr(orders[0], attr), getattr(orders[1], attr))
+        for attr in ("tradeid", "orderid", "direction", "price", "volume", "datetime"):
+            self.assertEqual(getattr(trades[0], attr), getattr(trades[1], attr))
+
+
+class TestFutuRecorder(unittest.TestCase):
+    """
+    测试推送录制和回放
+    """
+
+    def setUp(self):
+        """
+        测试前准备
+        """
+        self.event_engine = EventEngine()
+        self.gateway = FutuGateway(self.event_engine, "FUTU")
+        self.gateway.write_log = MagicMock()
+        self.gateway.on_tick = MagicMock()
+        self.gateway.on_order = MagicMock()
+        self.gateway.on_contract = MagicMock()
+
+    def test_record_replay(self):
+        """
+        测试录制的报价、盘口和委托按接收顺序回放
+        """
+        with TemporaryDirectory() as path:
+            recorder = FutuRecorder(path)
+
+            quote_api = FutuQuoteApi(self.gateway)
+            quote_api.recorder = recorder
+            quote_api.process_quote("HK.00700", {
+                "data_date": "2025-01-02", "data_time": "09:30:01", "last_price": 383.2, "price_spread": 0.2
+            })
+            quote_api.process_orderbook({
+                "code": "HK.00700",
+                "Bid": [(383.0 - i * 0.2, 100, 1, {}) for i in range(12)],
+                "Ask": [(383.2, 500, 1, {})],
+            })
+            recorder.record(RECORD_ORDER, FutuOrderRecord(
+                "HK.00700", "8", "BUY", "SUBMITTED", 383.2, 100, 0, "2025-01-02 09:30:02"
+            ))
+            recorder.close()
+
+            self.gateway.on_tick.reset_mock()
+            replayer = FutuReplayer(path)
+            count = replayer.replay(
+                datetime.now().date(),
+                datetime.now().date(),
+                quote_api=FutuQuoteApi(self.gateway),
+                trade_api=FutuTradeApi(self.gateway)
+            )
+
+        self.assertEqual(count, 3)
+        self.assertEqual(self.gateway.on_tick.call_count, 2)
+
+        tick = self.gateway.on_tick.call_args.args[0]
+        self.assertEqual(tick.last_price, 383.2)
+        self.assertEqual(tick.bid_price_5, 382.2)
+        self.assertEqual(tick.limit_up, 385.2)
+
+        order = self.gateway.on_order.call_args.args[0]
+        self.assertEqual(order.orderid, "8")
+        self.assertEqual(order.volume, 100)
+
+
+    def test_replay_live_api(self):
+        """
+        测试回放拒绝网关正在使用的API，避免改写实盘状态
+        """
+        with TemporaryDirectory() as path:
+            replayer = FutuReplayer(path)
+            today = datetime.now().date()
+
+            with self.assertRaises(ValueError):
+                replayer.replay(today, today, trade_api=self.gateway.trade_api)
+            with self.assertRaises(ValueError):
+                replayer.replay(today, today, quote_api=self.gateway.quote_api)
+
+        self.assertFalse(self.gateway.trade_api.orders)
+
+
+class TestFutuQuoteApiContract(unittest.TestCase):
+    """
+    测试富途行情API合约信息快照
+    """
+
+    def setUp(self):
+        """
+        测试前准备
+        """
+        self.event_engine = EventEngine()
+        self.gateway = FutuGateway(self.event_engine, "FUTU")
+        self.gateway.write_log = MagicMock()
+        self.gateway.on_contract = MagicMock()
+
+        self.temp_dir = TemporaryDirectory()
+        self.path = Path(self.temp_dir.name).joinpath("futu_contract.json")
+
+        self.quote_api = self.create_quote_api()
+
+    def tearDown(self):
+        """
+        测试后清理
+        """
+        self.temp_dir.cleanup()
+
+    def create_quote_api(self) -> FutuQuoteApi:
+        """
+        创建使用临时快照文件的行情API
+        """
+        quote_api = FutuQuoteApi(self.gateway)
+        quote_api.quote_ctx = MagicMock()
+        quote_api.contract_path = self.path
+        quote_api.init_contract_master(["HK"], ["STOCK"])
+        return quote_api
+
+    def test_query_contract_snapshot(self):
+        """
+        测试合约信息查询保存快照，再次加载时不访问OpenD
+        """
+        self.quote_api.quote_ctx.get_stock_basicinfo.return_value = (RET_OK, DataFrame([
+            {"code": "HK.00700", "name": "腾讯控股", "lot_size": 100},
+            {"code": "HK.00005", "name": "汇丰控股", "lot_size": 400},
+        ]))
+
+        self.quote_api.query_contract()
+        self.gateway.on_contract.assert_not_called()
+
+        quote_api = self.create_quote_api()
+        quote_api.load_contract()
+        quote_api.quote_ctx.get_stock_basicinfo.assert_not_called()
+
+        contract = quote_api.get_contract("HK.00700")
+        self.assertEqual(contract.name, "腾讯控股")
+        self.assertEqual(contract.min_volume, 100)
+        self.assertIs(quote_api.get_contract("HK.00700"), contract)
+        self.gateway.on_contract.assert_called_once()
+
+        self.assertIsNone(quote_api.get_contract("HK.99999"))
+
+
+    def test_load_corrupt_snapshot(self):
+        """
+        测试快照文件损坏时记录日志并改为全量查询
+        """
+        with open(self.path, mode="w", encoding="UTF-8") as f:
+            f.write('{"update_time": 1, "markets": ["HK"], "code": ["HK.00')
+
+        quote_api = self.create_quote_api()
+        self.assertFalse(quote_api.load_contract_snapshot())
+        self.assertFalse(quote_api.contract_rows)
+        self.assertTrue(self.gateway.write_log.call_args.args[0].startswith("合约信息快照读取失败"))
+
+
+class TestFutuTradeApiQuery(unittest.TestCase):
+    """
+    测试富途交易API多市场并发查询
+    """
+
+    def setUp(self):
+        """
+        测试前准备
+        """
+        self.event_engine = EventEngine()
+        self.gateway = FutuGateway(self.event_engine, "FUTU")
+        self.gateway.write_log = MagicMock()
+        self.gateway.on_account = MagicMock()
+
+        self.trade_api = FutuTradeApi(self.gateway)
+
+        self.hk_ctx = MagicMock()
+        self.us_ctx = MagicMock()
+        self.cn_ctx = MagicMock()
+        self.trade_api.trade_ctx = {
+            Market.HK: self.hk_ctx,
+            Market.US: self.us_ctx,
+            Market.SH: self.cn_ctx,
+            Market.SZ: self.cn_ctx,
+        }
+
+    def test_query_account_concurrent(self):
+        """
+        测试各市场同时查询，单个市场失败不影响其他市场
+        """
+        def accinfo_query(**kwargs):
+            sleep(0.2)
+            return RET_OK, DataFrame([{"power": 1000.0, "cash": 1000.0, "frozen_cash": 10.0}])
+
+        self.hk_ctx.accinfo_query.side_effect = accinfo_query
+        self.us_ctx.accinfo_query.side_effect = accinfo_query
+        self.cn_ctx.accinfo_query.return_value = (RET_ERROR, "未开通")
+
+        start = time()
+        self.trade_api.query_account()
+        self.assertLess(time() - start, 0.35)
+
+        self.cn_ctx.accinfo_query.assert_called_once()
+        self.assertEqual(self.gateway.on_account.call_count, 2)
+        self.gateway.write_log.assert_called_with("账户资金查询失败: SH 未开通")
+
+    def test_timer_query_interval(self):
+        """
+        测试资金按10秒间隔查询，持仓和资金按核对间隔一起查询
+        """
+        self.gateway.trade_api = MagicMock()
+
+        for _ in range(60):
+            self.gateway.process_timer_event(None)
+            if self.gateway.reconcile_thread:
+                self.gateway.reconcile_thread.join()
+
+        self.assertEqual(self.gateway.trade_api.query_account.call_count, 5)
+        self.assertEqual(self.gateway.trade_api.query_portfolio.call_count, 1)
+
+
+class TestFutuRequestScheduler(unittest.TestCase):
+    """
+    测试请求调度器的优先级和频率限制
+    """
+
+    def test_priority(self):
+        """
+        测试撤单 > 下单 > 查询 > 历史数据
+        """
+        scheduler = FutuRequestScheduler({}, workers=1)
+        release = Event()
+        executed = []
+
+        scheduler.submit("block", PRIORITY_CANCEL, release.wait, 5)
+        self.assertTrue(wait_until(lambda: scheduler.get_metrics()["cancel"]["count"] == 1))
+
+        futures = [
+            scheduler.submit(name, priority, executed.append, name)
+            for name, priority in [
+                ("history", PRIORITY_HISTORY), ("query", PRIORITY_QUERY), ("place", PRIORITY_PLACE), ("cancel", PRIORITY_CANCEL)
+            ]
+        ]
+        self.assertEqual(scheduler.get_metrics()["history"]["depth"], 1)
+
+        release.set()
+        for future in futures:
+            future.result(5)
+        scheduler.close()
+
+        self.assertEqual(executed, ["cancel", "place", "query", "history"])
+
+    def test_rate_limit(self):
+        """
+        测试令牌不足时等待归还，不同会话分别计数，不阻塞其他接口
+        """
+        scheduler = FutuRequestScheduler({"place_order": 2}, period=0.3)
+
+        start = time()
+        futures = [scheduler.submit("place_order.HK", PRIORITY_PLACE, time) for _ in range(3)]
+        submitted = time() - start
+        other = scheduler.submit("place_order.US", PRIORITY_PLACE, time)
+        query = scheduler.submit("order_list_query.HK", PRIORITY_QUERY, time)
+        times = [future.result(5) - start for future in futures]
+
+        self.assertLess(times[1], 0.1)
+        self.assertGreaterEqual(times[2], 0.29)
+        self.assertLess(other.result(5) - start, 0.1)
+        self.assertLess(query.result(5) - start, 0.1)
+
+        metrics = scheduler.get_metrics()
+        scheduler.close()
+        self.assertEqual(metrics["place"]["count"], 4)
+        self.assertEqual(metrics["place"]["depth"], 0)
+        # 等待时间从提交时开始计算，第三笔提交晚于第一笔取得令牌
+        self.assertGreaterEqual(metrics["place"]["max_wait"], 0.29 - submitted)
+
+
+    def test_closed(self):
+        """
+        测试关闭后提交的请求直接失败，不再重新启动工作线程
+        """
+        scheduler = FutuRequestScheduler({}, workers=2)
+        scheduler.call("query", PRIORITY_QUERY, time)
+        scheduler.close()
+
+        future = scheduler.submit("query", PRIORITY_QUERY, time)
+
+        self.assertIsInstance(future.exception(), RuntimeError)
+        self.assertFalse(scheduler.threads)
+        self.assertFalse(scheduler.active)
+
+
+class TestFutuLedger(unittest.TestCase):
+    """
+    测试本地持仓资金账本
+    """
+
+    def setUp(self):
+        """
+        测试前准备
+        """
+        self.ledger = FutuLedger("FUTU")
+        self.accountid = "FUTU_HK"
+        self.ledger.reconcile_account(self.accountid, 100000, 0)
+        self.ledger.reconcile_positions(self.accountid, [], 0)
+
+    def create_trade(self, tradeid, direction, volume, price):
+        """生成成交数据"""
+        return TradeData(
+            symbol="00700", exchange=Exchange.SEHK, tradeid=tradeid, orderid="1", direction=direction,
+            price=price, volume=volume, gateway_name="FUTU"
+        )
+
+    def test_trade(self):
+        """
+        测试成交更新持仓数量、均价和现金
+        """
+        self.ledger.on_trade(self.create_trade("1", Direction.LONG, 100, 380), self.accountid)
+        pos = self.ledger.on_trade(self.create_trade("2", Direction.LONG, 100, 390), self.accountid)
+        self.assertEqual(pos.volume, 200)
+        self.assertEqual(pos.price, 385)
+        self.assertEqual(self.ledger.cashes[self.accountid], 100000 - 77000)
+
+        pos = self.ledger.on_trade(self.create_trade("3", Direction.SHORT, 200, 400), self.accountid)
+        self.assertEqual(pos.volume, 0)
+        self.assertEqual(pos.price, 0)
+        self.assertEqual(self.ledger.cashes[self.accountid], 100000 + 3000)
+
+    def test_order_frozen(self):
+        """
+        测试卖出委托冻结持仓，成交和撤单后释放
+        """
+        order = OrderData(
+            symbol="00700", exchange=Exchange.SEHK, orderid="1", direction=Direction.SHORT,
+            volume=100, status=Status.NOTTRADED, gateway_name="FUTU"
+        )
+        self.assertEqual(self.ledger.on_order(order, self.accountid).frozen, 100)
+        self.assertIsNone(self.ledger.on_order(order, self.accountid))
+
+        order.traded = 40
+        order.status = Status.PARTTRADED
+        self.assertEqual(self.ledger.on_order(order, self.accountid).frozen, 60)
+
+        order.status = Status.CANCELLED
+        self.assertEqual(self.ledger.on_order(order, self.accountid).frozen, 0)
+
+    def test_reconcile(self):
+        """
+        测试核对差异以券商为准，查询发出后有成交的合约跳过核对
+        """
+        self.ledger.on_trade(self.create_trade("1", Direction.LONG, 100, 380), self.accountid)
+        seq = self.ledger.mark()
+
+        broker = PositionData(symbol="00700", exchange=Exchange.SEHK, direction=Direction.LONG, volume=200, gateway_name="FUTU")
+        positions, drifts = self.ledger.reconcile_positions(self.accountid, [broker], seq)
+        self.assertEqual(drifts, ["持仓核对差异: 00700.SEHK 本地100 券商200"])
+        self.assertEqual(positions[0].volume, 200)
+
+        self.ledger.on_trade(self.create_trade("2", Direction.LONG, 100, 380), self.accountid)
+        positions, drifts = self.ledger.reconcile_positions(self.accountid, [broker], seq)
+        self.assertEqual((positions, drifts), ([], []))
+        self.assertEqual(self.ledger.positions["00700.SEHK"].volume, 300)
+
+        self.assertEqual(self.ledger.reconcile_account(self.accountid, 0, seq), [])
+        self.assertEqual(self.ledger.cashes[self.accountid], 24000)
+
+        # 差额在两笔成交的手续费容差内
+        seq = self.ledger.mark()
+        self.assertEqual(self.ledger.reconcile_account(self.accountid, 23950, seq), [])
+
+        self.ledger.on_trade(self.create_trade("3", Direction.LONG, 100, 100), self.accountid)
+        seq = self.ledger.mark()
+        drifts = self.ledger.reconcile_account(self.accountid, 13000, seq)
+        self.assertEqual(drifts, ["资金核对差异: FUTU_HK 本地13950.00 券商13000.00"])
+        self.assertEqual(self.ledger.cashes[self.accountid], 13000)
+
+
+    def test_reconcile_overlapping_queries(self):
+        """
+        测试其他查询重新取序号后，在途核对仍按自身发出时的序号跳过新成交
+        """
+        seq = self.ledger.mark()
+        self.ledger.on_trade(self.create_trade("1", Direction.LONG, 100, 380), self.accountid)
+        self.ledger.mark()
+
+        broker = PositionData(symbol="00700", exchange=Exchange.SEHK, direction=Direction.LONG, volume=0, gateway_name="FUTU")
+        self.assertEqual(self.ledger.reconcile_positions(self.accountid, [broker], seq), ([], []))
+        self.assertEqual(self.ledger.reconcile_account(self.accountid, 100000, seq), [])
+        self.assertEqual(self.ledger.positions["00700.SEHK"].volume, 100)
+        self.assertEqual(self.ledger.cashes[self.accountid], 62000)
+
+
+class TestFutuTradeApiSender(unittest.TestCase):
+    """
+    测试富途交易API异步委托发送
+    """
+
+    def setUp(self):
+        """
+        测试前准备
+        """
+        self.event_engine = EventEngine()
+        self.gateway = FutuGateway(self.event_engine, "FUTU")
+        self.gateway.write_log = MagicMock()
+        self.gateway.on_order = MagicMock()
+        self.gateway.on_trade = MagicMock()
+
+        self.trade_api = FutuTradeApi(self.gateway)
+
+        # 下单请求阻塞到release被设置
+        self.release = Event()
+        self.hk_ctx = MagicMock()
+        self.hk_ctx.place_order.side_effect = self.place_order
+        self.hk_ctx.modify_order.return_value = (RET_OK, DataFrame())
+        self.trade_api.trade_ctx = {Market.HK: self.hk_ctx}
+
+        self.req = OrderRequest(
+            symbol="00700",
+            exchange=Exchange.SEHK,
+            direction=Direction.LONG,
+            type=OrderType.LIMIT,
+            volume=100,
+            price=380,
+        )
+
+    def tearDown(self):
+        """
+        测试后清理
+        """
+        self.release.set()
+        self.gateway.scheduler.close()
+
+    def place_order(self, **kwargs):
+        """模拟下单，返回递增的富途委托号"""
+        self.release.wait(5)
+        return RET_OK, DataFrame([{"order_id": str(1000 + self.hk_ctx.place_order.call_count)}])
+
+    def test_send_order_async(self):
+        """
+        测试下单立即返回本地委托号，推送早于下单返回时关联到本地委托号
+        """
+        vt_orderid = self.trade_api.send_order(self.req)
+        orderid = vt_orderid.split(".", 1)[1]
+
+        order = self.gateway.on_order.call_args.args[0]
+        self.assertEqual(order.vt_orderid, vt_orderid)
+        self.assertEqual(order.status, Status.SUBMITTING)
+        self.assertTrue(wait_until(lambda: len(self.trade_api.sending_orderids) == 1))
+
+        # 下单请求返回前收到成交推送
+        self.trade_api.process_deal_record(FutuDealRecord(
+            "HK.00700", "D1", "1001", "BUY", 380, 100, "2025-01-02 10:00:00"
+        ))
+        self.gateway.on_trade.assert_not_called()
+
+        self.release.set()
+        self.assertTrue(wait_until(lambda: self.gateway.on_trade.called))
+        self.assertEqual(self.gateway.on_trade.call_args.args[0].vt_orderid, vt_orderid)
+        self.assertEqual(self.gateway.futu_orderids[orderid], "1001")
+        self.assertEqual(self.gateway.local_orderids["1001"], orderid)
+
+    def test_query_deal_skip_ledger(self):
+        """
+        测试查询到的成交不更新本地账本，成交推送更新本地账本
+        """
+        self.gateway.on_position = MagicMock()
+        deal = {
+            "code": "HK.00700", "deal_id": "D1", "order_id": "1001", "trd_side": "SELL",
+            "price": 380, "qty": 100, "create_time": "2025-01-02 10:00:00"
+        }
+
+        self.trade_api.process_deal(DataFrame([deal]))
+        self.gateway.on_trade.assert_called_once()
+        self.gateway.on_position.assert_not_called()
+        self.assertEqual(self.trade_api.ledger.positions, {})
+
+        self.trade_api.process_deal_record(FutuDealRecord.from_dict(dict(deal, deal_id="D2")))
+        self.assertEqual(self.gateway.on_position.call_args.args[0].volume, -100)
+
+    def test_cancel_before_ack(self):
+        """
+        测试排队中的委托直接撤销，已发出未返回的委托在返回后撤单
+        """
+        # 只有一个工作线程，第二笔委托在第一笔返回前保持排队
+        self.gateway.scheduler = self.trade_api.scheduler = FutuRequestScheduler(REQUEST_LIMITS, workers=1)
+
+        vt_orderid1 = self.trade_api.send_order(self.req)
+        vt_orderid2 = self.trade_api.send_order(self.req)
+        self.assertTrue(wait_until(lambda: len(self.trade_api.sending_orderids) == 1))
+
+        for vt_orderid in [vt_orderid1, vt_orderid2]:
+            self.trade_api.cancel_order(CancelRequest(
+                orderid=vt_orderid.split(".", 1)[1], symbol="00700", exchange=Exchange.SEHK
+            ))
+
+        self.release.set()
+        orderid2 = vt_orderid2.split(".", 1)[1]
+        self.assertTrue(wait_until(
+            lambda: self.hk_ctx.modify_order.called and self.trade_api.orders[orderid2].status == Status.CANCELLED
+        ))
+
+        # 第一笔收到富途委托号后撤单，第二笔未发出
+        self.hk_ctx.place_order.assert_called_once()
+        self.assertEqual(self.hk_ctx.modify_order.call_args.kwargs["order_id"], 1001)
+
+    def test_cancel_inactive_order(self):
+        """
+        测试已结束的委托拒绝撤单，不向富途发送撤单请求
+        """
+        self.gateway.scheduler = self.trade_api.scheduler = FutuRequestScheduler(REQUEST_LIMITS, workers=1)
+
+        # 排队中撤销的委托在发出时变为已撤销
+        vt_orderid = self.trade_api.send_order(self.req)
+        orderid = vt_orderid.split(".", 1)[1]
+        self.trade_api.cancel_order(CancelRequest(orderid=orderid, symbol="00700", exchange=Exchange.SEHK))
+        self.release.set()
+        self.assertTrue(wait_until(lambda: self.trade_api.orders[orderid].status == Status.CANCELLED))
+
+        self.trade_api.cancel_order(CancelRequest(orderid=orderid, symbol="00700", exchange=Exchange.SEHK))
+        self.gateway.write_log.assert_called_with(f"撤单失败，委托已结束: {orderid}")
+
+        # 没有富途委托号的本地委托号不会被当作富途委托号
+        self.assertIsNone(self.trade_api.get_futu_orderid(orderid))
+        self.assertEqual(self.trade_api.get_futu_orderid("1234"), "1234")
+        self.hk_ctx.modify_order.assert_not_called()
+
+    def test_amend_coalesce(self):
+        """
+        测试改单请求在途时，连续改单只发送最新的目标
+        """
+        self.release.set()
+        vt_orderid = self.trade_api.send_order(self.req)
+        orderid = vt_orderid.split(".", 1)[1]
+        self.assertTrue(wait_until(lambda: orderid in self.gateway.futu_orderids))
+
+        amend_release = Event()
+        self.hk_ctx.modify_order.side_effect = lambda *args, **kwargs: (amend_release.wait(5), (RET_OK, DataFrame()))[1]
+
+        self.trade_api.amend_order(orderid, 381, 100)
+        self.assertTrue(wait_until(lambda: orderid in self.trade_api.amending_orderids))
+        self.trade_api.amend_order(orderid, 382, 200)
+        self.trade_api.amend_order(orderid, 383, 300)
+
+        amend_release.set()
+        self.assertTrue(wait_until(lambda: self.trade_api.get_amend_metrics()["count"] == 2))
+
+        calls = self.hk_ctx.modify_order.call_args_list
+        self.assertEqual([(call.kwargs["price"], call.kwargs["qty"]) for call in calls], [(381, 100), (383, 300)])
+        self.assertEqual(calls[0].args[0], ModifyOrderOp.NORMAL)
+        self.assertEqual(calls[0].kwargs["order_id"], 1001)
+
+        metrics = self.trade_api.get_amend_metrics()
+        self.assertEqual(metrics["coalesced"], 1)
+        self.assertEqual(metrics["failed"], 0)
+        self.assertGreater(metrics["max_latency"], 0)
+
+    def test_send_orders(self):
+        """
+        测试批量下单同时提交，汇总结果
+        """
+        self.release.set()
+        self.hk_ctx.place_order.side_effect = lambda **kwargs: (sleep(0.2), (RET_OK, DataFrame([{"order_id": kwargs["price"]}])))[1]
+
+        reqs = [
+            OrderRequest(symbol="00700", exchange=Exchange.SEHK, direction=Direction.LONG, type=OrderType.LIMIT, volume=100, price=i)
+            for i in range(1, 6)
+        ]
+        reqs.append(OrderRequest(symbol="AAPL", exchange=Exchange.NASDAQ, direction=Direction.LONG, type=OrderType.LIMIT, volume=1, price=1))
+
+        start = time()
+        result = self.trade_api.send_orders(reqs)
+        self.assertLess(time() - start, 0.5)
+
+        self.assertEqual(self.hk_ctx.place_order.call_count, 5)
+        self.assertEqual(result.vt_orderids[-1], "")
+        self.assertEqual(result.errors, {5: "交易会话未创建: US"})
+        for i, vt_orderid in enumerate(result.vt_orderids[:-1]):
+            self.assertEqual(self.gateway.futu_orderids[vt_orderid.split(".", 1)[1]], str(i + 1))
+
+    def test_cancel_all(self):
+        """
+        测试全部撤单失败时改为逐笔撤单
+        """
+        self.release.set()
+        vt_orderids = [self.trade_api.send_order(self.req) for _ in range(3)]
+        self.assertTrue(wait_until(lambda: len(self.gateway.futu_orderids) == 3))
+
+        self.hk_ctx.cancel_all_order.return_value = (RET_ERROR, "模拟环境不支持")
+        result = self.trade_api.cancel_all()
+
+        self.hk_ctx.cancel_all_order.assert_called_once()
+        self.assertEqual(result.vt_orderids, vt_orderids)
+        self.assertEqual(result.errors, {})
+        self.assertEqual(
+            sorted(call.kwargs["order_id"] for call in self.hk_ctx.modify_order.call_args_list),
+            [1001, 1002, 1003]
+        )
+
+    def test_cancel_all_unknown_market(self):
+        """
+        测试未创建交易会话的市场全部撤单时返回错误
+        """
+        result = self.trade_api.cancel_all(Market.US)
+
+        self.assertEqual(result.vt_orderids, [""])
+        self.assertEqual(result.errors, {0: "交易会话未创建: US"})
+        self.hk_ctx.cancel_all_order.assert_not_called()
+        self.gateway.write_log.assert_called_with("全部撤单失败，交易会话未创建: US")
+
+    def test_scheduler_closed(self):
+        """
+        测试调度器关闭时排队的委托被拒单，关闭后的撤单记录为逐笔错误
+        """
+        self.gateway.scheduler = self.trade_api.scheduler = FutuRequestScheduler(REQUEST_LIMITS, workers=1)
+
+        first = self.trade_api.send_order(self.req).split(".", 1)[1]
+        self.assertTrue(wait_until(lambda: self.hk_ctx.place_order.call_count == 1))
+        second = self.trade_api.send_order(self.req).split(".", 1)[1]
+
+        closer = Thread(target=self.trade_api.scheduler.close)
+        closer.start()
+        self.assertTrue(wait_until(lambda: self.trade_api.orders[second].status == Status.REJECTED))
+        self.release.set()
+        closer.join(5)
+
+        result = self.trade_api.cancel_all()
+        self.assertFalse(self.trade_api.scheduler.threads)
+        self.assertEqual(result.vt_orderids, [f"FUTU.{first}"])
+        self.assertIn("请求调度器已关闭", result.errors[0])
+
+        # 被取消的请求同样记录为逐笔错误
+        future = Future()
+        future.cancel()
+        result = FutuBatchResult(["FUTU.1"])
+        self.trade_api.collect_results(result, [(0, future)])
+        self.assertEqual(result.errors, {0: "请求已取消，请求调度器已关闭"})
+
+
+class TestFutuGatewayOpenD(unittest.TestCase):
+    """
+    使用本地OpenD模拟服务测试完整的连接、行情和交易流程
+    """
+
+    def setUp(self):
+        """
+        测试前准备
+        """
+        self.stub = OpenDStub()
+        self.stub.add_contract("HK.00700", "腾讯控股", 100, price=380)
+        self.stub.add_contract("HK.09988", "阿里巴巴", 100, price=80)
+        port = self.stub.start()
+
+        self.temp_dir = TemporaryDirectory()
+
+        self.event_engine = EventEngine()
+        self.gateway = FutuGateway(self.event_engine, "FUTU")
+        self.gateway.write_log = MagicMock()
+        self.gateway.on_tick = MagicMock()
+        self.gateway.on_order = MagicMock()
+        self.gateway.on_trade = MagicMock()
+        self.gateway.on_position = MagicMock()
+        self.gateway.on_account = MagicMock()
+        self.gateway.on_contract = MagicMock()
+        self.gateway.quote_api.contract_path = Path(self.temp_dir.name).joinpath("futu_contract.json")
+
+        self.gateway.connect({
+            "API地址": "127.0.0.1",
+            "API端口": port,
+            "市场环境": "模拟环境",
+            "交易服务器": ["港股"],
+            "合约市场": "HK",
+            "合约类型": "STOCK",
+        })
+
+    def tearDown(self):
+        """
+        测试后清理
+        """
+        self.gateway.close()
+        self.stub.stop()
+        self.temp_dir.cleanup()
+
+    def test_quote_pushes(self):
+        """
+        测试订阅后接收报价、盘口和逐笔推送
+        """
+        self.assertTrue(wait_until(lambda: "HK.00700" in self.gateway.quote_api.contract_rows))
+
+        self.gateway.subscribe(SubscribeRequest(symbol="00700", exchange=Exchange.SEHK))
+        self.assertTrue(wait_until(lambda: self.stub.connections and any(
+            c.subscriptions for c in self.stub.connections
+        )))
+
+        self.stub.start_pushes(["HK.00700", "HK.09988"], [(500, 0.4)])
+        self.stub.wait_pushes()
+
+        contract = self.stub.contracts["HK.00700"]
+        self.assertTrue(wait_until(
+            lambda: self.gateway.on_tick.call_args
+            and self.gateway.on_tick.call_args.args[0].last_price == contract.last_price
+            and self.gateway.on_tick.call_args.args[0].bid_price_1 == round(contract.last_price - 0.01, 3)
+        ))
+
+        ticks = [c.args[0] for c in self.gateway.on_tick.call_args_list]
+        self.assertEqual({tick.vt_symbol for tick in ticks}, {"00700.SEHK"})
+        self.assertEqual(ticks[-1].name, "腾讯控股")
+
+    def test_query_history(self):
+        """
+        测试历史K线分页下载
+        """
+        req = HistoryRequest(
+            symbol="00700",
+            exchange=Exchange.SEHK,
+            interval=Interval.MINUTE,
+            start=datetime(2025, 1, 2),
+            end=datetime(2025, 1, 8),
+        )
+        bars = self.gateway.query_history(req)
+
+        # 5个交易日，每日330根分钟线
+        self.assertEqual(len(bars), 1650)
+        self.assertGreater(self.stub.request_counts["Qot_RequestHistoryKL"], 1)
+        self.assertEqual(bars[0].datetime.strftime("%Y-%m-%d %H:%M"), "2025-01-02 09:31")
+
+    def test_send_order(self):
+        """
+        测试委托成交推送和撤单
+        """
+        req = OrderRequest(
+            symbol="00700",
+            exchange=Exchange.SEHK,
+            direction=Direction.LONG,
+            type=OrderType.LIMIT,
+            volume=100,
+            price=380,
+        )
+        vt_orderid = self.gateway.send_order(req)
+        self.assertTrue(vt_orderid)
+
+        self.assertTrue(wait_until(lambda: self.gateway.on_trade.called))
+        trade = self.gateway.on_trade.call_args.args[0]
+        self.assertEqual(trade.vt_orderid, vt_orderid)
+        self.assertEqual(trade.volume, 100)
+        self.assertEqual(trade.price, 380)
+
+        self.stub.fill_mode = False
+        vt_orderid = self.gateway.send_order(req)
+        self.gateway.cancel_order(CancelRequest(orderid=vt_orderid.split(".", 1)[1], symbol="00700", exchange=Exchange.SEHK))
+
+        self.assertTrue(wait_until(
+            lambda: self.gateway.on_order.call_args.args[0].status == Status.CANCELLED
+        ))
+        self.assertEqual(self.gateway.on_order.call_args.args[0].vt_orderid, vt_orderid)
+        self.assertEqual(self.stub.unknown_protos, set())
+
+    def test_position_ledger(self):
+        """
+        测试成交后立即推送持仓和资金，核对查询没有差异
+        """
+        self.gateway.send_order(OrderRequest(
+            symbol="00700", exchange=Exchange.SEHK, direction=Direction.LONG, type=OrderType.LIMIT, volume=100, price=380
+        ))
+
+        def filled():
+            return any(
+                call.args[0].vt_symbol == "00700.SEHK" and call.args[0].volume == 100
+                for call in self.gateway.on_position.call_args_list
+            )
+
+        self.assertTrue(wait_until(filled))
+        self.assertEqual(self.gateway.trade_api.ledger.cashes["FUTU_HK"], 1_000_000 - 38000)
+
+        self.gateway.trade_api.query_portfolio()
+        self.assertFalse([call for call in self.gateway.write_log.call_args_list if "核对差异" in call.args[0]])
+        self.assertEqual(self.gateway.trade_api.ledger.positions["00700.SEHK"].volume, 100)
+
+    def test_amend_order(self):
+        """
+        测试改单后收到新价格和数量的委托推送
+        """
+        self.stub.fill_mode = False
+        req = OrderRequest(symbol="00700", exchange=Exchange.SEHK, direction=Direction.LONG, type=OrderType.LIMIT, volume=100, price=370)
+        vt_orderid = self.gateway.send_order(req)
+        orderid = vt_orderid.split(".", 1)[1]
+
+        self.gateway.amend_order(orderid, 371, 200)
+
+        def amended():
+            order = self.gateway.trade_api.orders[orderid]
+            return order.price == 371 and order.volume == 200
+
+        self.assertTrue(wait_until(amended))
+        self.assertEqual(self.gateway.get_amend_metrics()["count"], 1)
+
+    def test_cancel_all(self):
+        """
+        测试批量下单后全部撤单
+        """
+        self.stub.fill_mode = False
+        reqs = [
+            OrderRequest(symbol=symbol, exchange=Exchange.SEHK, direction=Direction.LONG, type=OrderType.LIMIT, volume=100, price=10)
+            for symbol in ["00700", "09988", "00700"]
+        ]
+        result = self.gateway.send_orders(reqs)
+        self.assertEqual(result.errors, {})
+
+        result = self.gateway.cancel_all("HK")
+        self.assertEqual(len(set(result.vt_orderids)), 3)
+        self.assertEqual(result.errors, {})
+
+        def all_cancelled():
+            return all(self.gateway.trade_api.orders[vt_orderid.split(".", 1)[1]].status == Status.CANCELLED for vt_orderid in result.vt_orderids)
+
+        self.assertTrue(wait_until(all_cancelled))
+        self.gateway.write_log.assert_any_call("全部撤单完成，成功3笔，共3笔")
+        self.assertEqual(self.stub.request_counts["Trd_ModifyOrder"], 1)
+        self.assertEqual(self.stub.unknown_protos, set())
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
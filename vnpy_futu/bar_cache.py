@@ -0,0 +1,162 @@
+"""
+富途历史K线本地缓存
+
+每个(富途代码, K线类型, 复权类型)对应一组文件：
+    {key}.npy   按时间排序的K线结构化数组，读取时内存映射
+    {key}.json  已完整覆盖的日期区间和数据版本（复权因子指纹）
+"""
+
+import os
+import json
+from datetime import date
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+
+class FutuBarCache:
+    """历史K线磁盘缓存"""
+
+    def __init__(self, path: Path, dtype: np.dtype) -> None:
+        """构造函数"""
+        self.path: Path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        self.dtype: np.dtype = dtype
+
+        self.locks: Dict[str, Lock] = {}
+        self.locks_lock: Lock = Lock()
+
+    def get_lock(self, key: str) -> Lock:
+        """获取单个缓存键的读写锁"""
+        with self.locks_lock:
+            lock = self.locks.get(key, None)
+            if not lock:
+                lock = Lock()
+                self.locks[key] = lock
+            return lock
+
+    def get_meta(self, key: str) -> Optional[dict]:
+        """读取缓存元数据"""
+        meta_path: Path = self.path.joinpath(f"{key}.json")
+        if not meta_path.exists():
+            return None
+
+        with open(meta_path, encoding="UTF-8") as f:
+            return json.load(f)
+
+    def get_coverage(self, key: str) -> Optional[Tuple[date, date]]:
+        """读取缓存已覆盖的日期区间"""
+        meta: Optional[dict] = self.get_meta(key)
+        if not meta:
+            return None
+
+        return date.fromisoformat(meta["start"]), date.fromisoformat(meta["end"])
+
+    def get_version(self, key: str) -> Optional[str]:
+        """读取缓存数据版本，没有覆盖区间时返回None"""
+        meta: Optional[dict] = self.get_meta(key)
+        if not meta:
+            return None
+
+        return meta.get("version", None)
+
+    def clear(self, key: str) -> None:
+        """删除缓存数据和覆盖区间，调用方需持有get_lock(key)"""
+        for suffix in ("npy", "json"):
+            self.path.joinpath(f"{key}.{suffix}").unlink(missing_ok=True)
+
+    def load(self, key: str, start: date, end: date) -> np.ndarray:
+        """读取[start, end]日期范围内的K线，返回独立拷贝"""
+        arrays = list(self.iter_load(key, start, end))
+        if not arrays:
+            return np.empty(0, dtype=self.dtype)
+
+        return np.concatenate(arrays)
+
+    def iter_load(self, key: str, start: date, end: date, chunk_size: int = 0) -> Iterator[np.ndarray]:
+        """
+        按chunk_size条分段读取[start, end]日期范围内的K线，每段为独立拷贝。
+
+        每段都在缓存键的锁内打开内存映射、复制后立即释放映射，再在锁外返回，
+        读取期间缓存被update替换时，下一段从新文件中上一段之后的时间继续读取。
+        """
+        data_path: Path = self.path.joinpath(f"{key}.npy")
+
+        left: np.datetime64 = np.datetime64(start, "s")
+        right: np.datetime64 = np.datetime64(end, "s") + np.timedelta64(1, "D")
+        side: str = "left"
+
+        while True:
+            with self.get_lock(key):
+                if not data_path.exists():
+                    return
+
+                array: np.ndarray = np.load(data_path, mmap_mode="r")
+
+                # 数据按时间排序，二分定位切片，只读取命中的部分
+                ix_start: int = int(np.searchsorted(array["datetime"], left, side))
+                ix_end: int = int(np.searchsorted(array["datetime"], right))
+
+                size: int = chunk_size or ix_end - ix_start
+                chunk: np.ndarray = np.array(array[ix_start:min(ix_start + size, ix_end)])
+                del array
+
+            if not len(chunk):
+                return
+
+            yield chunk
+
+            # 下一段从本段最后一条之后开始
+            left = chunk["datetime"][-1]
+            side = "right"
+
+    def update(
+        self,
+        key: str,
+        array: np.ndarray,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        version: Optional[str] = None
+    ) -> None:
+        """合并新下载的K线，并把覆盖区间扩展到[start, end]
+
+        调用方需持有get_lock(key)，并保证[start, end]与已有覆盖区间相邻或重叠，
+        不传start和end时只合并数据，不改变覆盖区间。
+        version为数据版本，与get_version比较不一致时调用方应先clear。
+        """
+        data_path: Path = self.path.joinpath(f"{key}.npy")
+        meta_path: Path = self.path.joinpath(f"{key}.json")
+
+        coverage: Optional[Tuple[date, date]] = self.get_coverage(key)
+        if not start or not end:
+            if not coverage:
+                start = end = None
+            else:
+                start, end = coverage
+        elif coverage:
+            start = min(start, coverage[0])
+            end = max(end, coverage[1])
+
+        if data_path.exists():
+            old: np.ndarray = np.load(data_path)
+            merged: np.ndarray = np.concatenate([array, old])
+        else:
+            merged = array
+
+        # 按时间去重，新数据优先
+        _, index = np.unique(merged["datetime"], return_index=True)
+        merged = merged[index]
+
+        # 先写临时文件再替换，避免中断后留下损坏的缓存
+        tmp_path: Path = data_path.with_suffix(".tmp.npy")
+        np.save(tmp_path, merged)
+        os.replace(tmp_path, data_path)
+
+        if not start:
+            return
+
+        with open(meta_path, mode="w", encoding="UTF-8") as f:
+            json.dump({"start": start.isoformat(), "end": end.isoformat(), "version": version}, f)
@@ -9,11 +9,21 @@ ES-202212-USD-FUT CME
 Futu API 同时支持股票、期货、指数等产品的交易
 """
 
+import json
 import pytz
-from datetime import datetime
+from pathlib import Path
+from datetime import date, datetime, timedelta
 from copy import copy
-from typing import Any, Dict, List, Tuple, Optional
-from threading import Thread
+from functools import partial
+from time import time, sleep
+from zlib import crc32
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterator, List, Set, Tuple, Optional
+from threading import Thread, Lock, Event
+from concurrent.futures import ThreadPoolExecutor, Future, CancelledError, as_completed
+
+import numpy as np
+from pandas import DataFrame, DatetimeIndex, to_datetime
 
 from futu import (
     OpenQuoteContext,
@@ -21,6 +31,7 @@ from futu import (
     OpenUSTradeContext,
     OpenCNTradeContext,
     TrdEnv,
+    TrdMarket,
     Market,
     SecurityType,
     ModifyOrderOp,
@@ -29,11 +40,15 @@ from futu import (
     RET_OK,
     RET_ERROR,
     KLType,
+    AuType,
     SubType,
     SortDir,
     TrdSide,
+    TickerDirect,
     StockQuoteHandlerBase,
     OrderBookHandlerBase,
+    TickerHandlerBase,
+    CurKlineHandlerBase,
     TradeOrderHandlerBase,
     TradeDealHandlerBase
 )
@@ -50,6 +65,7 @@ from vnpy.trader.constant import (
     Currency
 )
 from vnpy.trader.gateway import BaseGateway
+from vnpy.trader.utility import get_file_path, get_folder_path
 from vnpy.trader.object import (
     TickData,
     OrderData,
@@ -64,6 +80,33 @@ from vnpy.trader.object import (
     HistoryRequest
 )
 
+from .bar_cache import FutuBarCache
+from .tick_bus import FutuTickBus, TICK_BUS_CAPACITY
+from .push_parser import (
+    FutuQuoteRecord,
+    FutuOrderBookRecord,
+    FutuOrderRecord,
+    FutuDealRecord,
+    parse_quote_push,
+    parse_orderbook_push,
+    parse_order_push,
+    parse_deal_push,
+    convert_records,
+    parse_push_datetime,
+    update_tick_quote,
+    fill_tick_depth,
+    TICK_DEPTH
+)
+from .recorder import FutuRecorder, RECORD_QUOTE, RECORD_ORDERBOOK, RECORD_ORDER, RECORD_DEAL
+from .ledger import FutuLedger
+from .scheduler import (
+    FutuRequestScheduler,
+    PRIORITY_CANCEL,
+    PRIORITY_PLACE,
+    PRIORITY_QUERY,
+    PRIORITY_HISTORY
+)
+
 # 交易所映射
 EXCHANGE_VT2FUTU: Dict[Exchange, Market] = {
     Exchange.SEHK: Market.HK,
@@ -112,6 +155,29 @@ ORDERTYPE_FUTU2VT: Dict[FutuOrderType, OrderType] = {
     FutuOrderType.STOP: OrderType.STOP,
 }
 
+# 各接口每30秒最多请求的次数，交易接口按交易市场分别计数，
+# 订阅、反订阅、订阅额度和历史K线额度查询没有频率限制，只经过调度器排队
+REQUEST_LIMITS: Dict[str, int] = {
+    "place_order": 15,
+    "modify_order": 20,             # 改单、撤单、全部撤单
+    "accinfo_query": 10,
+    "position_list_query": 10,
+    "order_list_query": 10,
+    "deal_list_query": 10,
+    "request_history_kline": 60,
+    "get_stock_basicinfo": 10,
+    "get_market_snapshot": 60,
+    "get_rehab": 60,
+}
+
+# 交易市场映射，用于全部撤单时限定市场以及区分交易接口的频率限制
+TRDMARKET_VT2FUTU: Dict[Market, TrdMarket] = {
+    Market.HK: TrdMarket.HK,
+    Market.US: TrdMarket.US,
+    Market.SH: TrdMarket.CN,
+    Market.SZ: TrdMarket.CN,
+}
+
 # 委托状态映射
 STATUS_FUTU2VT: Dict[OrderStatus, Status] = {
     OrderStatus.NONE: Status.SUBMITTING,
@@ -147,6 +213,19 @@ INTERVAL_VT2FUTU: Dict[Interval, KLType] = {
     Interval.WEEKLY: KLType.K_WEEK,
 }
 
+# 实时K线订阅类型映射，没有对应VeighNa频率的为None
+KLINE_INTERVAL_MAP: Dict[str, Optional[Interval]] = {
+    SubType.K_1M: Interval.MINUTE,
+    SubType.K_3M: None,
+    SubType.K_5M: None,
+    SubType.K_15M: None,
+    SubType.K_30M: None,
+    SubType.K_60M: Interval.HOUR,
+    SubType.K_DAY: Interval.DAILY,
+    SubType.K_WEEK: Interval.WEEKLY,
+    SubType.K_MON: None,
+}
+
 # 货币类型映射
 CURRENCY_MAP: Dict[str, Currency] = {
     "HKD": Currency.HKD,
@@ -154,16 +233,310 @@ CURRENCY_MAP: Dict[str, Currency] = {
     "CNY": Currency.CNY,
 }
 
+# 逐笔方向映射
+TICKER_DIRECTION_MAP: Dict[str, int] = {
+    TickerDirect.BUY: 1,
+    TickerDirect.SELL: -1,
+}
+
+# 富途扩展事件类型
+EVENT_FUTU_TICKER: str = "eFutuTicker."
+EVENT_FUTU_BAR: str = "eFutuBar."                 # 已完成的K线
+EVENT_FUTU_BAR_UPDATE: str = "eFutuBarUpdate."    # 未完成K线的更新
+
 # 其他常量
 JOIN_SYMBOL: str = "-"
+HISTORY_PAGE_SIZE: int = 1000           # 单次历史K线请求的最大数据条数
+HISTORY_AUTYPE: AuType = AuType.QFQ     # 历史K线复权类型
+HISTORY_RETRY_TIMES: int = 3            # 触发频率限制后的最大重试次数
+HISTORY_RETRY_DELAY: float = 1          # 首次重试等待秒数，之后逐次翻倍
+THROTTLE_KEYWORDS: Tuple[str, ...] = ("频率", "frequen", "too many")
+AMEND_LATENCY_SAMPLES: int = 1000      # 改单延迟统计保留的最近样本数
+SUBSCRIBE_BATCH_SIZE: int = 200        # 单次订阅请求的最大代码数
+SUBSCRIBE_MIN_HOLD: int = 60           # 订阅后至少保持的秒数，之后才能反订阅
+DEFAULT_SUBTYPES: List[str] = [SubType.QUOTE, SubType.ORDER_BOOK]
+SUPPORTED_SUBTYPES: List[str] = [SubType.QUOTE, SubType.ORDER_BOOK, SubType.TICKER] + list(KLINE_INTERVAL_MAP)
+CONFLATE_OFF: str = "关闭"               # 行情合并模式：不合并
+CONFLATE_BATCH: str = "推送批次"          # 行情合并模式：每批推送处理完后输出
+CONFLATE_TIMER: str = "定时"              # 行情合并模式：按固定间隔输出
+CONFLATE_INTERVAL: int = 100            # 定时合并的默认间隔（毫秒）
+PUSH_PARSER_FAST: str = "快速解析"         # 推送解析方式：直接读取protobuf字段
+PUSH_PARSER_SDK: str = "SDK解析"          # 推送解析方式：使用SDK的DataFrame解析
+QUOTE_MODE_PUSH: str = "推送"             # 行情模式：订阅推送
+QUOTE_MODE_SNAPSHOT: str = "快照轮询"      # 行情模式：轮询市场快照，不占用订阅额度
+SNAPSHOT_BATCH_SIZE: int = 400          # 单次快照请求的最大代码数
+SNAPSHOT_INTERVAL: float = 3            # 默认轮询一遍全部代码的间隔（秒）
+RECONCILE_INTERVAL: int = 60            # 默认查询核对持仓和资金的间隔（秒）
+ACCOUNT_QUERY_INTERVAL: int = 10        # 查询账户资金的间隔（秒）
+TICKER_CAPACITY: int = 100000          # 每个合约逐笔环形缓冲区的容量
+ORDERBOOK_CAPACITY: int = 40           # 盘口数组预分配档位数，超出时自动扩容
+CONTRACT_FILENAME: str = "futu_contract.json"       # 合约信息快照文件
+CONTRACT_SNAPSHOT_TTL: int = 24 * 60 * 60           # 合约信息快照有效期（秒）
+CONTRACT_MARKETS: str = "HK,US,SH,SZ"
+CONTRACT_SECURITY_TYPES: str = "STOCK,ETF,IDX,WARRANT"
 CHINA_TZ = pytz.timezone("Asia/Shanghai")
 
+# 快照字段，任一字段变化时才输出Tick
+SNAPSHOT_FIELDS: Tuple[str, ...] = (
+    "update_time",
+    "last_price",
+    "open_price",
+    "high_price",
+    "low_price",
+    "prev_close_price",
+    "volume",
+    "turnover",
+    "bid_price",
+    "bid_vol",
+    "ask_price",
+    "ask_vol",
+)
+
+# 逐笔成交数组格式（时间为交易所本地时间）
+TICKER_DTYPE: np.dtype = np.dtype([
+    ("datetime", "datetime64[ms]"),
+    ("price", "f8"),
+    ("volume", "f8"),
+    ("direction", "i1"),
+    ("sequence", "i8"),
+])
+
+# 历史K线数组格式（时间为交易所本地时间）
+KLINE_DTYPE: np.dtype = np.dtype([
+    ("datetime", "datetime64[s]"),
+    ("open", "f8"),
+    ("high", "f8"),
+    ("low", "f8"),
+    ("close", "f8"),
+    ("volume", "f8"),
+    ("turnover", "f8"),
+])
+
 # 替代get_local_datetime函数
 def get_local_datetime() -> datetime:
     """获取本地时间"""
     return datetime.now().replace(tzinfo=CHINA_TZ)
 
 
+def convert_kline_array(data: DataFrame) -> np.ndarray:
+    """将历史K线DataFrame按列批量转换为结构化数组"""
+    array: np.ndarray = np.empty(len(data), dtype=KLINE_DTYPE)
+    if not len(data):
+        return array
+
+    array["datetime"] = to_datetime(data["time_key"], format="%Y-%m-%d %H:%M:%S").to_numpy(dtype="datetime64[s]")
+    for name in ("open", "high", "low", "close", "volume", "turnover"):
+        array[name] = data[name].to_numpy(dtype=np.float64)
+
+    return array
+
+
+def convert_contract_rows(data: DataFrame, security_type: str) -> Dict[str, Tuple[str, str, int]]:
+    """将合约信息DataFrame按列转换为{代码: (名称, 证券类型, 每手数量)}"""
+    return dict(zip(
+        data["code"].tolist(),
+        zip(
+            data["name"].tolist(),
+            [security_type] * len(data),
+            data["lot_size"].astype(int).tolist()
+        )
+    ))
+
+
+def copy_tick(tick: TickData) -> TickData:
+    """浅拷贝Tick对象，比copy.copy少一次__reduce_ex__调用"""
+    new_tick: TickData = TickData.__new__(TickData)
+    new_tick.__dict__.update(tick.__dict__)
+    return new_tick
+
+
+def get_bar_event(event_type: str, k_type: str, vt_symbol: str = "") -> str:
+    """生成K线事件类型，如eFutuBar.K_1M.00700.SEHK"""
+    return f"{event_type}{k_type}.{vt_symbol}"
+
+
+def split_setting(text: str) -> List[str]:
+    """解析逗号分隔的配置项"""
+    return [item.strip().upper() for item in text.split(",") if item.strip()]
+
+
+def is_throttled(msg: Any) -> bool:
+    """判断请求失败是否由OpenD频率限制导致"""
+    text: str = str(msg).lower()
+    return any(keyword in text for keyword in THROTTLE_KEYWORDS)
+
+
+def readonly_view(array: np.ndarray) -> np.ndarray:
+    """生成不可写的数组视图"""
+    view: np.ndarray = array.view()
+    view.flags.writeable = False
+    return view
+
+
+class FutuOrderBook:
+    """数组存储的全档位盘口，原地更新"""
+
+    def __init__(self, vt_symbol: str, capacity: int = ORDERBOOK_CAPACITY) -> None:
+        """构造函数"""
+        self.vt_symbol: str = vt_symbol
+
+        self.bid_prices: np.ndarray = np.zeros(capacity, dtype=np.float64)
+        self.bid_volumes: np.ndarray = np.zeros(capacity, dtype=np.float64)
+        self.bid_orders: np.ndarray = np.zeros(capacity, dtype=np.int64)
+        self.ask_prices: np.ndarray = np.zeros(capacity, dtype=np.float64)
+        self.ask_volumes: np.ndarray = np.zeros(capacity, dtype=np.float64)
+        self.ask_orders: np.ndarray = np.zeros(capacity, dtype=np.int64)
+
+        self.bid_count: int = 0
+        self.ask_count: int = 0
+
+    def update(self, bid_data: list, ask_data: list) -> None:
+        """用推送的(价格, 数量, 订单数, 明细)列表整体更新盘口"""
+        depth: int = max(len(bid_data), len(ask_data))
+        if depth > len(self.bid_prices):
+            self.resize(depth)
+
+        self.bid_count = self.update_side(bid_data, self.bid_prices, self.bid_volumes, self.bid_orders, self.bid_count)
+        self.ask_count = self.update_side(ask_data, self.ask_prices, self.ask_volumes, self.ask_orders, self.ask_count)
+
+    def update_side(
+        self,
+        levels: list,
+        prices: np.ndarray,
+        volumes: np.ndarray,
+        orders: np.ndarray,
+        old_count: int
+    ) -> int:
+        """更新单边盘口，清除上次多出的档位"""
+        count: int = len(levels)
+
+        if count:
+            level_prices, level_volumes, level_orders = tuple(zip(*levels))[:3]
+            prices[:count] = level_prices
+            volumes[:count] = level_volumes
+            orders[:count] = level_orders
+
+        if old_count > count:
+            prices[count:old_count] = 0
+            volumes[count:old_count] = 0
+            orders[count:old_count] = 0
+
+        return count
+
+    def resize(self, capacity: int) -> None:
+        """扩容数组，已取得的视图不再随盘口更新"""
+        for name in ("bid_prices", "bid_volumes", "bid_orders", "ask_prices", "ask_volumes", "ask_orders"):
+            old: np.ndarray = getattr(self, name)
+            new: np.ndarray = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def get_bids(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """买盘只读视图(价格, 数量, 订单数)，不拷贝数据"""
+        return (
+            readonly_view(self.bid_prices[:self.bid_count]),
+            readonly_view(self.bid_volumes[:self.bid_count]),
+            readonly_view(self.bid_orders[:self.bid_count]),
+        )
+
+    def get_asks(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """卖盘只读视图(价格, 数量, 订单数)，不拷贝数据"""
+        return (
+            readonly_view(self.ask_prices[:self.ask_count]),
+            readonly_view(self.ask_volumes[:self.ask_count]),
+            readonly_view(self.ask_orders[:self.ask_count]),
+        )
+
+    def fill_tick(self, tick: TickData) -> None:
+        """把前5档写入Tick，不足5档的补0"""
+        bid_count: int = min(self.bid_count, TICK_DEPTH)
+        ask_count: int = min(self.ask_count, TICK_DEPTH)
+
+        fill_tick_depth(
+            tick,
+            self.bid_prices[:bid_count].tolist(),
+            self.bid_volumes[:bid_count].tolist(),
+            self.ask_prices[:ask_count].tolist(),
+            self.ask_volumes[:ask_count].tolist()
+        )
+
+
+class FutuTickerBuffer:
+    """数组存储的逐笔成交环形缓冲区，写满后覆盖最旧的记录"""
+
+    def __init__(self, vt_symbol: str, capacity: int = TICKER_CAPACITY) -> None:
+        """构造函数"""
+        self.vt_symbol: str = vt_symbol
+        self.capacity: int = capacity
+
+        self.data: np.ndarray = np.zeros(capacity, dtype=TICKER_DTYPE)
+        self.count: int = 0                 # 累计写入条数
+        self.last_sequence: int = -1
+
+        self.lock: Lock = Lock()
+
+    def append(self, array: np.ndarray) -> Tuple[int, int]:
+        """写入一批逐笔，跳过已收到的序号，返回本批在累计序列中的[起, 止)位置"""
+        with self.lock:
+            # 在锁内读取已收到的最大序号，避免与其他推送线程交错
+            array = array[array["sequence"] > self.last_sequence]
+            start: int = self.count
+
+            n: int = len(array)
+            if not n:
+                return start, start
+
+            # 超过容量时只保留最新的部分
+            if n > self.capacity:
+                array = array[-self.capacity:]
+
+            m: int = len(array)
+            ix: int = (start + n - m) % self.capacity
+            first: int = min(m, self.capacity - ix)
+            self.data[ix:ix + first] = array[:first]
+            self.data[:m - first] = array[first:]
+
+            self.count += n
+            self.last_sequence = int(array["sequence"][-1])
+
+            return start, self.count
+
+    def get_range(self, start: int, end: int) -> np.ndarray:
+        """读取累计位置[start, end)的逐笔拷贝，已被覆盖的部分自动跳过"""
+        with self.lock:
+            start = max(start, self.count - self.capacity, 0)
+            end = min(end, self.count)
+            if start >= end:
+                return np.empty(0, dtype=TICKER_DTYPE)
+
+            ix: int = start % self.capacity
+            n: int = end - start
+            if ix + n <= self.capacity:
+                return self.data[ix:ix + n].copy()
+            return np.concatenate([self.data[ix:], self.data[:ix + n - self.capacity]])
+
+    def get_latest(self, n: int) -> np.ndarray:
+        """读取最新的n条逐笔"""
+        return self.get_range(self.count - n, self.count)
+
+
+class FutuTickerUpdate:
+    """逐笔批量推送事件数据，通过buffer.get_range(start, end)读取本批记录"""
+
+    __slots__ = ("vt_symbol", "buffer", "start", "end")
+
+    def __init__(self, vt_symbol: str, buffer: FutuTickerBuffer, start: int, end: int) -> None:
+        """构造函数"""
+        self.vt_symbol: str = vt_symbol
+        self.buffer: FutuTickerBuffer = buffer
+        self.start: int = start
+        self.end: int = end
+
+    def get_data(self) -> np.ndarray:
+        """读取本批逐笔"""
+        return self.buffer.get_range(self.start, self.end)
+
+
 class FutuGateway(BaseGateway):
     """
     VeighNa用于对接富途证券的交易接口。
@@ -179,7 +552,19 @@ class FutuGateway(BaseGateway):
         "密码": "",
         "客户号": 1,
         "交易服务器": ["港股", "美股", "A股"],
-        "行情服务器": ""
+        "行情服务器": "",
+        "订阅类型": ",".join(DEFAULT_SUBTYPES),
+        "历史数据缓存": ["关闭", "开启"],
+        "合约市场": CONTRACT_MARKETS,
+        "合约类型": CONTRACT_SECURITY_TYPES,
+        "行情合并": [CONFLATE_OFF, CONFLATE_BATCH, CONFLATE_TIMER],
+        "行情合并间隔": CONFLATE_INTERVAL,
+        "行情模式": [QUOTE_MODE_PUSH, QUOTE_MODE_SNAPSHOT],
+        "快照轮询间隔": SNAPSHOT_INTERVAL,
+        "行情总线名称": "",
+        "推送解析": [PUSH_PARSER_FAST, PUSH_PARSER_SDK],
+        "推送录制": ["关闭", "开启"],
+        "持仓核对间隔": RECONCILE_INTERVAL
     }
 
     exchanges: List[Exchange] = list(EXCHANGE_VT2FUTU.keys())
@@ -188,14 +573,26 @@ class FutuGateway(BaseGateway):
         """构造函数"""
         super().__init__(event_engine, gateway_name)
 
+        # 行情和交易共用的请求调度器，需要在创建API之前
+        self.scheduler: FutuRequestScheduler = FutuRequestScheduler(REQUEST_LIMITS)
+
         self.quote_api: "FutuQuoteApi" = FutuQuoteApi(self)
         self.trade_api: "FutuTradeApi" = FutuTradeApi(self)
 
         self.count: int = 0
         self.order_count: int = 0
+        self.order_prefix: str = datetime.now().strftime("L%H%M%S_")
+        self.order_lock: Lock = Lock()
+
+        # 富途委托号和本地委托号的双向映射
+        self.local_orderids: Dict[str, str] = {}        # 富途委托号 -> 本地委托号
+        self.futu_orderids: Dict[str, str] = {}         # 本地委托号 -> 富途委托号
+
+        self.recorder: Optional[FutuRecorder] = None
 
-        self.local_orderids: set = set()
-        self.futu_orderids: Dict[str, str] = {}
+        # 持仓和资金由成交推送实时更新，定时查询只用于核对
+        self.reconcile_interval: int = RECONCILE_INTERVAL
+        self.reconcile_thread: Optional[Thread] = None
 
     def connect(self, setting: dict) -> None:
         """连接交易接口"""
@@ -204,20 +601,88 @@ class FutuGateway(BaseGateway):
         trd_env: str = setting["市场环境"]
         market: str = setting["交易服务器"]
 
+        if setting.get("历史数据缓存", "关闭") == "开启":
+            self.quote_api.init_bar_cache()
+
+        self.quote_api.init_contract_master(
+            split_setting(setting.get("合约市场", CONTRACT_MARKETS)),
+            split_setting(setting.get("合约类型", CONTRACT_SECURITY_TYPES))
+        )
+
+        self.quote_api.init_conflation(
+            setting.get("行情合并", CONFLATE_OFF),
+            int(setting.get("行情合并间隔", CONFLATE_INTERVAL))
+        )
+
+        self.quote_api.init_subtypes(
+            split_setting(setting.get("订阅类型", ",".join(DEFAULT_SUBTYPES)))
+        )
+
+        self.quote_api.init_quote_mode(
+            setting.get("行情模式", QUOTE_MODE_PUSH),
+            float(setting.get("快照轮询间隔", SNAPSHOT_INTERVAL))
+        )
+
+        tick_bus_name: str = setting.get("行情总线名称", "")
+        if tick_bus_name:
+            self.quote_api.init_tick_bus(tick_bus_name)
+
+        fast_push: bool = setting.get("推送解析", PUSH_PARSER_FAST) == PUSH_PARSER_FAST
+        self.quote_api.fast_push = fast_push
+        self.trade_api.fast_push = fast_push
+
+        if setting.get("推送录制", "关闭") == "开启":
+            self.init_recorder()
+
+        self.reconcile_interval = max(int(setting.get("持仓核对间隔", RECONCILE_INTERVAL)), 1)
+
         self.quote_api.connect(host, port)
         self.trade_api.connect(host, port, trd_env, market, setting)
 
         self.init_query()
 
     def close(self) -> None:
-        """关闭接口"""
+        """关闭接口，未执行的请求取消"""
+        # 先停止快照轮询，避免调度器关闭后又提交快照请求
+        self.quote_api.stop_snapshot()
+        self.scheduler.close()
         self.quote_api.close()
         self.trade_api.close()
 
+        if self.recorder:
+            self.recorder.close()
+            self.recorder = None
+
+    def new_orderid(self) -> str:
+        """生成本地委托号"""
+        with self.order_lock:
+            self.order_count += 1
+            return f"{self.order_prefix}{self.order_count}"
+
+    def init_recorder(self, path: Optional[str] = None) -> None:
+        """开启推送录制，录制文件可用FutuReplayer回放"""
+        if self.recorder:
+            return
+
+        if not path:
+            path = get_folder_path("futu_recorder")
+
+        self.recorder = FutuRecorder(path)
+        self.quote_api.recorder = self.recorder
+        self.trade_api.recorder = self.recorder
+
     def subscribe(self, req: SubscribeRequest) -> None:
         """订阅行情"""
         self.quote_api.subscribe(req)
 
+    def subscribe_batch(self, reqs: List[SubscribeRequest], subtypes: Optional[List[str]] = None) -> None:
+        """批量订阅行情"""
+        self.quote_api.subscribe_batch(reqs, subtypes)
+
+    def unsubscribe_batch(self, reqs: List[SubscribeRequest], subtypes: Optional[List[str]] = None) -> None:
+        """批量反订阅行情"""
+        self.quote_api.unsubscribe_batch(reqs, subtypes)
+
     def send_order(self, req: OrderRequest) -> str:
         """委托下单"""
         return self.trade_api.send_order(req)
@@ -226,31 +691,88 @@ class FutuGateway(BaseGateway):
         """委托撤单"""
         self.trade_api.cancel_order(req)
 
+    def amend_order(self, orderid: str, price: float, volume: float) -> None:
+        """委托改单，修改价格和总数量"""
+        self.trade_api.amend_order(orderid, price, volume)
+
+    def get_amend_metrics(self) -> Dict[str, float]:
+        """获取改单次数和延迟统计"""
+        return self.trade_api.get_amend_metrics()
+
+    def send_orders(self, reqs: List[OrderRequest]) -> "FutuBatchResult":
+        """批量下单，全部返回后汇总结果"""
+        return self.trade_api.send_orders(reqs)
+
+    def cancel_orders(self, reqs: List[CancelRequest]) -> "FutuBatchResult":
+        """批量撤单，全部返回后汇总结果"""
+        return self.trade_api.cancel_orders(reqs)
+
+    def cancel_all(self, market: Optional[Market] = None) -> "FutuBatchResult":
+        """撤销某个交易市场（HK、US、SH、SZ）或全部市场的活动委托"""
+        return self.trade_api.cancel_all(market)
+
     def query_account(self) -> None:
         """查询资金"""
         self.trade_api.query_account()
 
+    def get_request_metrics(self) -> Dict[str, Dict[str, float]]:
+        """获取请求调度统计，各优先级的排队数和等待时间"""
+        return self.scheduler.get_metrics()
+
     def query_position(self) -> None:
         """查询持仓"""
         self.trade_api.query_position()
 
-    def query_history(self, req: HistoryRequest) -> List[BarData]:
-        """查询历史数据"""
-        return self.quote_api.query_history(req)
+    def get_orderbook(self, vt_symbol: str) -> Optional[FutuOrderBook]:
+        """获取全档位盘口"""
+        return self.quote_api.get_orderbook(vt_symbol)
+
+    def get_ticker_buffer(self, vt_symbol: str) -> Optional[FutuTickerBuffer]:
+        """获取逐笔环形缓冲区"""
+        return self.quote_api.get_ticker_buffer(vt_symbol)
+
+    def query_history(
+        self,
+        req: HistoryRequest,
+        callback: Optional[Callable[[int, int], None]] = None
+    ) -> Optional[List[BarData]]:
+        """查询历史数据，callback(页数, 累计条数)报告下载进度，下载中途失败时返回None"""
+        return self.quote_api.query_history(req, callback)
+
+    def query_history_batch(
+        self,
+        reqs: List[HistoryRequest],
+        max_workers: int = 8
+    ) -> Iterator[Tuple[HistoryRequest, Optional[List[BarData]]]]:
+        """批量查询多合约历史数据"""
+        return self.quote_api.query_history_batch(reqs, max_workers)
+
+    def iter_history(self, req: HistoryRequest, chunk_size: int = 0) -> Iterator[List[BarData]]:
+        """流式查询历史数据"""
+        return self.quote_api.iter_history(req, chunk_size)
 
     def init_query(self) -> None:
         """初始化查询任务"""
         self.event_engine.register(EVENT_TIMER, self.process_timer_event)
 
     def process_timer_event(self, event) -> None:
-        """定时事件处理"""
+        """定时事件处理，定时查询资金，低频查询持仓和资金用于核对本地账本"""
         self.count += 1
-        if self.count < 10:
+        if self.count >= self.reconcile_interval:
+            self.count = 0
+            query: Callable[[], None] = self.trade_api.query_portfolio
+        elif not self.count % ACCOUNT_QUERY_INTERVAL:
+            # 购买力无法由成交推算，资金仍按原频率查询
+            query = self.trade_api.query_account
+        else:
+            return
+
+        # 在后台线程查询，上一次查询未完成时跳过
+        if self.reconcile_thread and self.reconcile_thread.is_alive():
             return
-        self.count = 0
 
-        self.query_account()
-        self.query_position()
+        self.reconcile_thread = Thread(target=query, daemon=True)
+        self.reconcile_thread.start()
 
 
 class FutuQuoteHandler(StockQuoteHandlerBase):
@@ -262,13 +784,21 @@ class FutuQuoteHandler(StockQuoteHandlerBase):
 
     def on_recv_rsp(self, rsp_pb) -> None:
         """收到推送数据回调"""
-        ret_code, content = super().on_recv_rsp(rsp_pb)
+        if self.api.fast_push:
+            ret_code, content = parse_quote_push(rsp_pb)
+        else:
+            ret_code, content = super().on_recv_rsp(rsp_pb)
+            if ret_code == RET_OK:
+                content = convert_records(content, FutuQuoteRecord)
+
         if ret_code != RET_OK:
             self.api.gateway.write_log(f"行情推送数据处理失败: {content}")
             return
 
-        for stock_code, data in content.items():
-            self.api.process_quote(stock_code, data)
+        for record in content:
+            self.api.process_quote_record(record)
+
+        self.api.on_push_batch()
 
 
 class FutuOrderBookHandler(OrderBookHandlerBase):
@@ -280,12 +810,261 @@ class FutuOrderBookHandler(OrderBookHandlerBase):
 
     def on_recv_rsp(self, rsp_pb) -> None:
         """收到推送数据回调"""
-        ret_code, content = super().on_recv_rsp(rsp_pb)
+        if self.api.fast_push:
+            ret_code, content = parse_orderbook_push(rsp_pb)
+        else:
+            ret_code, content = super().on_recv_rsp(rsp_pb)
+            if ret_code == RET_OK:
+                content = FutuOrderBookRecord.from_dict(content)
+
         if ret_code != RET_OK:
             self.api.gateway.write_log(f"盘口推送数据处理失败: {content}")
             return
 
-        self.api.process_orderbook(content)
+        self.api.process_orderbook_record(content)
+        self.api.on_push_batch()
+
+
+class FutuTickerHandler(TickerHandlerBase):
+    """富途逐笔推送处理器"""
+
+    def __init__(self, api: "FutuQuoteApi") -> None:
+        """构造函数"""
+        self.api: FutuQuoteApi = api
+
+    def on_recv_rsp(self, rsp_pb) -> None:
+        """收到推送数据回调"""
+        ret_code, content = super().on_recv_rsp(rsp_pb)
+        if ret_code != RET_OK:
+            self.api.gateway.write_log(f"逐笔推送数据处理失败: {content}")
+            return
+
+        self.api.process_ticker(content)
+
+
+class FutuKlineHandler(CurKlineHandlerBase):
+    """富途实时K线推送处理器"""
+
+    def __init__(self, api: "FutuQuoteApi") -> None:
+        """构造函数"""
+        self.api: FutuQuoteApi = api
+
+    def on_recv_rsp(self, rsp_pb) -> None:
+        """收到推送数据回调"""
+        ret_code, content = super().on_recv_rsp(rsp_pb)
+        if ret_code != RET_OK:
+            self.api.gateway.write_log(f"K线推送数据处理失败: {content}")
+            return
+
+        self.api.process_kline(content)
+
+
+class FutuSubscriptionManager:
+    """富途行情订阅管理，批量订阅并按最近最少使用顺序回收额度"""
+
+    def __init__(self, api: "FutuQuoteApi") -> None:
+        """构造函数"""
+        self.api: FutuQuoteApi = api
+
+        # 富途代码 -> {订阅类型: 订阅时间}
+        self.subscriptions: Dict[str, Dict[str, float]] = {}
+        self.lock: Lock = Lock()
+
+        # 富途代码 -> 最近收到推送或订阅的时间，推送线程不加锁写入，回收时按此排序
+        self.last_used: Dict[str, float] = {}
+
+    def subscribe(self, codes: List[str], subtypes: List[str]) -> List[str]:
+        """批量订阅，返回订阅成功的代码列表"""
+        quote_ctx: OpenQuoteContext = self.api.quote_ctx
+
+        with self.lock:
+            # 已订阅的只更新使用时间，按缺少的订阅类型分组
+            groups: Dict[Tuple[str, ...], List[str]] = {}
+            done: List[str] = []
+
+            for code in dict.fromkeys(codes):
+                subscribed: Dict[str, float] = self.subscriptions.get(code, {})
+                self.touch(code)
+
+                missing: Tuple[str, ...] = tuple(t for t in subtypes if t not in subscribed)
+                if missing:
+                    groups.setdefault(missing, []).append(code)
+                else:
+                    done.append(code)
+
+            need: int = sum(len(missing) * len(group) for missing, group in groups.items())
+            if not need:
+                return done
+
+            # 额度不足时先回收最久未使用的订阅
+            remain: int = self.query_remain()
+            if need > remain:
+                remain += self.evict(need - remain, set(codes))
+
+            for missing, group in groups.items():
+                # 回收后仍不足时，只订阅额度允许的部分
+                count: int = min(len(group), remain // len(missing))
+                if count < len(group):
+                    self.api.gateway.write_log(f"行情订阅额度不足，跳过{len(group) - count}个合约")
+                    group = group[:count]
+
+                for i in range(0, len(group), SUBSCRIBE_BATCH_SIZE):
+                    batch: List[str] = group[i:i + SUBSCRIBE_BATCH_SIZE]
+
+                    ret, data = self.api.scheduler.call(
+                        "subscribe", PRIORITY_QUERY, quote_ctx.subscribe, batch, list(missing)
+                    )
+                    if ret != RET_OK:
+                        self.api.gateway.write_log(f"行情订阅失败: {data}")
+                        continue
+
+                    now: float = time()
+                    for code in batch:
+                        subscribed = self.subscriptions.setdefault(code, {})
+                        subscribed.update(dict.fromkeys(missing, now))
+                        self.last_used[code] = now
+
+                    remain -= len(missing) * len(batch)
+                    done.extend(batch)
+
+            return done
+
+    def unsubscribe(self, codes: List[str], subtypes: List[str]) -> None:
+        """批量反订阅"""
+        with self.lock:
+            self.release(codes, subtypes)
+
+    def touch(self, code: str) -> None:
+        """标记代码为最近使用，由推送线程调用
+
+        订阅锁在订阅请求期间一直持有，这里只做单次字典写入，不加锁。
+        """
+        if code in self.subscriptions:
+            self.last_used[code] = time()
+
+    def query_remain(self) -> int:
+        """通过query_subscription查询剩余订阅额度"""
+        ret, data = self.api.scheduler.call(
+            "query_subscription", PRIORITY_QUERY, self.api.quote_ctx.query_subscription
+        )
+        if ret != RET_OK:
+            self.api.gateway.write_log(f"订阅额度查询失败: {data}")
+            return 0
+        return data["remain"]
+
+    def get_usage(self) -> Dict[str, int]:
+        """
+        通过query_subscription查询当前连接每种订阅类型占用的额度，并按服务端记录校正本地订阅记录。
+
+        返回值另含total_used（所有连接已用）、own_used（当前连接已用）和remain（剩余）额度，
+        查询失败时返回空字典。
+        """
+        with self.lock:
+            ret, data = self.api.scheduler.call(
+                "query_subscription", PRIORITY_QUERY, self.api.quote_ctx.query_subscription, False
+            )
+            if ret != RET_OK:
+                self.api.gateway.write_log(f"订阅额度查询失败: {data}")
+                return {}
+
+            sub_list: Dict[str, List[str]] = data["sub_list"]
+            self.reconcile(sub_list)
+
+        usage: Dict[str, int] = {subtype: len(codes) for subtype, codes in sub_list.items()}
+        usage["total_used"] = data["total_used"]
+        usage["own_used"] = data["own_used"]
+        usage["remain"] = data["remain"]
+        return usage
+
+    def reconcile(self, sub_list: Dict[str, List[str]]) -> None:
+        """按服务端的订阅列表校正本地订阅记录，调用方需持有订阅锁"""
+        server: Set[Tuple[str, str]] = {
+            (code, subtype) for subtype, codes in sub_list.items() for code in codes
+        }
+        changed: int = 0
+
+        # 服务端已没有的订阅（如OpenD重启后）从本地移除
+        for code, subscribed in list(self.subscriptions.items()):
+            for subtype in list(subscribed):
+                if (code, subtype) not in server:
+                    subscribed.pop(subtype)
+                    changed += 1
+
+            if not subscribed:
+                self.subscriptions.pop(code)
+                self.last_used.pop(code, None)
+                self.api.subscribed.discard(self.api.convert_vt_symbol(code))
+
+        # 本地没有记录的订阅按当前时间补记，满一分钟后才能回收
+        now: float = time()
+        for code, subtype in server:
+            subscribed = self.subscriptions.setdefault(code, {})
+            if subtype not in subscribed:
+                subscribed[subtype] = now
+                changed += 1
+
+        if changed:
+            self.api.gateway.write_log(f"本地订阅记录与服务端不一致，已校正{changed}项")
+
+    def evict(self, shortfall: int, protected: set) -> int:
+        """从最久未使用的订阅开始回收，返回释放的额度"""
+        deadline: float = time() - SUBSCRIBE_MIN_HOLD
+
+        # 按订阅类型组合归类，便于批量反订阅
+        groups: Dict[Tuple[str, ...], List[str]] = {}
+        freed: int = 0
+
+        # 按最近使用时间从早到晚回收，没有推送的代码最先回收
+        codes: List[str] = sorted(self.subscriptions, key=lambda code: self.last_used.get(code, 0))
+
+        for code in codes:
+            if freed >= shortfall:
+                break
+
+            subscribed: Dict[str, float] = self.subscriptions[code]
+
+            if code in protected:
+                continue
+
+            # 订阅未满一分钟的类型不能反订阅
+            expired: Tuple[str, ...] = tuple(t for t, dt in subscribed.items() if dt <= deadline)
+            if not expired:
+                continue
+
+            groups.setdefault(expired, []).append(code)
+            freed += len(expired)
+
+        released: int = 0
+        for subtypes, codes in groups.items():
+            released += self.release(codes, list(subtypes))
+
+        if released:
+            self.api.gateway.write_log(f"回收行情订阅额度{released}个")
+
+        return released
+
+    def release(self, codes: List[str], subtypes: List[str]) -> int:
+        """发送反订阅请求并更新记录，返回释放的额度"""
+        ret, data = self.api.scheduler.call(
+            "unsubscribe", PRIORITY_QUERY, self.api.quote_ctx.unsubscribe, codes, subtypes
+        )
+        if ret != RET_OK:
+            self.api.gateway.write_log(f"行情反订阅失败: {data}")
+            return 0
+
+        released: int = 0
+        for code in codes:
+            subscribed: Dict[str, float] = self.subscriptions.get(code, {})
+            for subtype in subtypes:
+                if subscribed.pop(subtype, None) is not None:
+                    released += 1
+
+            if not subscribed:
+                self.subscriptions.pop(code, None)
+                self.last_used.pop(code, None)
+                self.api.subscribed.discard(self.api.convert_vt_symbol(code))
+
+        return released
 
 
 class FutuQuoteApi:
@@ -297,14 +1076,66 @@ class FutuQuoteApi:
         self.gateway_name: str = gateway.gateway_name
 
         self.quote_ctx: OpenQuoteContext = None
+        self.bar_cache: Optional[FutuBarCache] = None
+        self.scheduler: FutuRequestScheduler = gateway.scheduler
 
         self.subscribed: set = set()
+        self.subtypes: List[str] = list(DEFAULT_SUBTYPES)
+        self.subscription_manager: FutuSubscriptionManager = FutuSubscriptionManager(self)
         self.ticks: Dict[str, TickData] = {}
         self.contracts: Dict[str, ContractData] = {}
 
+        # 行情解码缓存：交易日 -> 当日零点，富途代码 -> (代码, 交易所)
+        self.date_bases: Dict[str, datetime] = {}
+        self.code_table: Dict[str, Tuple[str, Exchange]] = {}
+
+        # 全档位盘口：本地代码 -> 盘口对象
+        self.orderbooks: Dict[str, FutuOrderBook] = {}
+
+        # 逐笔环形缓冲区：本地代码 -> 缓冲区
+        self.ticker_buffers: Dict[str, FutuTickerBuffer] = {}
+
+        # 实时K线：(富途代码, K线类型) -> 当前未完成的K线
+        self.bars: Dict[Tuple[str, str], BarData] = {}
+
+        # 快照轮询：轮询的富途代码，以及每个代码上次快照的字段值
+        self.quote_mode: str = QUOTE_MODE_PUSH
+        self.snapshot_interval: float = SNAPSHOT_INTERVAL
+        self.snapshot_codes: Dict[str, None] = {}
+        self.snapshot_values: Dict[str, tuple] = {}
+        self.snapshot_lock: Lock = Lock()
+        self.snapshot_thread: Optional[Thread] = None
+        self.snapshot_stop: Event = Event()
+
+        # 共享内存行情总线，开启后输出的Tick同时写入总线
+        self.tick_bus: Optional[FutuTickBus] = None
+
+        # 推送直接读取protobuf字段，为False时使用SDK解析
+        self.fast_push: bool = True
+
+        # 推送录制，开启后解析后的推送记录同时写入录制文件
+        self.recorder: Optional[FutuRecorder] = None
+
+        # 行情合并：本地代码 -> 待输出的Tick
+        self.conflate_mode: str = CONFLATE_OFF
+        self.conflate_interval: float = CONFLATE_INTERVAL / 1000
+        self.conflate_ticks: Dict[str, TickData] = {}
+        self.conflate_lock: Lock = Lock()
+        self.conflate_thread: Optional[Thread] = None
+        self.conflate_stats: Dict[str, int] = {"received": 0, "emitted": 0, "coalesced": 0}
+
+        # 合约信息快照：富途代码 -> (名称, 证券类型, 每手数量)，查找时再创建合约对象
+        self.contract_rows: Dict[str, Tuple[str, str, int]] = {}
+        self.contract_markets: List[str] = split_setting(CONTRACT_MARKETS)
+        self.contract_types: List[str] = split_setting(CONTRACT_SECURITY_TYPES)
+        self.contract_path: Path = get_file_path(CONTRACT_FILENAME)
+        self.contract_lock: Lock = Lock()
+
         # 创建回调处理对象
         self.quote_handler: FutuQuoteHandler = FutuQuoteHandler(self)
         self.orderbook_handler: FutuOrderBookHandler = FutuOrderBookHandler(self)
+        self.ticker_handler: FutuTickerHandler = FutuTickerHandler(self)
+        self.kline_handler: FutuKlineHandler = FutuKlineHandler(self)
 
     def connect(self, host: str, port: int) -> None:
         """连接服务器"""
@@ -318,68 +1149,364 @@ class FutuQuoteApi:
         # 设置回调处理
         self.quote_ctx.set_handler(self.quote_handler)
         self.quote_ctx.set_handler(self.orderbook_handler)
+        self.quote_ctx.set_handler(self.ticker_handler)
+        self.quote_ctx.set_handler(self.kline_handler)
         self.quote_ctx.start()
 
-        # 初始化并查询合约信息
-        self.query_contract()
+        # 加载合约信息快照，过期时后台刷新
+        self.load_contract()
+
+        # 启动定时合并线程
+        if self.conflate_mode == CONFLATE_TIMER:
+            self.conflate_thread = Thread(target=self.run_conflation, daemon=True)
+            self.conflate_thread.start()
+
+        # 启动快照轮询线程
+        if self.quote_mode == QUOTE_MODE_SNAPSHOT:
+            self.snapshot_stop.clear()
+            self.snapshot_thread = Thread(target=self.run_snapshot, daemon=True)
+            self.snapshot_thread.start()
 
         self.gateway.write_log("富途行情接口连接成功")
 
+    def init_contract_master(self, markets: List[str], security_types: List[str]) -> None:
+        """设置需要加载合约信息的市场和证券类型"""
+        self.contract_markets = markets
+        self.contract_types = security_types
+
+    def init_bar_cache(self, path: Optional[str] = None) -> None:
+        """开启历史K线本地缓存"""
+        if not path:
+            path = get_folder_path("futu_bar_cache")
+        self.bar_cache = FutuBarCache(path, KLINE_DTYPE)
+
+    def init_conflation(self, mode: str, interval: int) -> None:
+        """设置行情合并模式，interval为定时合并间隔（毫秒）"""
+        self.conflate_mode = mode
+        self.conflate_interval = max(interval, 1) / 1000
+
+    def init_subtypes(self, subtypes: List[str]) -> None:
+        """设置subscribe默认订阅的类型，只填K线类型时不订阅报价和盘口"""
+        valid: List[str] = [t for t in subtypes if t in SUPPORTED_SUBTYPES]
+
+        invalid: List[str] = [t for t in subtypes if t not in SUPPORTED_SUBTYPES]
+        if invalid:
+            self.gateway.write_log(f"不支持的订阅类型: {','.join(invalid)}")
+
+        if valid:
+            self.subtypes = valid
+
+    def init_tick_bus(self, name: str, capacity: int = TICK_BUS_CAPACITY) -> None:
+        """开启共享内存行情总线，其他进程通过FutuTickBusReader(name)读取"""
+        if self.tick_bus:
+            return
+
+        try:
+            self.tick_bus = FutuTickBus(name, capacity)
+        except OSError as ex:
+            self.gateway.write_log(f"行情总线创建失败: {ex}")
+            return
+
+        self.gateway.write_log(f"行情总线{name}创建成功")
+
+    def init_quote_mode(self, mode: str, interval: float) -> None:
+        """设置行情模式，interval为快照轮询一遍全部代码的间隔（秒）"""
+        self.quote_mode = mode
+        self.snapshot_interval = max(interval, 0)
+
+    def stop_snapshot(self) -> None:
+        """停止快照轮询线程"""
+        if self.snapshot_thread:
+            self.snapshot_stop.set()
+            self.snapshot_thread.join()
+            self.snapshot_thread = None
+
     def close(self) -> None:
         """关闭连接"""
+        self.stop_snapshot()
+
         if self.quote_ctx:
             self.quote_ctx.close()
             self.quote_ctx = None
 
+        if self.conflate_thread:
+            self.conflate_thread.join()
+            self.conflate_thread = None
+
+        if self.tick_bus:
+            tick_bus: FutuTickBus = self.tick_bus
+            self.tick_bus = None
+            tick_bus.close()
+
+    def put_tick(self, tick: TickData) -> None:
+        """输出Tick数据，开启合并时只标记待输出"""
+        if self.conflate_mode == CONFLATE_OFF:
+            self.emit_tick(copy_tick(tick))
+            return
+
+        # 定时模式下由其他线程输出，这里先保存快照
+        if self.conflate_mode == CONFLATE_TIMER:
+            tick = copy_tick(tick)
+
+        with self.conflate_lock:
+            self.conflate_stats["received"] += 1
+            if tick.vt_symbol in self.conflate_ticks:
+                self.conflate_stats["coalesced"] += 1
+            self.conflate_ticks[tick.vt_symbol] = tick
+
+    def flush_ticks(self) -> None:
+        """输出所有待输出的合并Tick，每个合约最多一条"""
+        with self.conflate_lock:
+            ticks: Dict[str, TickData] = self.conflate_ticks
+            self.conflate_ticks = {}
+            self.conflate_stats["emitted"] += len(ticks)
+
+        for tick in ticks.values():
+            if self.conflate_mode == CONFLATE_BATCH:
+                tick = copy_tick(tick)
+            self.emit_tick(tick)
+
+    def emit_tick(self, tick: TickData) -> None:
+        """推送Tick到事件引擎，开启行情总线时同时写入共享内存"""
+        if self.tick_bus:
+            self.tick_bus.publish(tick)
+        self.gateway.on_tick(tick)
+
+    def on_push_batch(self) -> None:
+        """一批推送处理完成"""
+        if self.conflate_mode == CONFLATE_BATCH:
+            self.flush_ticks()
+
+    def run_conflation(self) -> None:
+        """定时合并线程"""
+        while self.quote_ctx:
+            sleep(self.conflate_interval)
+            self.flush_ticks()
+
+    def get_conflation_stats(self) -> Dict[str, int]:
+        """获取行情合并计数：收到、输出、被合并的Tick数量"""
+        with self.conflate_lock:
+            return dict(self.conflate_stats)
+
+    def run_snapshot(self) -> None:
+        """快照轮询线程，每轮把全部代码的批次均匀分布在轮询间隔内"""
+        # 两次请求的最小间隔，保证不超过快照频率限制
+        min_spacing: float = 30 / REQUEST_LIMITS["get_market_snapshot"]
+
+        while not self.snapshot_stop.is_set():
+            with self.snapshot_lock:
+                codes: List[str] = list(self.snapshot_codes)
+
+            if not codes:
+                self.snapshot_stop.wait(self.snapshot_interval or min_spacing)
+                continue
+
+            batches: List[List[str]] = [
+                codes[i:i + SNAPSHOT_BATCH_SIZE] for i in range(0, len(codes), SNAPSHOT_BATCH_SIZE)
+            ]
+            spacing: float = max(self.snapshot_interval / len(batches), min_spacing)
+
+            for batch in batches:
+                begin: float = time()
+                self.query_snapshot(batch)
+
+                if self.snapshot_stop.wait(max(spacing - (time() - begin), 0)):
+                    return
+
+    def query_snapshot(self, codes: List[str]) -> None:
+        """请求一批代码的市场快照"""
+        quote_ctx: OpenQuoteContext = self.quote_ctx
+        if not quote_ctx:
+            return
+
+        ret, data = self.scheduler.call("get_market_snapshot", PRIORITY_QUERY, quote_ctx.get_market_snapshot, codes)
+        if ret != RET_OK:
+            self.gateway.write_log(f"市场快照查询失败: {data}")
+            return
+
+        self.process_snapshot(data)
+
+    def process_snapshot(self, data: DataFrame) -> None:
+        """处理市场快照，和上次快照比较，只为发生变化的代码输出Tick"""
+        if data.empty:
+            return
+
+        columns: List[list] = [data[field].tolist() for field in SNAPSHOT_FIELDS]
+
+        for code, values in zip(data["code"].tolist(), zip(*columns)):
+            if self.snapshot_values.get(code, None) == values:
+                continue
+            self.snapshot_values[code] = values
+
+            (
+                update_time, last_price, open_price, high_price, low_price, pre_close,
+                volume, turnover, bid_price, bid_volume, ask_price, ask_volume
+            ) = values
+
+            tick: TickData = self.get_tick(code)
+            if update_time:
+                tick.datetime = self.parse_quote_datetime(update_time[:10], update_time[11:])
+            else:
+                tick.datetime = datetime.now(CHINA_TZ)
+
+            tick.last_price = last_price
+            tick.open_price = open_price
+            tick.high_price = high_price
+            tick.low_price = low_price
+            tick.pre_close = pre_close
+            tick.volume = volume
+            tick.turnover = turnover
+            tick.bid_price_1 = bid_price
+            tick.bid_volume_1 = bid_volume
+            tick.ask_price_1 = ask_price
+            tick.ask_volume_1 = ask_volume
+
+            self.put_tick(tick)
+
+        self.on_push_batch()
+
+        self.on_push_batch()
+
     def process_quote(self, code: str, data: dict) -> None:
+        """处理SDK解析的行情字典"""
+        self.process_quote_record(FutuQuoteRecord.from_dict(data, code))
+
+    def process_quote_record(self, record: FutuQuoteRecord) -> None:
         """处理行情推送"""
-        tick = self.get_tick(code)
-
-        # 更新时间
-        dt = datetime.now(CHINA_TZ)
-        if "data_date" in data and "data_time" in data and data["data_date"]:
-            date_str = data["data_date"].replace("-", "")
-            time_str = data["data_time"].split(".")[0]
-            dt = datetime.strptime(f"{date_str} {time_str}", "%Y%m%d %H:%M:%S")
-            dt = CHINA_TZ.localize(dt)
-
-        tick.datetime = dt
-
-        # 更新行情
-        tick.open_price = data.get("open_price", 0)
-        tick.high_price = data.get("high_price", 0)
-        tick.low_price = data.get("low_price", 0)
-        tick.pre_close = data.get("prev_close_price", 0)
-        tick.last_price = data.get("last_price", 0)
-        tick.volume = data.get("volume", 0)
-
-        # 更新涨跌停价格
-        if "price_spread" in data:
-            spread = data["price_spread"]
-            tick.limit_up = tick.last_price + spread * 10
-            tick.limit_down = tick.last_price - spread * 10
-
-        self.gateway.on_tick(copy(tick))
+        if self.recorder:
+            self.recorder.record(RECORD_QUOTE, record)
+
+        self.subscription_manager.touch(record.code)
+        tick = self.get_tick(record.code)
+
+        # 更新时间、行情和涨跌停价格
+        update_tick_quote(tick, record, self.date_bases)
+
+        self.put_tick(tick)
+
+    def parse_quote_datetime(self, data_date: str, data_time: str) -> datetime:
+        """解析推送时间，交易日零点按日缓存，只解析当日时分秒"""
+        return parse_push_datetime(self.date_bases, data_date, data_time)
 
     def process_orderbook(self, data: dict) -> None:
+        """处理SDK解析的盘口字典"""
+        self.process_orderbook_record(FutuOrderBookRecord.from_dict(data))
+
+    def process_orderbook_record(self, record: FutuOrderBookRecord) -> None:
         """处理盘口数据推送"""
-        symbol = data.get("code", "")
-        tick = self.get_tick(symbol)
+        if self.recorder:
+            self.recorder.record(RECORD_ORDERBOOK, record)
 
-        # 更新盘口数据
-        bid_data = data.get("Bid", [])
-        ask_data = data.get("Ask", [])
+        self.subscription_manager.touch(record.code)
+        tick = self.get_tick(record.code)
 
-        for i in range(min(5, len(bid_data), len(ask_data))):
-            n = i + 1
-            setattr(tick, f"bid_price_{n}", bid_data[i][0])
-            setattr(tick, f"bid_volume_{n}", bid_data[i][1])
-            setattr(tick, f"ask_price_{n}", ask_data[i][0])
-            setattr(tick, f"ask_volume_{n}", ask_data[i][1])
+        # 原地更新全档位盘口，再同步前5档到Tick
+        orderbook: Optional[FutuOrderBook] = self.orderbooks.get(tick.vt_symbol, None)
+        if not orderbook:
+            orderbook = FutuOrderBook(tick.vt_symbol)
+            self.orderbooks[tick.vt_symbol] = orderbook
+
+        orderbook.update(record.bids, record.asks)
+        orderbook.fill_tick(tick)
 
         # 推送Tick数据
         if tick.datetime:
-            self.gateway.on_tick(copy(tick))
+            self.put_tick(tick)
+
+    def get_orderbook(self, vt_symbol: str) -> Optional[FutuOrderBook]:
+        """获取全档位盘口，通过get_bids/get_asks读取只读视图"""
+        return self.orderbooks.get(vt_symbol, None)
+
+    def process_ticker(self, data: DataFrame) -> None:
+        """处理逐笔推送，按列写入环形缓冲区后批量推送事件"""
+        if data.empty:
+            return
+
+        for code, frame in data.groupby("code", sort=False):
+            self.subscription_manager.touch(code)
+            symbol, exchange = self.get_code_entry(code)
+            vt_symbol: str = f"{symbol}.{exchange.value}"
+
+            buffer: Optional[FutuTickerBuffer] = self.ticker_buffers.get(vt_symbol, None)
+            if not buffer:
+                buffer = FutuTickerBuffer(vt_symbol)
+                self.ticker_buffers[vt_symbol] = buffer
+
+            array: np.ndarray = np.empty(len(frame), dtype=TICKER_DTYPE)
+            array["datetime"] = to_datetime(frame["time"]).to_numpy(dtype="datetime64[ms]")
+            array["price"] = frame["price"].to_numpy(dtype=np.float64)
+            array["volume"] = frame["volume"].to_numpy(dtype=np.float64)
+            array["direction"] = frame["ticker_direction"].map(TICKER_DIRECTION_MAP).fillna(0).to_numpy(dtype=np.int8)
+            array["sequence"] = frame["sequence"].to_numpy(dtype=np.int64)
+
+            start, end = buffer.append(array)
+            if start == end:
+                continue
+
+            update: FutuTickerUpdate = FutuTickerUpdate(vt_symbol, buffer, start, end)
+            self.gateway.on_event(EVENT_FUTU_TICKER, update)
+            self.gateway.on_event(EVENT_FUTU_TICKER + vt_symbol, update)
+
+    def get_ticker_buffer(self, vt_symbol: str) -> Optional[FutuTickerBuffer]:
+        """获取逐笔环形缓冲区"""
+        return self.ticker_buffers.get(vt_symbol, None)
+
+    def process_kline(self, data: DataFrame) -> None:
+        """处理实时K线推送，K线时间前进时先输出上一根已完成的K线"""
+        if data.empty:
+            return
+
+        for code, k_type, time_key, open_price, high_price, low_price, close_price, volume, turnover in zip(
+            data["code"].tolist(),
+            data["k_type"].tolist(),
+            data["time_key"].tolist(),
+            data["open"].tolist(),
+            data["high"].tolist(),
+            data["low"].tolist(),
+            data["close"].tolist(),
+            data["volume"].tolist(),
+            data["turnover"].tolist(),
+        ):
+            self.subscription_manager.touch(code)
+            dt: datetime = self.parse_quote_datetime(time_key[:10], time_key[11:])
+
+            key: Tuple[str, str] = (code, k_type)
+            bar: Optional[BarData] = self.bars.get(key, None)
+
+            if bar:
+                # 忽略晚到的旧K线推送
+                if dt < bar.datetime:
+                    continue
+
+                if dt > bar.datetime:
+                    self.put_bar(EVENT_FUTU_BAR, k_type, bar)
+                    bar = None
+
+            if not bar:
+                symbol, exchange = self.get_code_entry(code)
+                bar = BarData(
+                    symbol=symbol,
+                    exchange=exchange,
+                    interval=KLINE_INTERVAL_MAP.get(k_type, None),
+                    datetime=dt,
+                    gateway_name=self.gateway_name
+                )
+                self.bars[key] = bar
+
+            bar.open_price = open_price
+            bar.high_price = high_price
+            bar.low_price = low_price
+            bar.close_price = close_price
+            bar.volume = volume
+            bar.turnover = turnover
+
+            self.put_bar(EVENT_FUTU_BAR_UPDATE, k_type, bar)
+
+    def put_bar(self, event_type: str, k_type: str, bar: BarData) -> None:
+        """按K线类型和合约推送K线事件"""
+        bar = copy(bar)
+        self.gateway.on_event(get_bar_event(event_type, k_type), bar)
+        self.gateway.on_event(get_bar_event(event_type, k_type, bar.vt_symbol), bar)
 
     def get_tick(self, code: str) -> TickData:
         """获取或创建Tick对象"""
@@ -387,7 +1514,7 @@ class FutuQuoteApi:
 
         if not tick:
             # 解析富途代码为VeighNa符号和交易所
-            symbol, exchange = self.convert_symbol_futu2vt(code)
+            symbol, exchange = self.get_code_entry(code)
 
             # 创建Tick对象
             tick = TickData(
@@ -399,52 +1526,181 @@ class FutuQuoteApi:
             self.ticks[code] = tick
 
             # 查找合约名称
-            contract = self.contracts.get(tick.vt_symbol, None)
+            contract = self.get_contract(code)
             if contract:
                 tick.name = contract.name
 
         return tick
 
+    def get_code_entry(self, code: str) -> Tuple[str, Exchange]:
+        """从代码表查找富途代码对应的(代码, 交易所)"""
+        entry: Optional[Tuple[str, Exchange]] = self.code_table.get(code, None)
+        if not entry:
+            entry = self.convert_symbol_futu2vt(code)
+            self.code_table[code] = entry
+        return entry
+
     def subscribe(self, req: SubscribeRequest) -> None:
         """订阅行情"""
+        self.subscribe_batch([req])
+
+    def subscribe_batch(self, reqs: List[SubscribeRequest], subtypes: Optional[List[str]] = None) -> None:
+        """批量订阅行情，subtypes默认使用self.subtypes"""
         if not self.quote_ctx:
             return
 
-        # 检查是否已订阅
-        if req.vt_symbol in self.subscribed:
-            return
+        if not subtypes:
+            subtypes = self.subtypes
 
         # 转换VeighNa代码为富途代码
-        futu_symbol = self.convert_symbol_vt2futu(req.symbol, req.exchange)
+        codes: Dict[str, SubscribeRequest] = {
+            self.convert_symbol_vt2futu(req.symbol, req.exchange): req for req in reqs
+        }
+
+        # 快照轮询模式只加入轮询列表，不占用订阅额度
+        if self.quote_mode == QUOTE_MODE_SNAPSHOT:
+            with self.snapshot_lock:
+                self.snapshot_codes.update(dict.fromkeys(codes))
+            done: List[str] = list(codes)
+        # 发送批量订阅请求
+        else:
+            done = self.subscription_manager.subscribe(list(codes), subtypes)
 
-        # 发送订阅请求
-        ret, data = self.quote_ctx.subscribe(futu_symbol, [SubType.QUOTE, SubType.ORDER_BOOK])
-        if ret != RET_OK:
-            self.gateway.write_log(f"行情订阅失败: {data}")
-            return
+        for futu_symbol in done:
+            req: SubscribeRequest = codes[futu_symbol]
+            if req.vt_symbol in self.subscribed:
+                continue
 
-        # 记录订阅的合约
-        self.subscribed.add(req.vt_symbol)
+            # 记录订阅的合约
+            self.subscribed.add(req.vt_symbol)
+
+            # 合约信息中找不到时，添加默认合约对象到缓存
+            if not self.get_contract(futu_symbol):
+                contract = ContractData(
+                    symbol=req.symbol,
+                    exchange=req.exchange,
+                    name=req.symbol,
+                    product=Product.EQUITY,  # 默认为股票，后续处理中会更新
+                    size=1,
+                    pricetick=0.001,
+                    gateway_name=self.gateway_name
+                )
+                self.contracts[req.vt_symbol] = contract
+                self.gateway.on_contract(copy(contract))
 
-        # 添加合约对象到缓存
-        contract = ContractData(
-            symbol=req.symbol,
-            exchange=req.exchange,
-            name=req.symbol,
-            product=Product.EQUITY,  # 默认为股票，后续处理中会更新
-            size=1,
-            pricetick=0.001,
-            gateway_name=self.gateway_name
-        )
-        self.contracts[req.vt_symbol] = contract
-        self.gateway.on_contract(copy(contract))
+        if len(reqs) == 1 and done:
+            self.gateway.write_log(f"{reqs[0].vt_symbol}行情订阅成功")
+        elif len(reqs) > 1:
+            self.gateway.write_log(f"批量行情订阅完成，成功{len(done)}个，共{len(reqs)}个")
+
+    def unsubscribe_batch(self, reqs: List[SubscribeRequest], subtypes: Optional[List[str]] = None) -> None:
+        """批量反订阅行情"""
+        if not self.quote_ctx:
+            return
+
+        codes: List[str] = [self.convert_symbol_vt2futu(req.symbol, req.exchange) for req in reqs]
+
+        if self.quote_mode != QUOTE_MODE_SNAPSHOT:
+            self.subscription_manager.unsubscribe(codes, subtypes or self.subtypes)
+            return
+
+        with self.snapshot_lock:
+            for code in codes:
+                self.snapshot_codes.pop(code, None)
+                self.snapshot_values.pop(code, None)
+
+        for req in reqs:
+            self.subscribed.discard(req.vt_symbol)
+
+    def query_history(
+        self,
+        req: HistoryRequest,
+        callback: Optional[Callable[[int, int], None]] = None
+    ) -> Optional[List[BarData]]:
+        """查询历史数据，callback(页数, 累计条数)用于报告下载进度，下载中途失败时返回None"""
+        array: Optional[np.ndarray] = self.query_history_array(req, callback)
+        if array is None:
+            return None
+
+        return self.generate_bars(req, array)
+
+    def query_history_array(
+        self,
+        req: HistoryRequest,
+        callback: Optional[Callable[[int, int], None]] = None
+    ) -> Optional[np.ndarray]:
+        """查询历史数据，直接返回KLINE_DTYPE结构化数组，下载中途失败时返回None"""
+        arrays: List[np.ndarray] = []
+        chunks: Iterator[np.ndarray] = self.iter_history_arrays(req, callback)
+
+        while True:
+            try:
+                arrays.append(next(chunks))
+            except StopIteration as e:
+                finished: bool = bool(e.value)
+                break
+
+        # 中途某页失败时不返回缺页的部分数据
+        if not finished:
+            return None
+
+        if not arrays:
+            return np.empty(0, dtype=KLINE_DTYPE)
+
+        return np.concatenate(arrays)
+
+    def iter_history(
+        self,
+        req: HistoryRequest,
+        chunk_size: int = 0,
+        callback: Optional[Callable[[int, int], None]] = None
+    ) -> Iterator[List[BarData]]:
+        """流式查询历史数据，逐页（或按chunk_size条）返回K线列表
+
+        中途某页失败时已返回的数据不完整，会输出日志提示。
+        """
+        buffer: List[np.ndarray] = []
+        size: int = 0
+        chunks: Iterator[np.ndarray] = self.iter_history_arrays(req, callback)
+
+        while True:
+            try:
+                array: np.ndarray = next(chunks)
+            except StopIteration as e:
+                finished: bool = bool(e.value)
+                break
+
+            if not chunk_size:
+                yield self.generate_bars(req, array)
+                continue
 
-        self.gateway.write_log(f"{req.vt_symbol}行情订阅成功")
+            buffer.append(array)
+            size += len(array)
 
-    def query_history(self, req: HistoryRequest) -> List[BarData]:
-        """查询历史数据"""
+            while size >= chunk_size:
+                merged: np.ndarray = np.concatenate(buffer)
+                yield self.generate_bars(req, merged[:chunk_size])
+
+                buffer = [merged[chunk_size:]]
+                size -= chunk_size
+
+        if size:
+            yield self.generate_bars(req, np.concatenate(buffer))
+
+        if not finished:
+            self.gateway.write_log(f"{req.vt_symbol}历史数据下载中断，已返回的数据不完整")
+
+    def iter_history_arrays(
+        self,
+        req: HistoryRequest,
+        callback: Optional[Callable[[int, int], None]] = None
+    ) -> Iterator[np.ndarray]:
+        """流式查询历史数据，逐段返回KLINE_DTYPE结构化数组
+
+        生成器结束时返回是否完整下载，未连接或周期不支持时不产生数据并返回True。
+        """
         if not self.quote_ctx:
-            return []
+            return True
 
         # 转换VeighNa代码为富途代码
         futu_symbol = self.convert_symbol_vt2futu(req.symbol, req.exchange)
@@ -453,82 +1709,444 @@ class FutuQuoteApi:
         ktype = INTERVAL_VT2FUTU.get(req.interval)
         if not ktype:
             self.gateway.write_log(f"不支持的时间周期: {req.interval}")
-            return []
+            return True
+
+        if self.bar_cache:
+            key, finished = self.sync_cached_history(futu_symbol, ktype, req.start.date(), req.end.date(), callback)
+            yield from self.bar_cache.iter_load(key, req.start.date(), req.end.date(), HISTORY_PAGE_SIZE)
+            return finished
 
         # 查询起止时间
         start = req.start.strftime("%Y-%m-%d")
         end = req.end.strftime("%Y-%m-%d")
 
-        # 请求历史数据
-        ret, data, page_req_key = self.quote_ctx.request_history_kline(
-            futu_symbol,
-            start=start,
-            end=end,
-            ktype=ktype,
-            max_count=1000
-        )
+        pages: Iterator[DataFrame] = self.iter_history_pages(futu_symbol, start, end, ktype, callback)
+
+        while True:
+            try:
+                data: DataFrame = next(pages)
+            except StopIteration as e:
+                return bool(e.value)
+
+            yield convert_kline_array(data)
+
+    def sync_cached_history(
+        self,
+        futu_symbol: str,
+        ktype: KLType,
+        start: date,
+        end: date,
+        callback: Optional[Callable[[int, int], None]] = None
+    ) -> Tuple[str, bool]:
+        """只向OpenD请求缓存之外的首尾区间并写入缓存，返回(缓存键, 缺失区间是否全部下载完整)"""
+        key: str = f"{futu_symbol}_{ktype}_{HISTORY_AUTYPE}"
+
+        # 当日K线尚未走完，不计入缓存的覆盖区间
+        last_complete: date = date.today() - timedelta(days=1)
+
+        # 除权除息后全部历史的复权价格都会改变，用复权因子指纹作为缓存版本
+        version: Optional[str] = ""
+        if HISTORY_AUTYPE != AuType.NONE:
+            version = self.query_rehab_version(futu_symbol)
+
+        with self.bar_cache.get_lock(key):
+            coverage: Optional[Tuple[date, date]] = self.bar_cache.get_coverage(key)
+
+            # 复权因子变化或查询失败时，已缓存的复权价格不能再与新下载的数据拼接
+            if version is None or self.bar_cache.get_version(key) != version:
+                if coverage:
+                    self.gateway.write_log(f"{futu_symbol}复权因子已变化或无法确认，清除历史K线缓存")
+                self.bar_cache.clear(key)
+                coverage = None
+
+            # 缺失区间始终与覆盖区间相邻，保证覆盖区间连续
+            segments: List[Tuple[date, date]] = []
+            complete: bool = True
+            if not coverage:
+                segments.append((start, end))
+            else:
+                cover_start, cover_end = coverage
+                if start < cover_start:
+                    segments.append((start, cover_start - timedelta(days=1)))
+                if end > cover_end:
+                    segments.append((cover_end + timedelta(days=1), end))
+
+            for seg_start, seg_end in segments:
+                array, finished = self.download_history_array(
+                    futu_symbol, seg_start.isoformat(), seg_end.isoformat(), ktype, callback
+                )
+                if not finished:
+                    complete = False
+                    continue
+
+                # 复权因子未知时只写入数据，不记录覆盖区间，下次重新下载
+                seg_end = min(seg_end, last_complete)
+                if seg_end >= seg_start and version is not None:
+                    self.bar_cache.update(key, array, seg_start, seg_end, version)
+                else:
+                    self.bar_cache.update(key, array)
 
+        return key, complete
+
+    def query_rehab_version(self, futu_symbol: str) -> Optional[str]:
+        """查询复权因子并生成指纹，查询失败时返回None"""
+        ret, data = self.scheduler.call("get_rehab", PRIORITY_HISTORY, self.quote_ctx.get_rehab, futu_symbol)
         if ret != RET_OK:
-            self.gateway.write_log(f"历史数据查询失败: {data}")
+            self.gateway.write_log(f"复权因子查询失败: {futu_symbol} {data}")
+            return None
+
+        return f"{crc32(data.to_json(orient='values').encode()):08x}"
+
+    def download_history_array(
+        self,
+        futu_symbol: str,
+        start: str,
+        end: str,
+        ktype: KLType,
+        callback: Optional[Callable[[int, int], None]] = None
+    ) -> Tuple[np.ndarray, bool]:
+        """下载历史K线数组，返回(数据, 是否完整下载)"""
+        arrays: List[np.ndarray] = []
+        pages: Iterator[DataFrame] = self.iter_history_pages(futu_symbol, start, end, ktype, callback)
+
+        while True:
+            try:
+                data: DataFrame = next(pages)
+            except StopIteration as e:
+                finished: bool = bool(e.value)
+                break
+
+            arrays.append(convert_kline_array(data))
+
+        if not arrays:
+            return np.empty(0, dtype=KLINE_DTYPE), finished
+
+        return np.concatenate(arrays), finished
+
+    def generate_bars(self, req: HistoryRequest, array: np.ndarray) -> List[BarData]:
+        """将K线数组批量转换为BarData列表"""
+        if not len(array):
             return []
 
-        bars = []
-        for _, row in data.iterrows():
-            # 创建K线数据对象
-            dt = datetime.strptime(row["time_key"], "%Y-%m-%d %H:%M:%S")
+        # 整列完成时区本地化
+        datetimes = DatetimeIndex(array["datetime"]).tz_localize(CHINA_TZ).to_pydatetime()
 
-            bar = BarData(
+        bars: List[BarData] = [
+            BarData(
                 symbol=req.symbol,
                 exchange=req.exchange,
                 interval=req.interval,
-                datetime=CHINA_TZ.localize(dt),
-                open_price=float(row["open"]),
-                high_price=float(row["high"]),
-                low_price=float(row["low"]),
-                close_price=float(row["close"]),
-                volume=float(row["volume"]),
+                datetime=dt,
+                open_price=open_price,
+                high_price=high_price,
+                low_price=low_price,
+                close_price=close_price,
+                volume=volume,
+                turnover=turnover,
                 gateway_name=self.gateway_name
             )
-            bars.append(bar)
-
+            for dt, open_price, high_price, low_price, close_price, volume, turnover in zip(
+                datetimes,
+                array["open"].tolist(),
+                array["high"].tolist(),
+                array["low"].tolist(),
+                array["close"].tolist(),
+                array["volume"].tolist(),
+                array["turnover"].tolist(),
+            )
+        ]
         return bars
 
-    def query_contract(self) -> None:
-        """查询合约信息"""
+    def request_history_page(
+        self,
+        futu_symbol: str,
+        start: str,
+        end: str,
+        ktype: KLType,
+        page_req_key: Optional[bytes]
+    ) -> Tuple[int, Any, Optional[bytes]]:
+        """请求单页历史K线，触发频率限制时退避重试"""
+        for i in range(HISTORY_RETRY_TIMES + 1):
+            ret, data, page_req_key_next = self.scheduler.call(
+                "request_history_kline",
+                PRIORITY_HISTORY,
+                self.quote_ctx.request_history_kline,
+                futu_symbol,
+                start=start,
+                end=end,
+                ktype=ktype,
+                autype=HISTORY_AUTYPE,
+                max_count=HISTORY_PAGE_SIZE,
+                page_req_key=page_req_key
+            )
+
+            if ret == RET_OK or not is_throttled(data) or i == HISTORY_RETRY_TIMES:
+                break
+
+            delay: float = HISTORY_RETRY_DELAY * 2 ** i
+            self.gateway.write_log(f"历史数据请求触发频率限制: {futu_symbol}，{delay}秒后重试")
+            sleep(delay)
+
+        return ret, data, page_req_key_next
+
+    def query_history_batch(
+        self,
+        reqs: List[HistoryRequest],
+        max_workers: int = 8
+    ) -> Iterator[Tuple[HistoryRequest, Optional[List[BarData]]]]:
+        """多合约并发下载历史数据，按完成顺序逐个返回(请求, K线列表)，下载失败的K线列表为None"""
         if not self.quote_ctx:
             return
 
-        # 查询港股、美股、A股市场的合约信息
-        for market in [Market.HK, Market.US, Market.SH, Market.SZ]:
-            for security_type in [SecurityType.STOCK, SecurityType.ETF, SecurityType.IDX, SecurityType.WARRANT]:
-                ret, data = self.quote_ctx.get_stock_basicinfo(market, security_type)
-                if ret != RET_OK:
-                    self.gateway.write_log(f"合约信息查询失败: {market} {security_type} {data}")
+        reqs = self.check_history_quota(reqs)
+
+        executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=max_workers)
+        futures: Dict[Future, HistoryRequest] = {
+            executor.submit(self.query_history, req): req for req in reqs
+        }
+
+        try:
+            for future in as_completed(futures):
+                req: HistoryRequest = futures[future]
+
+                try:
+                    bars: Optional[List[BarData]] = future.result()
+                except Exception as e:
+                    self.gateway.write_log(f"{req.vt_symbol}历史数据下载异常: {e}")
+                    bars = None
+
+                yield req, bars
+        finally:
+            # 调用方提前结束迭代时，取消尚未开始的下载
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def check_history_quota(self, reqs: List[HistoryRequest]) -> List[HistoryRequest]:
+        """按历史K线额度筛选请求，近30天内已下载过的代码不再占用额度"""
+        ret, data = self.scheduler.call(
+            "get_history_kl_quota", PRIORITY_HISTORY, self.quote_ctx.get_history_kl_quota, get_detail=True
+        )
+        if ret != RET_OK:
+            self.gateway.write_log(f"历史K线额度查询失败: {data}")
+            return reqs
+
+        _, remain_quota, detail_list = data
+        used_codes: set = {d["code"] for d in detail_list}
+
+        allowed: List[HistoryRequest] = []
+        skipped: List[str] = []
+
+        for req in reqs:
+            futu_symbol: str = self.convert_symbol_vt2futu(req.symbol, req.exchange)
+
+            if futu_symbol not in used_codes:
+                if remain_quota <= 0:
+                    skipped.append(req.vt_symbol)
                     continue
 
-                for _, row in data.iterrows():
-                    # 解析代码
-                    symbol, exchange = self.convert_symbol_futu2vt(row["code"])
-
-                    # 确定产品类型
-                    product = PRODUCT_FUTU2VT.get(security_type, Product.EQUITY)
-
-                    # 创建合约对象
-                    contract = ContractData(
-                        symbol=symbol,
-                        exchange=exchange,
-                        name=row["name"],
-                        product=product,
-                        size=1,
-                        pricetick=0.001,  # 默认最小价格变动
-                        net_position=True,
-                        gateway_name=self.gateway_name
+                remain_quota -= 1
+                used_codes.add(futu_symbol)
+
+            allowed.append(req)
+
+        if skipped:
+            self.gateway.write_log(f"历史K线额度不足，跳过{len(skipped)}个合约: {','.join(skipped[:10])}")
+
+        return allowed
+
+    def iter_history_pages(
+        self,
+        futu_symbol: str,
+        start: str,
+        end: str,
+        ktype: KLType,
+        callback: Optional[Callable[[int, int], None]] = None
+    ) -> Iterator[DataFrame]:
+        """按page_req_key逐页请求历史K线，处理当前页时预取下一页
+
+        生成器结束时返回是否完整下载。
+        """
+        executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=1)
+        future: Optional[Future] = executor.submit(
+            self.request_history_page, futu_symbol, start, end, ktype, None
+        )
+
+        page: int = 0
+        count: int = 0
+
+        try:
+            while future:
+                try:
+                    ret, data, page_req_key = future.result()
+                except CancelledError:
+                    ret, data = RET_ERROR, "请求已取消"
+                except Exception as e:
+                    ret, data = RET_ERROR, e
+
+                if ret != RET_OK:
+                    self.gateway.write_log(f"历史数据查询失败: {futu_symbol} 第{page + 1}页 {data}")
+                    return False
+
+                # 还有后续数据时立即预取下一页
+                if page_req_key:
+                    future = executor.submit(
+                        self.request_history_page, futu_symbol, start, end, ktype, page_req_key
                     )
+                else:
+                    future = None
+
+                page += 1
+                count += len(data)
 
-                    self.contracts[contract.vt_symbol] = contract
-                    self.gateway.on_contract(copy(contract))
+                if callback:
+                    callback(page, count)
 
-        self.gateway.write_log("合约信息查询成功")
+                yield data
+
+            self.gateway.write_log(f"{futu_symbol}历史数据下载完成，共{page}页{count}条")
+        finally:
+            executor.shutdown(wait=False)
+
+        return True
+
+    def load_contract(self) -> None:
+        """加载合约信息快照，不存在或过期时在后台线程刷新"""
+        if self.load_contract_snapshot():
+            self.gateway.write_log(f"合约信息快照加载成功，共{len(self.contract_rows)}条")
+            return
+
+        thread: Thread = Thread(target=self.query_contract, daemon=True)
+        thread.start()
+
+    def load_contract_snapshot(self) -> bool:
+        """一次性读取合约信息快照，返回快照是否仍在有效期内"""
+        if not self.contract_path.exists():
+            return False
+
+        # 快照文件损坏或格式不符时忽略，改为全量查询
+        try:
+            with open(self.contract_path, encoding="UTF-8") as f:
+                snapshot: dict = json.load(f)
+
+            # 市场或证券类型配置变化后，旧快照不再适用
+            if snapshot["markets"] != self.contract_markets or snapshot["security_types"] != self.contract_types:
+                return False
+
+            rows: Dict[str, Tuple[str, str, int]] = dict(zip(
+                snapshot["code"],
+                zip(snapshot["name"], snapshot["security_type"], snapshot["lot_size"])
+            ))
+            update_time: float = float(snapshot["update_time"])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.gateway.write_log(f"合约信息快照读取失败，重新查询合约信息: {e}")
+            return False
+
+        self.contract_rows = rows
+
+        return time() - update_time < CONTRACT_SNAPSHOT_TTL
+
+    def query_contract(self) -> None:
+        """查询合约信息并保存快照"""
+        if not self.quote_ctx:
+            return
+
+        rows: Dict[str, Tuple[str, str, int]] = dict(self.contract_rows)
+        complete: bool = True
+
+        # 各市场、证券类型的查询同时发出
+        tasks: List[Tuple[str, str]] = [
+            (market, security_type)
+            for market in self.contract_markets
+            for security_type in self.contract_types
+        ]
+        if not tasks:
+            return
+
+        futures: List[Future] = [
+            self.scheduler.submit(
+                "get_stock_basicinfo", PRIORITY_QUERY, self.quote_ctx.get_stock_basicinfo, market, security_type
+            )
+            for market, security_type in tasks
+        ]
+
+        for (market, security_type), future in zip(tasks, futures):
+            try:
+                ret, data = future.result()
+            except CancelledError:
+                ret, data = RET_ERROR, "请求已取消"
+            except Exception as e:
+                ret, data = RET_ERROR, e
+
+            if ret != RET_OK:
+                self.gateway.write_log(f"合约信息查询失败: {market} {security_type} {data}")
+                complete = False
+                continue
+
+            rows.update(convert_contract_rows(data, security_type))
+
+        self.contract_rows = rows
+
+        # 只有全部查询成功时才写入快照，避免残缺快照在有效期内被反复使用
+        if complete:
+            self.save_contract_snapshot(rows)
+
+        self.gateway.write_log(f"合约信息查询成功，共{len(rows)}条")
+
+    def save_contract_snapshot(self, rows: Dict[str, Tuple[str, str, int]]) -> None:
+        """按列保存合约信息快照"""
+        names, security_types, lot_sizes = zip(*rows.values()) if rows else ((), (), ())
+
+        snapshot: dict = {
+            "update_time": time(),
+            "markets": self.contract_markets,
+            "security_types": self.contract_types,
+            "code": list(rows.keys()),
+            "name": list(names),
+            "security_type": list(security_types),
+            "lot_size": list(lot_sizes),
+        }
+
+        # 先写入临时文件再替换，避免写入中断留下不完整的快照
+        tmp_path: Path = self.contract_path.with_suffix(".tmp")
+        with open(tmp_path, mode="w", encoding="UTF-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        tmp_path.replace(self.contract_path)
+
+    def get_contract(self, code: str) -> Optional[ContractData]:
+        """根据富途代码获取合约对象，首次查找时创建并推送"""
+        symbol, exchange = self.get_code_entry(code)
+        vt_symbol: str = f"{symbol}.{exchange.value}"
+
+        contract: Optional[ContractData] = self.contracts.get(vt_symbol, None)
+        if contract:
+            return contract
+
+        row: Optional[Tuple[str, str, int]] = self.contract_rows.get(code, None)
+        if not row:
+            return None
+
+        with self.contract_lock:
+            contract = self.contracts.get(vt_symbol, None)
+            if contract:
+                return contract
+
+            name, security_type, lot_size = row
+            contract = ContractData(
+                symbol=symbol,
+                exchange=exchange,
+                name=name,
+                product=PRODUCT_FUTU2VT.get(security_type, Product.EQUITY),
+                size=1,
+                pricetick=0.001,  # 默认最小价格变动
+                min_volume=lot_size or 1,
+                net_position=True,
+                gateway_name=self.gateway_name
+            )
+            self.contracts[vt_symbol] = contract
+
+        self.gateway.on_contract(copy(contract))
+        return contract
 
     def convert_symbol_futu2vt(self, code: str) -> Tuple[str, Exchange]:
         """富途代码转换为VeighNa代码"""
@@ -543,6 +2161,11 @@ class FutuQuoteApi:
         # 对未识别代码的处理
         return code, Exchange.SMART
 
+    def convert_vt_symbol(self, code: str) -> str:
+        """富途代码转换为VeighNa本地代码"""
+        symbol, exchange = self.convert_symbol_futu2vt(code)
+        return f"{symbol}.{exchange.value}"
+
     def convert_symbol_vt2futu(self, symbol: str, exchange: Exchange) -> str:
         """VeighNa代码转换为富途代码"""
         futu_exchange = EXCHANGE_VT2FUTU.get(exchange, Market.HK)
@@ -558,12 +2181,21 @@ class FutuOrderHandler(TradeOrderHandlerBase):
 
     def on_recv_rsp(self, rsp_pb) -> None:
         """收到推送数据回调"""
-        ret_code, content = super().on_recv_rsp(rsp_pb)
+        if self.api.fast_push:
+            ret_code, content = parse_order_push(rsp_pb)
+        else:
+            ret_code, content = super().on_recv_rsp(rsp_pb)
+            if ret_code == RET_OK:
+                content = convert_records(content, FutuOrderRecord)
+
         if ret_code != RET_OK:
             self.api.gateway.write_log(f"委托状态推送数据处理失败: {content}")
             return
 
-        self.api.process_order(content)
+        for record in content:
+            if self.api.recorder:
+                self.api.recorder.record(RECORD_ORDER, record)
+            self.api.process_order_record(record)
 
 
 class FutuDealHandler(TradeDealHandlerBase):
@@ -575,12 +2207,35 @@ class FutuDealHandler(TradeDealHandlerBase):
 
     def on_recv_rsp(self, rsp_pb) -> None:
         """收到推送数据回调"""
-        ret_code, content = super().on_recv_rsp(rsp_pb)
+        if self.api.fast_push:
+            ret_code, content = parse_deal_push(rsp_pb)
+        else:
+            ret_code, content = super().on_recv_rsp(rsp_pb)
+            if ret_code == RET_OK:
+                content = convert_records(content, FutuDealRecord)
+
         if ret_code != RET_OK:
             self.api.gateway.write_log(f"成交状态推送数据处理失败: {content}")
             return
 
-        self.api.process_deal(content)
+        for record in content:
+            if self.api.recorder:
+                self.api.recorder.record(RECORD_DEAL, record)
+            self.api.process_deal_record(record)
+
+
+class FutuBatchResult:
+    """批量下单撤单的汇总结果"""
+
+    def __init__(self, vt_orderids: List[str]) -> None:
+        """构造函数"""
+        self.vt_orderids: List[str] = vt_orderids      # 与请求顺序一致，未能生成委托的为空字符串
+        self.errors: Dict[int, str] = {}               # 失败请求的序号 -> 错误信息
+        self.elapsed: float = 0                        # 全部请求返回的耗时（秒）
+
+    def __repr__(self) -> str:
+        """汇总信息"""
+        return f"FutuBatchResult(成功{len(self.vt_orderids) - len(self.errors)}笔，共{len(self.vt_orderids)}笔，耗时{self.elapsed:.3f}秒)"
 
 
 class FutuTradeApi:
@@ -599,10 +2254,43 @@ class FutuTradeApi:
         self.trades: set = set()
         self.orders: Dict[str, OrderData] = {}
 
+        # 下单、撤单和查询都提交到请求调度器
+        self.scheduler: FutuRequestScheduler = gateway.scheduler
+        self.query_endpoints: Dict[Callable, str] = {
+            self.request_account: "accinfo_query",
+            self.request_position: "position_list_query",
+            self.request_order: "order_list_query",
+            self.request_trade: "deal_list_query",
+        }
+
+        # 推送直接读取protobuf字段，为False时使用SDK解析
+        self.fast_push: bool = True
+
+        # 推送录制，开启后解析后的推送记录同时写入录制文件
+        self.recorder: Optional[FutuRecorder] = None
+
+        # 本地持仓资金账本
+        self.ledger: FutuLedger = FutuLedger(self.gateway_name)
+
         # 创建回调处理对象
         self.order_handler: FutuOrderHandler = FutuOrderHandler(self)
         self.deal_handler: FutuDealHandler = FutuDealHandler(self)
 
+        # 委托发送状态，由order_lock保护
+        self.order_lock: Lock = Lock()
+        self.queued_orderids: Set[str] = set()          # 已排队尚未发出的本地委托号
+        self.cancelled_orderids: Set[str] = set()       # 收到富途委托号前已请求撤单的本地委托号
+        self.sending_orderids: Set[str] = set()         # 已发出尚未返回富途委托号的本地委托号
+        self.pending_records: Dict[str, List[Tuple[Callable, Any]]] = {}   # 富途委托号未知的推送
+
+        # 改单状态，由order_lock保护，同一委托同时只有一个改单请求在途
+        self.amend_targets: Dict[str, Tuple[float, float, float]] = {}    # 待发送的(价格, 数量, 请求时间)
+        self.amending_orderids: Set[str] = set()        # 改单请求在途的委托号
+        self.amend_count: int = 0                       # 改单成功次数
+        self.amend_failed: int = 0                      # 改单失败次数
+        self.amend_coalesced: int = 0                   # 被后续改单覆盖、未发送的改单次数
+        self.amend_latencies: Deque[float] = deque(maxlen=AMEND_LATENCY_SAMPLES)
+
     def connect(
         self,
         host: str,
@@ -644,16 +2332,17 @@ class FutuTradeApi:
                 self.trade_ctx[Market.SZ] = trade_ctx
                 self.gateway.write_log("富途A股交易接口连接成功")
 
-        # 启动交易连接后执行初始化查询
+        # 启动交易连接后执行初始化查询，委托、成交、持仓、账户同时发出
         if self.trade_ctx:
-            # 查询委托
-            self.query_order()
-            # 查询成交
-            self.query_trade()
-            # 查询持仓
-            self.query_position()
-            # 查询账户
-            self.query_account()
+            seq: int = self.ledger.mark()
+            self.run_queries([
+                (self.request_order, self.on_order_result),
+                (self.request_trade, self.on_trade_result),
+                (self.request_position, partial(self.on_position_result, seq=seq)),
+                (self.request_account, partial(self.on_account_result, seq=seq)),
+            ])
+            self.gateway.write_log("委托查询成功")
+            self.gateway.write_log("成交查询成功")
 
     def close(self) -> None:
         """关闭连接"""
@@ -662,92 +2351,375 @@ class FutuTradeApi:
                 ctx.close()
         self.trade_ctx.clear()
 
+    def get_endpoint(self, name: str, market: Market) -> str:
+        """交易接口的调度名称，不同交易市场分别计算频率限制"""
+        return f"{name}.{TRDMARKET_VT2FUTU[market]}"
+
+    def submit_place(self, market: Market, req: OrderRequest, orderid: str) -> Future:
+        """提交下单请求到调度器"""
+        future: Future = self.scheduler.submit(
+            self.get_endpoint("place_order", market),
+            PRIORITY_PLACE,
+            self.place_order,
+            self.trade_ctx[market],
+            market,
+            req,
+            orderid
+        )
+        future.add_done_callback(partial(self.check_place, orderid))
+        return future
+
+    def submit_cancel(self, market: Market, orderid: str) -> Future:
+        """提交撤单请求到调度器"""
+        future: Future = self.scheduler.submit(
+            self.get_endpoint("modify_order", market),
+            PRIORITY_CANCEL,
+            self.cancel_futu_order,
+            self.trade_ctx[market],
+            market,
+            orderid
+        )
+        future.add_done_callback(self.check_future)
+        return future
+
+    def check_future(self, future: Future) -> None:
+        """记录调度执行时的异常"""
+        if future.cancelled():
+            self.gateway.write_log("委托请求已取消，请求调度器已关闭")
+        elif future.exception():
+            self.gateway.write_log(f"委托请求异常: {future.exception()}")
+
+    def check_place(self, orderid: str, future: Future) -> None:
+        """下单请求结束后检查，请求被取消或调度器已关闭而未发出时拒单"""
+        self.check_future(future)
+
+        with self.order_lock:
+            queued: bool = orderid in self.queued_orderids
+            self.queued_orderids.discard(orderid)
+            self.cancelled_orderids.discard(orderid)
+
+        if queued:
+            self.gateway.write_log(f"委托未发出: {orderid}")
+            self.update_order_status(orderid, Status.REJECTED)
+
+    def get_market(self, exchange: Exchange) -> Optional[Market]:
+        """交易所对应的交易市场"""
+        if exchange == Exchange.SEHK:
+            return Market.HK
+        elif exchange in [Exchange.NYSE, Exchange.NASDAQ, Exchange.SMART]:
+            return Market.US
+        elif exchange == Exchange.SSE:
+            return Market.SH
+        elif exchange == Exchange.SZSE:
+            return Market.SZ
+        return None
+
+    def check_order(self, req: OrderRequest) -> Tuple[Optional[Market], str]:
+        """检查委托请求，返回(交易市场, 错误信息)"""
+        market: Optional[Market] = self.get_market(req.exchange)
+        if not market:
+            return None, f"不支持的交易所: {req.exchange}"
+
+        if market not in self.trade_ctx:
+            return None, f"交易会话未创建: {market}"
+
+        return market, ""
+
+    def create_order(self, req: OrderRequest) -> OrderData:
+        """生成本地委托号，推送提交中状态的委托数据"""
+        orderid: str = self.gateway.new_orderid()
+        order: OrderData = req.create_order_data(orderid, self.gateway_name)
+
+        with self.order_lock:
+            self.orders[orderid] = order
+            self.queued_orderids.add(orderid)
+
+        self.gateway.on_order(copy(order))
+        return order
+
     def send_order(self, req: OrderRequest) -> str:
-        """委托下单"""
-        # 判断合适的交易市场
-        if req.exchange == Exchange.SEHK:
-            market = Market.HK
-        elif req.exchange in [Exchange.NYSE, Exchange.NASDAQ, Exchange.SMART]:
-            market = Market.US
-        elif req.exchange == Exchange.SSE:
-            market = Market.SH
-        elif req.exchange == Exchange.SZSE:
-            market = Market.SZ
-        else:
-            self.gateway.write_log(f"不支持的交易所: {req.exchange}")
+        """委托下单，立即返回本地委托号，由请求调度器提交到富途"""
+        market, error = self.check_order(req)
+        if error:
+            self.gateway.write_log(error)
             return ""
 
-        # 获取对应市场的交易会话
-        trade_ctx = self.trade_ctx.get(market, None)
-        if not trade_ctx:
-            self.gateway.write_log(f"交易会话未创建: {market}")
-            return ""
+        order: OrderData = self.create_order(req)
 
-        # 发送委托请求
-        futu_order_type = ORDERTYPE_VT2FUTU.get(req.type, FutuOrderType.NORMAL)
+        self.submit_place(market, req, order.orderid)
+
+        return order.vt_orderid
+
+    def send_orders(self, reqs: List[OrderRequest]) -> FutuBatchResult:
+        """批量下单，各交易会话同时提交，全部返回后汇总结果"""
+        start: float = time()
+        result: FutuBatchResult = FutuBatchResult([""] * len(reqs))
+        futures: List[Tuple[int, Future]] = []
+
+        for i, req in enumerate(reqs):
+            market, error = self.check_order(req)
+            if error:
+                result.errors[i] = error
+                continue
+
+            order: OrderData = self.create_order(req)
+            result.vt_orderids[i] = order.vt_orderid
+
+            futures.append((i, self.submit_place(market, req, order.orderid)))
 
-        # 将VeighNa代码转换为富途代码
-        futu_code = f"{market}.{req.symbol}"
+        self.collect_results(result, futures)
+        result.elapsed = time() - start
 
-        # 确定买卖方向
-        trd_side = DIRECTION_VT2FUTU.get(req.direction, TrdSide.BUY)
+        self.gateway.write_log(f"批量下单完成，成功{len(reqs) - len(result.errors)}笔，共{len(reqs)}笔")
+        return result
+
+    def place_order(self, trade_ctx: Any, market: Market, req: OrderRequest, orderid: str) -> str:
+        """提交委托，收到富途委托号后与本地委托号关联，返回错误信息"""
+        with self.order_lock:
+            self.queued_orderids.discard(orderid)
+
+            # 发出前已撤单
+            cancelled: bool = orderid in self.cancelled_orderids
+            if cancelled:
+                self.cancelled_orderids.discard(orderid)
+            else:
+                self.sending_orderids.add(orderid)
+
+        if cancelled:
+            self.update_order_status(orderid, Status.CANCELLED)
+            return ""
 
         # 发送委托请求
-        ret, data = trade_ctx.place_order(
-            price=req.price,
-            qty=req.volume,
-            code=futu_code,
-            trd_side=trd_side,
-            order_type=futu_order_type,
-            trd_env=self.env
-        )
+        try:
+            ret, data = trade_ctx.place_order(
+                price=req.price,
+                qty=req.volume,
+                code=f"{market}.{req.symbol}",
+                trd_side=DIRECTION_VT2FUTU.get(req.direction, TrdSide.BUY),
+                order_type=ORDERTYPE_VT2FUTU.get(req.type, FutuOrderType.NORMAL),
+                trd_env=self.env
+            )
+        except Exception as e:
+            ret, data = RET_ERROR, e
+
+        with self.order_lock:
+            self.sending_orderids.discard(orderid)
+
+            # 等待返回期间请求的撤单和改单
+            cancelled = orderid in self.cancelled_orderids
+            self.cancelled_orderids.discard(orderid)
+
+            amend: bool = orderid in self.amend_targets
+            if ret != RET_OK or cancelled:
+                self.amend_targets.pop(orderid, None)
+                amend = False
+
+            # 关联富途委托号
+            futu_orderid: str = ""
+            if ret == RET_OK:
+                futu_orderid = str(data["order_id"][0])
+                self.gateway.local_orderids[futu_orderid] = orderid
+                self.gateway.futu_orderids[orderid] = futu_orderid
+
+            # 取出等待关联的推送，没有在途请求时全部取出
+            records: List[Tuple[Callable, Any]] = self.pending_records.pop(futu_orderid, [])
+            if not self.sending_orderids:
+                for pending in self.pending_records.values():
+                    records.extend(pending)
+                self.pending_records.clear()
 
         # 处理委托请求结果
         if ret != RET_OK:
             self.gateway.write_log(f"委托失败: {data}")
-            return ""
+            self.update_order_status(orderid, Status.REJECTED)
 
-        # 获取富途系统的订单编号
-        orderid = str(data["order_id"][0])
+        for process, record in records:
+            process(record)
 
-        # 推送委托数据
-        order = req.create_order_data(orderid, self.gateway_name)
-        self.orders[orderid] = order
+        if ret != RET_OK:
+            return f"委托失败: {data}"
+
+        if cancelled:
+            self.submit_cancel(market, orderid)
+        elif amend:
+            self.submit_amend(market, orderid)
+
+        return ""
+
+    def update_order_status(self, orderid: str, status: Status) -> None:
+        """更新本地委托状态并推送"""
+        order: OrderData = self.orders[orderid]
+        order.status = status
         self.gateway.on_order(copy(order))
 
-        return order.vt_orderid
+    def check_cancel(self, orderid: str) -> Tuple[Optional[Market], str]:
+        """
+        检查撤单请求，返回(交易市场, 错误信息)。
+
+        尚未返回富途委托号的委托只标记撤单，由下单处理，此时交易市场为None。
+        """
+        with self.order_lock:
+            # 查找委托记录
+            order: Optional[OrderData] = self.orders.get(orderid, None)
+
+            # 撤单后不再发送等待中的改单
+            self.amend_targets.pop(orderid, None)
+
+            if order and (orderid in self.queued_orderids or orderid in self.sending_orderids):
+                self.cancelled_orderids.add(orderid)
+                return None, ""
 
-    def cancel_order(self, req: CancelRequest) -> None:
-        """委托撤单"""
-        # 查找委托记录
-        order = self.orders.get(req.orderid, None)
         if not order:
-            self.gateway.write_log(f"撤单失败，未找到委托: {req.orderid}")
-            return
+            return None, f"撤单失败，未找到委托: {orderid}"
+
+        # 已撤销、已成交或被拒单的委托不再撤单
+        if not order.is_active():
+            return None, f"撤单失败，委托已结束: {orderid}"
 
         # 确定交易市场
-        if order.exchange == Exchange.SEHK:
-            market = Market.HK
-        elif order.exchange in [Exchange.NYSE, Exchange.NASDAQ, Exchange.SMART]:
-            market = Market.US
-        elif order.exchange == Exchange.SSE:
-            market = Market.SH
-        elif order.exchange == Exchange.SZSE:
-            market = Market.SZ
-        else:
-            self.gateway.write_log(f"不支持的交易所: {order.exchange}")
-            return
+        market: Optional[Market] = self.get_market(order.exchange)
+        if not market:
+            return None, f"不支持的交易所: {order.exchange}"
 
-        # 获取对应市场的交易会话
-        trade_ctx = self.trade_ctx.get(market, None)
-        if not trade_ctx:
-            self.gateway.write_log(f"交易会话未创建: {market}")
-            return
+        if market not in self.trade_ctx:
+            return None, f"交易会话未创建: {market}"
+
+        return market, ""
+
+    def cancel_order(self, req: CancelRequest) -> None:
+        """委托撤单，由请求调度器优先提交"""
+        market, error = self.check_cancel(req.orderid)
+        if error:
+            self.gateway.write_log(error)
+        elif market:
+            self.submit_cancel(market, req.orderid)
+
+    def cancel_orders(self, reqs: List[CancelRequest]) -> FutuBatchResult:
+        """批量撤单，各交易会话同时提交，全部返回后汇总结果"""
+        start: float = time()
+        result: FutuBatchResult = self.cancel_batch([req.orderid for req in reqs])
+        result.elapsed = time() - start
+
+        self.gateway.write_log(f"批量撤单完成，成功{len(reqs) - len(result.errors)}笔，共{len(reqs)}笔")
+        return result
+
+    def cancel_all(self, market: Optional[Market] = None) -> FutuBatchResult:
+        """
+        全部撤单，market为None时撤销所有交易市场的活动委托。
+
+        交易会话的全部市场都需要撤单时使用cancel_all_order一次撤销，
+        失败时（如模拟环境不支持）以及只撤A股沪深其中一个市场时逐笔撤单。
+        market没有对应的交易会话时，结果中只包含一条错误。
+        """
+        start: float = time()
+
+        if market and market not in self.trade_ctx:
+            result: FutuBatchResult = FutuBatchResult([""])
+            result.errors[0] = f"交易会话未创建: {market}"
+            self.gateway.write_log(f"全部撤单失败，{result.errors[0]}")
+            return result
+
+        markets: List[Market] = [market] if market else list(self.trade_ctx)
+
+        with self.order_lock:
+            orderids: List[str] = [
+                orderid for orderid, order in self.orders.items()
+                if order.is_active() and self.get_market(order.exchange) in markets
+            ]
+
+        # 按交易会话分组，会话的全部市场都要撤单时一次撤销
+        sessions: Dict[int, Tuple[Any, List[Market]]] = {}
+        for ctx_market, ctx in self.trade_ctx.items():
+            sessions.setdefault(id(ctx), (ctx, []))[1].append(ctx_market)
+
+        futures: List[Tuple[List[Market], Future]] = [
+            (ctx_markets, self.scheduler.submit(
+                self.get_endpoint("modify_order", ctx_markets[0]), PRIORITY_CANCEL, self.cancel_session, ctx, ctx_markets[0]
+            ))
+            for ctx, ctx_markets in sessions.values()
+            if all(ctx_market in markets for ctx_market in ctx_markets)
+        ]
+
+        # 整体撤单请求被取消或失败时，改为逐笔撤单
+        cancelled: List[Market] = []
+        for ctx_markets, future in futures:
+            try:
+                success: bool = future.result()
+            except CancelledError:
+                self.gateway.write_log(f"全部撤单请求已取消: {ctx_markets[0]}")
+                success = False
+            except Exception as e:
+                self.gateway.write_log(f"全部撤单请求异常: {ctx_markets[0]} {e}")
+                success = False
+
+            if success:
+                cancelled.extend(ctx_markets)
+
+        result = self.cancel_batch(orderids, cancelled)
+        result.elapsed = time() - start
+
+        self.gateway.write_log(f"全部撤单完成，成功{len(orderids) - len(result.errors)}笔，共{len(orderids)}笔")
+        return result
+
+    def cancel_session(self, trade_ctx: Any, market: Market) -> bool:
+        """使用cancel_all_order撤销交易会话的全部委托，返回是否成功"""
+        try:
+            ret, data = trade_ctx.cancel_all_order(trd_env=self.env, trdmarket=TRDMARKET_VT2FUTU[market])
+        except Exception as e:
+            ret, data = RET_ERROR, e
+
+        if ret != RET_OK:
+            self.gateway.write_log(f"全部撤单失败，改为逐笔撤单: {market} {data}")
+            return False
+        return True
+
+    def cancel_batch(self, orderids: List[str], cancelled: Optional[List[Market]] = None) -> FutuBatchResult:
+        """逐笔撤单并汇总结果，cancelled中的交易市场已全部撤单，不再单独发出"""
+        result: FutuBatchResult = FutuBatchResult([f"{self.gateway_name}.{orderid}" for orderid in orderids])
+        futures: List[Tuple[int, Future]] = []
+
+        for i, orderid in enumerate(orderids):
+            # 已整体撤单的交易市场，委托可能已收到撤销推送，不再检查
+            if cancelled:
+                with self.order_lock:
+                    order: Optional[OrderData] = self.orders.get(orderid, None)
+                if order and self.get_market(order.exchange) in cancelled:
+                    continue
+
+            market, error = self.check_cancel(orderid)
+            if error:
+                result.errors[i] = error
+            elif market:
+                futures.append((i, self.submit_cancel(market, orderid)))
+
+        self.collect_results(result, futures)
+        return result
+
+    def collect_results(self, result: FutuBatchResult, futures: List[Tuple[int, Future]]) -> None:
+        """等待批量请求全部返回，记录错误信息"""
+        for i, future in futures:
+            try:
+                error: str = future.result()
+            except CancelledError:
+                error = "请求已取消，请求调度器已关闭"
+            except Exception as e:
+                error = str(e) or repr(e)
+
+            if error:
+                result.errors[i] = error
+
+    def cancel_futu_order(self, trade_ctx: Any, market: Market, orderid: str) -> str:
+        """提交撤单，返回错误信息"""
+        futu_orderid: Optional[str] = self.get_futu_orderid(orderid)
+        if not futu_orderid:
+            error: str = f"撤单失败，委托未提交成功: {orderid}"
+            self.gateway.write_log(error)
+            return error
 
         # 发送撤单请求
         ret, data = trade_ctx.modify_order(
             ModifyOrderOp.CANCEL,
-            order_id=int(req.orderid),
+            order_id=int(futu_orderid),
             qty=0,
             price=0,
             trd_env=self.env
@@ -756,146 +2728,406 @@ class FutuTradeApi:
         # 处理撤单请求结果
         if ret != RET_OK:
             self.gateway.write_log(f"撤单失败: {data}")
+            return f"撤单失败: {data}"
+
+        return ""
+
+    def get_futu_orderid(self, orderid: str) -> Optional[str]:
+        """
+        本地委托号转换为富途委托号，没有富途委托号时返回None。
+
+        查询得到的委托使用富途委托号（纯数字）作为本地委托号，直接返回。
+        """
+        futu_orderid: Optional[str] = self.gateway.futu_orderids.get(orderid, None)
+        if futu_orderid:
+            return futu_orderid
+
+        if orderid.isdigit():
+            return orderid
+        return None
+
+    def amend_order(self, orderid: str, price: float, volume: float) -> None:
+        """
+        委托改单，修改价格和总数量。
+
+        同一委托的改单请求在途或尚未收到富途委托号时，新的改单只更新待发送的目标，
+        等前一个请求返回后只发送最新的目标。
+        """
+        with self.order_lock:
+            order: Optional[OrderData] = self.orders.get(orderid, None)
+            if not order:
+                self.gateway.write_log(f"改单失败，未找到委托: {orderid}")
+                return
+
+            if not order.is_active():
+                self.gateway.write_log(f"改单失败，委托已结束: {orderid}")
+                return
+
+            # 覆盖尚未发送的改单
+            if orderid in self.amend_targets:
+                self.amend_coalesced += 1
+                self.amend_targets[orderid] = (price, volume, time())
+                return
+
+            self.amend_targets[orderid] = (price, volume, time())
+
+            if (
+                orderid in self.amending_orderids
+                or orderid in self.queued_orderids
+                or orderid in self.sending_orderids
+            ):
+                return
+
+        market: Optional[Market] = self.get_market(order.exchange)
+        if not market or market not in self.trade_ctx:
+            with self.order_lock:
+                self.amend_targets.pop(orderid, None)
+            self.gateway.write_log(f"交易会话未创建: {order.exchange}")
+            return
 
-    def query_account(self) -> None:
-        """查询账户资金"""
-        for market, ctx in self.trade_ctx.items():
-            ret, data = ctx.accinfo_query(trd_env=self.env, acc_id=0)
+        self.submit_amend(market, orderid)
+
+    def submit_amend(self, market: Market, orderid: str) -> Future:
+        """提交改单请求到调度器"""
+        future: Future = self.scheduler.submit(
+            self.get_endpoint("modify_order", market),
+            PRIORITY_PLACE,
+            self.amend_futu_order,
+            self.trade_ctx[market],
+            market,
+            orderid
+        )
+        future.add_done_callback(self.check_future)
+        return future
+
+    def amend_futu_order(self, trade_ctx: Any, market: Market, orderid: str) -> str:
+        """提交最新的改单目标，返回后如有新的目标继续提交，返回错误信息"""
+        with self.order_lock:
+            target: Optional[Tuple[float, float, float]] = self.amend_targets.pop(orderid, None)
+            if not target:
+                return ""
+            self.amending_orderids.add(orderid)
+
+        price, volume, request_time = target
+        futu_orderid: Optional[str] = self.get_futu_orderid(orderid)
+
+        # 发送改单请求
+        try:
+            if not futu_orderid:
+                raise ValueError(f"委托未提交成功: {orderid}")
+
+            ret, data = trade_ctx.modify_order(
+                ModifyOrderOp.NORMAL,
+                order_id=int(futu_orderid),
+                qty=volume,
+                price=price,
+                trd_env=self.env
+            )
+        except Exception as e:
+            ret, data = RET_ERROR, e
 
-            if ret != RET_OK:
-                self.gateway.write_log(f"账户资金查询失败: {data}")
-                continue
+        with self.order_lock:
+            self.amending_orderids.discard(orderid)
 
-            for _, row in data.iterrows():
-                # 创建账户对象
-                account = AccountData(
-                    accountid=f"{self.gateway_name}_{market}",
-                    balance=float(row["power"]),
-                    frozen=float(row["frozen_cash"]),
-                    gateway_name=self.gateway_name
-                )
-                self.gateway.on_account(account)
+            if ret == RET_OK:
+                self.amend_count += 1
+                self.amend_latencies.append(time() - request_time)
+            else:
+                self.amend_failed += 1
 
-    def query_position(self) -> None:
-        """查询持仓"""
-        for ctx in self.trade_ctx.values():
-            ret, data = ctx.position_list_query(trd_env=self.env, acc_id=0)
+            resend: bool = orderid in self.amend_targets
 
-            if ret != RET_OK:
-                self.gateway.write_log(f"持仓查询失败: {data}")
-                continue
+        if resend:
+            self.submit_amend(market, orderid)
 
-            if data.empty:
-                continue
+        # 处理改单请求结果
+        if ret != RET_OK:
+            self.gateway.write_log(f"改单失败: {data}")
+            return f"改单失败: {data}"
+
+        return ""
+
+    def get_amend_metrics(self) -> Dict[str, float]:
+        """
+        改单统计：
+            count: 成功次数
+            failed: 失败次数
+            coalesced: 被后续改单覆盖、未发送的次数
+            avg_latency: 最近样本从请求改单到返回的平均秒数
+            max_latency: 最近样本的最长秒数
+        """
+        with self.order_lock:
+            latencies: List[float] = list(self.amend_latencies)
+            return {
+                "count": self.amend_count,
+                "failed": self.amend_failed,
+                "coalesced": self.amend_coalesced,
+                "avg_latency": sum(latencies) / len(latencies) if latencies else 0,
+                "max_latency": max(latencies, default=0),
+            }
+
+    def match_orderid(self, process: Callable, record: Any) -> Optional[str]:
+        """
+        富途委托号转换为本地委托号。
+
+        有委托请求在途时，未知富途委托号的推送可能早于请求返回，
+        先缓存等请求返回后再处理，此时返回None。
+        """
+        with self.order_lock:
+            orderid: Optional[str] = self.gateway.local_orderids.get(record.order_id, None)
+            if orderid:
+                return orderid
+
+            if self.sending_orderids:
+                self.pending_records.setdefault(record.order_id, []).append((process, record))
+                return None
+
+        return record.order_id
+
+    def get_accountid(self, exchange: Exchange) -> str:
+        """交易所对应的资金账户编号，A股沪深两市共用一个会话，使用上海市场的编号"""
+        market: Optional[Market] = self.get_market(exchange)
+        if market == Market.SZ and Market.SH in self.trade_ctx:
+            market = Market.SH
+        return f"{self.gateway_name}_{market}"
 
-            for _, row in data.iterrows():
-                # 解析代码
-                code = row["code"]
-                symbol, exchange = self.convert_symbol_futu2vt(code)
+    def get_contexts(self) -> List[Tuple[Market, Any]]:
+        """获取去重后的交易会话，A股沪深两市共用一个会话"""
+        contexts: Dict[int, Tuple[Market, Any]] = {}
+        for market, ctx in self.trade_ctx.items():
+            contexts.setdefault(id(ctx), (market, ctx))
+        return list(contexts.values())
 
-                # 创建持仓数据
-                pos = PositionData(
-                    symbol=symbol,
-                    exchange=exchange,
-                    direction=Direction.LONG,  # 富途持仓默认为多头
-                    volume=row["qty"],
-                    frozen=(float(row["qty"]) - float(row["can_sell_qty"])),
-                    price=float(row["cost_price"]),
-                    pnl=float(row["pl_val"]),
-                    gateway_name=self.gateway_name
-                )
-                self.gateway.on_position(pos)
+    def run_queries(
+        self,
+        queries: List[Tuple[Callable[[Any], Tuple[int, Any]], Callable[[Market, int, Any], None]]]
+    ) -> None:
+        """在所有交易会话上同时发出查询，全部返回后按顺序处理结果"""
+        futures: List[Tuple[Market, Callable, Future]] = [
+            (market, on_result, self.scheduler.submit(
+                self.get_endpoint(self.query_endpoints[request], market), PRIORITY_QUERY, request, ctx
+            ))
+            for request, on_result in queries
+            for market, ctx in self.get_contexts()
+        ]
+
+        for market, on_result, future in futures:
+            try:
+                ret, data = future.result()
+            except CancelledError:
+                self.gateway.write_log(f"交易查询已取消: {market}")
+                continue
+            except Exception as e:
+                self.gateway.write_log(f"交易查询异常: {market} {e}")
+                continue
 
-    def query_order(self) -> None:
-        """查询未成交委托"""
-        for ctx in self.trade_ctx.values():
-            ret, data = ctx.order_list_query("", trd_env=self.env)
+            on_result(market, ret, data)
 
-            if ret != RET_OK:
-                self.gateway.write_log(f"委托查询失败: {data}")
-                continue
+    def query_account(self) -> None:
+        """查询账户资金"""
+        seq: int = self.ledger.mark()
+        self.run_queries([(self.request_account, partial(self.on_account_result, seq=seq))])
 
-            if data.empty:
-                continue
+    def query_position(self) -> None:
+        """查询持仓"""
+        seq: int = self.ledger.mark()
+        self.run_queries([(self.request_position, partial(self.on_position_result, seq=seq))])
 
-            self.process_order(data)
+    def query_portfolio(self) -> None:
+        """同时查询账户资金和持仓"""
+        seq: int = self.ledger.mark()
+        self.run_queries([
+            (self.request_account, partial(self.on_account_result, seq=seq)),
+            (self.request_position, partial(self.on_position_result, seq=seq)),
+        ])
 
+    def query_order(self) -> None:
+        """查询未成交委托"""
+        self.run_queries([(self.request_order, self.on_order_result)])
         self.gateway.write_log("委托查询成功")
 
     def query_trade(self) -> None:
         """查询成交"""
-        for ctx in self.trade_ctx.values():
-            ret, data = ctx.deal_list_query("", trd_env=self.env)
+        self.run_queries([(self.request_trade, self.on_trade_result)])
+        self.gateway.write_log("成交查询成功")
 
-            if ret != RET_OK:
-                self.gateway.write_log(f"成交查询失败: {data}")
-                continue
+    def request_account(self, ctx: Any) -> Tuple[int, Any]:
+        """请求账户资金"""
+        return ctx.accinfo_query(trd_env=self.env, acc_id=0)
 
-            if data.empty:
-                continue
+    def request_position(self, ctx: Any) -> Tuple[int, Any]:
+        """请求持仓"""
+        return ctx.position_list_query(trd_env=self.env, acc_id=0)
 
-            self.process_deal(data)
+    def request_order(self, ctx: Any) -> Tuple[int, Any]:
+        """请求委托"""
+        return ctx.order_list_query("", trd_env=self.env)
 
-        self.gateway.write_log("成交查询成功")
+    def request_trade(self, ctx: Any) -> Tuple[int, Any]:
+        """请求成交"""
+        return ctx.deal_list_query("", trd_env=self.env)
+
+    def on_account_result(self, market: Market, ret: int, data: Any, seq: int) -> None:
+        """处理账户资金查询结果，seq为查询发出时账本的成交序号"""
+        if ret != RET_OK:
+            self.gateway.write_log(f"账户资金查询失败: {market} {data}")
+            return
 
-    def process_order(self, data: dict) -> None:
-        """处理委托数据"""
         for _, row in data.iterrows():
-            # 过滤已删除的委托
-            if row["order_status"] == OrderStatus.DELETED:
-                continue
+            # 创建账户对象
+            account = AccountData(
+                accountid=f"{self.gateway_name}_{market}",
+                balance=float(row["power"]),
+                frozen=float(row["frozen_cash"]),
+                gateway_name=self.gateway_name
+            )
+
+            # 用现金核对本地账本，购买力随保证金比例变化，不参与核对
+            drifts: List[str] = self.ledger.reconcile_account(account.accountid, float(row["cash"]), seq)
+            for drift in drifts:
+                self.gateway.write_log(drift)
 
+            self.gateway.on_account(account)
+
+    def on_position_result(self, market: Market, ret: int, data: Any, seq: int) -> None:
+        """处理持仓查询结果，seq为查询发出时账本的成交序号"""
+        if ret != RET_OK:
+            self.gateway.write_log(f"持仓查询失败: {market} {data}")
+            return
+
+        positions: List[PositionData] = []
+
+        for _, row in data.iterrows():
             # 解析代码
             code = row["code"]
             symbol, exchange = self.convert_symbol_futu2vt(code)
 
-            # 创建委托数据
-            orderid = str(row["order_id"])
-
-            order = OrderData(
+            # 创建持仓数据
+            pos = PositionData(
                 symbol=symbol,
                 exchange=exchange,
-                orderid=orderid,
-                direction=DIRECTION_FUTU2VT.get(row["trd_side"], Direction.LONG),
-                price=float(row["price"]),
-                volume=float(row["qty"]),
-                traded=float(row["dealt_qty"]),
-                status=STATUS_FUTU2VT.get(row["order_status"], Status.SUBMITTING),
-                datetime=self.generate_datetime(row["create_time"]),
+                direction=Direction.LONG,  # 富途持仓默认为多头
+                volume=row["qty"],
+                frozen=(float(row["qty"]) - float(row["can_sell_qty"])),
+                price=float(row["cost_price"]),
+                pnl=float(row["pl_val"]),
                 gateway_name=self.gateway_name
             )
+            positions.append(pos)
+
+        # 核对本地账本，券商没有返回的持仓视为已清空
+        positions, drifts = self.ledger.reconcile_positions(f"{self.gateway_name}_{market}", positions, seq)
+        for drift in drifts:
+            self.gateway.write_log(drift)
+
+        for pos in positions:
+            self.gateway.on_position(pos)
+
+    def on_order_result(self, market: Market, ret: int, data: Any) -> None:
+        """处理委托查询结果"""
+        if ret != RET_OK:
+            self.gateway.write_log(f"委托查询失败: {market} {data}")
+            return
+
+        if data.empty:
+            return
+
+        self.process_order(data)
+
+    def on_trade_result(self, market: Market, ret: int, data: Any) -> None:
+        """处理成交查询结果"""
+        if ret != RET_OK:
+            self.gateway.write_log(f"成交查询失败: {market} {data}")
+            return
+
+        if data.empty:
+            return
+
+        self.process_deal(data)
+
+    def process_order(self, data: DataFrame) -> None:
+        """处理SDK返回的委托数据"""
+        for record in convert_records(data, FutuOrderRecord):
+            self.process_order_record(record)
+
+    def process_order_record(self, record: FutuOrderRecord) -> None:
+        """处理委托数据"""
+        # 过滤已删除的委托
+        if record.order_status == OrderStatus.DELETED:
+            return
+
+        # 关联本地委托号
+        orderid: Optional[str] = self.match_orderid(self.process_order_record, record)
+        if not orderid:
+            return
 
+        # 解析代码
+        symbol, exchange = self.convert_symbol_futu2vt(record.code)
+
+        # 创建委托数据
+        order = OrderData(
+            symbol=symbol,
+            exchange=exchange,
+            orderid=orderid,
+            direction=DIRECTION_FUTU2VT.get(record.trd_side, Direction.LONG),
+            price=record.price,
+            volume=record.qty,
+            traded=record.dealt_qty,
+            status=STATUS_FUTU2VT.get(record.order_status, Status.SUBMITTING),
+            datetime=self.generate_datetime(record.create_time),
+            gateway_name=self.gateway_name
+        )
+
+        with self.order_lock:
             self.orders[orderid] = order
-            self.gateway.on_order(copy(order))
+        self.gateway.on_order(copy(order))
 
-    def process_deal(self, data: dict) -> None:
-        """处理成交数据"""
-        for _, row in data.iterrows():
-            # 过滤重复成交推送
-            tradeid = str(row["deal_id"])
-            if tradeid in self.trades:
-                continue
+        # 卖出委托变化时更新持仓冻结数量
+        pos: Optional[PositionData] = self.ledger.on_order(order, self.get_accountid(exchange))
+        if pos:
+            self.gateway.on_position(pos)
+
+    def process_deal(self, data: DataFrame) -> None:
+        """处理成交查询结果，查询到的成交已计入券商持仓，不更新本地账本"""
+        for record in convert_records(data, FutuDealRecord):
+            self.process_deal_record(record, False)
+
+    def process_deal_record(self, record: FutuDealRecord, push: bool = True) -> None:
+        """处理成交数据，push为True时为成交推送，同时更新本地账本"""
+        # 关联本地委托号
+        orderid: Optional[str] = self.match_orderid(partial(self.process_deal_record, push=push), record)
+        if not orderid:
+            return
 
-            self.trades.add(tradeid)
+        # 过滤重复成交推送
+        tradeid: str = record.deal_id
+        if tradeid in self.trades:
+            return
 
-            # 解析代码
-            code = row["code"]
-            symbol, exchange = self.convert_symbol_futu2vt(code)
+        self.trades.add(tradeid)
+
+        # 解析代码
+        symbol, exchange = self.convert_symbol_futu2vt(record.code)
+
+        # 创建成交数据
+        trade = TradeData(
+            symbol=symbol,
+            exchange=exchange,
+            direction=DIRECTION_FUTU2VT.get(record.trd_side, Direction.LONG),
+            tradeid=tradeid,
+            orderid=orderid,
+            price=record.price,
+            volume=record.qty,
+            datetime=self.generate_datetime(record.create_time),
+            gateway_name=self.gateway_name
+        )
 
-            # 创建成交数据
-            trade = TradeData(
-                symbol=symbol,
-                exchange=exchange,
-                direction=DIRECTION_FUTU2VT.get(row["trd_side"], Direction.LONG),
-                tradeid=tradeid,
-                orderid=str(row["order_id"]),
-                price=float(row["price"]),
-                volume=float(row["qty"]),
-                datetime=self.generate_datetime(row["create_time"]),
-                gateway_name=self.gateway_name
-            )
+        self.gateway.on_trade(trade)
 
-            self.gateway.on_trade(trade)
+        # 成交推送到达后立即更新持仓和现金
+        if push:
+            pos: PositionData = self.ledger.on_trade(trade, self.get_accountid(exchange))
+            self.gateway.on_position(pos)
 
     def generate_datetime(self, s: str) -> datetime:
         """生成时间戳"""
@@ -0,0 +1,174 @@
+"""
+富途本地持仓资金账本
+
+成交推送到达时立即更新持仓数量、持仓均价和账户现金，委托状态变化时更新持仓冻结数量，
+不再依赖定时查询刷新持仓。券商查询结果用于低频核对：
+    每个账户第一次查询结果作为初始值，不做比较；
+    之后比较本地与券商的持仓数量和现金，差异写入日志后以券商数据为准；
+    查询发出后又有成交的合约和账户跳过本次核对，避免把尚未计入券商结果的成交当作差异。
+
+购买力随保证金比例变化，无法由成交金额推算，因此账本只按成交金额更新现金（cash字段），
+手续费不计入账本，核对现金时按上次核对后的成交金额放宽容差。
+"""
+
+from copy import copy
+from threading import Lock
+from typing import Dict, List, Optional, Set, Tuple
+
+from vnpy.trader.constant import Direction, Exchange
+from vnpy.trader.object import OrderData, PositionData, TradeData
+
+
+POSITION_TOLERANCE: float = 1e-6        # 持仓数量核对的容差
+CASH_TOLERANCE: float = 0.01            # 现金核对的容差
+FEE_RATE: float = 0.003                 # 每笔成交按成交金额预留的手续费容差比例
+FEE_MINIMUM: float = 50                 # 每笔成交预留的最低手续费容差
+
+
+class FutuLedger:
+    """按成交增量更新的持仓资金账本，方法返回需要推送的数据副本"""
+
+    def __init__(self, gateway_name: str) -> None:
+        """构造函数"""
+        self.gateway_name: str = gateway_name
+
+        self.positions: Dict[str, PositionData] = {}            # vt_symbol -> 持仓
+        self.position_accounts: Dict[str, str] = {}             # vt_symbol -> 账户编号
+        self.cashes: Dict[str, float] = {}                      # 账户编号 -> 现金
+        self.fee_allowances: Dict[str, float] = {}              # 账户编号 -> 上次核对后累计的手续费容差
+        self.order_frozen: Dict[str, float] = {}                # vt_orderid -> 活动卖出委托的剩余数量
+
+        # 成交序号，用于判断查询发出后是否又有成交
+        self.seq: int = 0
+        self.symbol_seqs: Dict[str, int] = {}
+        self.account_seqs: Dict[str, int] = {}
+        self.reconciled: Set[str] = set()
+
+        self.lock: Lock = Lock()
+
+    def get_position(self, symbol: str, exchange: Exchange, accountid: str) -> PositionData:
+        """获取持仓，不存在时创建空持仓"""
+        vt_symbol: str = f"{symbol}.{exchange.value}"
+        position: Optional[PositionData] = self.positions.get(vt_symbol, None)
+        if not position:
+            position = PositionData(
+                symbol=symbol,
+                exchange=exchange,
+                direction=Direction.LONG,   # 富途持仓默认为多头
+                gateway_name=self.gateway_name
+            )
+            self.positions[vt_symbol] = position
+            self.position_accounts[vt_symbol] = accountid
+        return position
+
+    def on_trade(self, trade: TradeData, accountid: str) -> PositionData:
+        """成交后更新持仓和现金，返回持仓"""
+        with self.lock:
+            self.seq += 1
+            self.symbol_seqs[trade.vt_symbol] = self.seq
+            self.account_seqs[accountid] = self.seq
+
+            position: PositionData = self.get_position(trade.symbol, trade.exchange, accountid)
+            notional: float = trade.price * trade.volume
+
+            if trade.direction == Direction.LONG:
+                volume: float = position.volume + trade.volume
+                if volume > 0 and position.volume >= 0:
+                    position.price = (position.price * position.volume + notional) / volume
+                position.volume = volume
+                cash_change: float = -notional
+            else:
+                position.volume -= trade.volume
+                cash_change = notional
+
+            if not position.volume:
+                position.price = 0
+
+            if accountid in self.cashes:
+                self.cashes[accountid] += cash_change
+                self.fee_allowances[accountid] += max(notional * FEE_RATE, FEE_MINIMUM)
+
+            return copy(position)
+
+    def on_order(self, order: OrderData, accountid: str) -> Optional[PositionData]:
+        """委托状态变化后更新持仓冻结数量，冻结数量变化时返回持仓"""
+        if order.direction != Direction.SHORT:
+            return None
+
+        with self.lock:
+            previous: float = self.order_frozen.pop(order.vt_orderid, 0)
+            remaining: float = order.volume - order.traded if order.is_active() else 0
+            if remaining:
+                self.order_frozen[order.vt_orderid] = remaining
+
+            if remaining == previous:
+                return None
+
+            position: PositionData = self.get_position(order.symbol, order.exchange, accountid)
+            position.frozen += remaining - previous
+            return copy(position)
+
+    def mark(self) -> int:
+        """返回查询发出时的成交序号，核对该查询结果时传入"""
+        with self.lock:
+            return self.seq
+
+    def reconcile_positions(
+        self,
+        accountid: str,
+        positions: List[PositionData],
+        seq: int
+    ) -> Tuple[List[PositionData], List[str]]:
+        """用券商持仓核对账户的本地持仓，seq为查询发出时mark返回的序号，返回(需要推送的持仓, 差异说明)"""
+        with self.lock:
+            first: bool = accountid not in self.reconciled
+            self.reconciled.add(accountid)
+
+            broker: Dict[str, PositionData] = {position.vt_symbol: position for position in positions}
+
+            # 券商没有返回的本地持仓视为已清空
+            for vt_symbol, position in self.positions.items():
+                if vt_symbol not in broker and self.position_accounts[vt_symbol] == accountid and position.volume:
+                    empty: PositionData = copy(position)
+                    empty.volume = 0
+                    empty.frozen = 0
+                    empty.price = 0
+                    empty.pnl = 0
+                    broker[vt_symbol] = empty
+
+            updated: List[PositionData] = []
+            drifts: List[str] = []
+
+            for vt_symbol, position in broker.items():
+                # 查询发出后又有成交，本次不核对
+                if not first and self.symbol_seqs.get(vt_symbol, 0) > seq:
+                    continue
+
+                local: Optional[PositionData] = self.positions.get(vt_symbol, None)
+                local_volume: float = local.volume if local else 0
+                if not first and abs(local_volume - position.volume) > POSITION_TOLERANCE:
+                    drifts.append(f"持仓核对差异: {vt_symbol} 本地{local_volume} 券商{position.volume}")
+
+                self.positions[vt_symbol] = copy(position)
+                self.position_accounts[vt_symbol] = accountid
+                updated.append(copy(position))
+
+            return updated, drifts
+
+    def reconcile_account(self, accountid: str, cash: float, seq: int) -> List[str]:
+        """用券商现金核对本地现金，seq为查询发出时mark返回的序号，返回差异说明，查询发出后有成交时本次不核对"""
+        with self.lock:
+            local: Optional[float] = self.cashes.get(accountid, None)
+
+            if local is not None and self.account_seqs.get(accountid, 0) > seq:
+                return []
+
+            drifts: List[str] = []
+            if local is not None:
+                tolerance: float = CASH_TOLERANCE + self.fee_allowances[accountid]
+                if abs(local - cash) > tolerance:
+                    drifts.append(f"资金核对差异: {accountid} 本地{local:.2f} 券商{cash:.2f}")
+
+            self.cashes[accountid] = cash
+            self.fee_allowances[accountid] = 0
+            return drifts
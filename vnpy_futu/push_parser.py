@@ -0,0 +1,351 @@
+"""
+富途推送快速解析
+
+直接读取推送的protobuf字段生成__slots__记录，不经过SDK的DataFrame转换。
+SDK解析得到的字典也可以通过from_dict转换为同样的记录，两种方式共用后续处理。
+"""
+
+from datetime import datetime
+from operator import attrgetter
+from typing import Any, Callable, Dict, List, Tuple
+
+import pytz
+
+from futu import RET_OK, RET_ERROR, TrdSide, OrderStatus
+from futu.common.utils import merge_qot_mkt_stock_str, merge_trd_mkt_stock_str
+
+
+CHINA_TZ = pytz.timezone("Asia/Shanghai")
+
+# 盘口档位对应的Tick属性名
+TICK_DEPTH: int = 5
+BID_PRICE_ATTRS: Tuple[str, ...] = tuple(f"bid_price_{n}" for n in range(1, TICK_DEPTH + 1))
+BID_VOLUME_ATTRS: Tuple[str, ...] = tuple(f"bid_volume_{n}" for n in range(1, TICK_DEPTH + 1))
+ASK_PRICE_ATTRS: Tuple[str, ...] = tuple(f"ask_price_{n}" for n in range(1, TICK_DEPTH + 1))
+ASK_VOLUME_ATTRS: Tuple[str, ...] = tuple(f"ask_volume_{n}" for n in range(1, TICK_DEPTH + 1))
+EMPTY_DEPTH: Tuple[float, ...] = (0,) * TICK_DEPTH
+
+# 行情推送字段映射：Tick属性 <- 推送记录字段
+QUOTE_FIELD_MAP: Tuple[Tuple[str, str], ...] = (
+    ("open_price", "open_price"),
+    ("high_price", "high_price"),
+    ("low_price", "low_price"),
+    ("pre_close", "prev_close_price"),
+    ("last_price", "last_price"),
+    ("volume", "volume"),
+    ("turnover", "turnover"),
+)
+QUOTE_ATTRS: Tuple[str, ...] = tuple(attr for attr, _ in QUOTE_FIELD_MAP)
+QUOTE_GETTER: Callable[[Any], tuple] = attrgetter(*(key for _, key in QUOTE_FIELD_MAP))
+
+
+class FutuQuoteRecord:
+    """报价推送记录"""
+
+    __slots__ = (
+        "code",
+        "data_date",
+        "data_time",
+        "last_price",
+        "open_price",
+        "high_price",
+        "low_price",
+        "prev_close_price",
+        "volume",
+        "turnover",
+        "price_spread",
+    )
+
+    def __init__(
+        self,
+        code: str,
+        data_date: str,
+        data_time: str,
+        last_price: float,
+        open_price: float,
+        high_price: float,
+        low_price: float,
+        prev_close_price: float,
+        volume: float,
+        turnover: float,
+        price_spread: Any
+    ) -> None:
+        """构造函数"""
+        self.code: str = code
+        self.data_date: str = data_date
+        self.data_time: str = data_time
+        self.last_price: float = last_price
+        self.open_price: float = open_price
+        self.high_price: float = high_price
+        self.low_price: float = low_price
+        self.prev_close_price: float = prev_close_price
+        self.volume: float = volume
+        self.turnover: float = turnover
+        self.price_spread: Any = price_spread
+
+    @classmethod
+    def from_pb(cls, pb: Any) -> "FutuQuoteRecord":
+        """从BasicQot生成记录"""
+        update_time: str = pb.updateTime
+        return cls(
+            merge_qot_mkt_stock_str(pb.security.market, pb.security.code),
+            update_time[:10],
+            update_time[11:],
+            pb.curPrice,
+            pb.openPrice,
+            pb.highPrice,
+            pb.lowPrice,
+            pb.lastClosePrice,
+            pb.volume,
+            pb.turnover,
+            pb.priceSpread
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict, code: str = "") -> "FutuQuoteRecord":
+        """从SDK解析的报价字典生成记录，缺少的字段填0"""
+        return cls(
+            code or data.get("code", ""),
+            data.get("data_date", ""),
+            data.get("data_time", ""),
+            data.get("last_price", 0),
+            data.get("open_price", 0),
+            data.get("high_price", 0),
+            data.get("low_price", 0),
+            data.get("prev_close_price", 0),
+            data.get("volume", 0),
+            data.get("turnover", 0),
+            data.get("price_spread", None)
+        )
+
+
+class FutuOrderBookRecord:
+    """盘口推送记录，每档为(价格, 数量, 订单数)"""
+
+    __slots__ = ("code", "bids", "asks")
+
+    def __init__(self, code: str, bids: list, asks: list) -> None:
+        """构造函数"""
+        self.code: str = code
+        self.bids: list = bids
+        self.asks: list = asks
+
+    @classmethod
+    def from_pb(cls, pb: Any) -> "FutuOrderBookRecord":
+        """从Qot_UpdateOrderBook.S2C生成记录"""
+        return cls(
+            merge_qot_mkt_stock_str(pb.security.market, pb.security.code),
+            [(level.price, level.volume, level.orederCount) for level in pb.orderBookBidList],
+            [(level.price, level.volume, level.orederCount) for level in pb.orderBookAskList]
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FutuOrderBookRecord":
+        """从SDK解析的盘口字典生成记录"""
+        return cls(data.get("code", ""), data.get("Bid", []), data.get("Ask", []))
+
+
+class FutuOrderRecord:
+    """委托推送记录"""
+
+    __slots__ = (
+        "code",
+        "order_id",
+        "trd_side",
+        "order_status",
+        "price",
+        "qty",
+        "dealt_qty",
+        "create_time",
+    )
+
+    def __init__(
+        self,
+        code: str,
+        order_id: str,
+        trd_side: str,
+        order_status: str,
+        price: float,
+        qty: float,
+        dealt_qty: float,
+        create_time: str
+    ) -> None:
+        """构造函数"""
+        self.code: str = code
+        self.order_id: str = order_id
+        self.trd_side: str = trd_side
+        self.order_status: str = order_status
+        self.price: float = price
+        self.qty: float = qty
+        self.dealt_qty: float = dealt_qty
+        self.create_time: str = create_time
+
+    @classmethod
+    def from_pb(cls, pb: Any) -> "FutuOrderRecord":
+        """从Trd_Common.Order生成记录"""
+        return cls(
+            merge_trd_mkt_stock_str(pb.secMarket, pb.code),
+            str(pb.orderIDEx),
+            TrdSide.to_string2(pb.trdSide),
+            OrderStatus.to_string2(pb.orderStatus),
+            pb.price,
+            pb.qty,
+            pb.fillQty,
+            pb.createTime
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FutuOrderRecord":
+        """从SDK解析的委托字典生成记录"""
+        return cls(
+            data["code"],
+            str(data["order_id"]),
+            data["trd_side"],
+            data["order_status"],
+            float(data["price"]),
+            float(data["qty"]),
+            float(data["dealt_qty"]),
+            data["create_time"]
+        )
+
+
+class FutuDealRecord:
+    """成交推送记录"""
+
+    __slots__ = (
+        "code",
+        "deal_id",
+        "order_id",
+        "trd_side",
+        "price",
+        "qty",
+        "create_time",
+    )
+
+    def __init__(
+        self,
+        code: str,
+        deal_id: str,
+        order_id: str,
+        trd_side: str,
+        price: float,
+        qty: float,
+        create_time: str
+    ) -> None:
+        """构造函数"""
+        self.code: str = code
+        self.deal_id: str = deal_id
+        self.order_id: str = order_id
+        self.trd_side: str = trd_side
+        self.price: float = price
+        self.qty: float = qty
+        self.create_time: str = create_time
+
+    @classmethod
+    def from_pb(cls, pb: Any) -> "FutuDealRecord":
+        """从Trd_Common.OrderFill生成记录"""
+        return cls(
+            merge_trd_mkt_stock_str(pb.secMarket, pb.code),
+            str(pb.fillID),
+            str(pb.orderIDEx) if pb.HasField("orderIDEx") else "",
+            TrdSide.to_string2(pb.trdSide),
+            pb.price,
+            pb.qty,
+            pb.createTime
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FutuDealRecord":
+        """从SDK解析的成交字典生成记录"""
+        return cls(
+            data["code"],
+            str(data["deal_id"]),
+            str(data["order_id"]),
+            data["trd_side"],
+            float(data["price"]),
+            float(data["qty"]),
+            data["create_time"]
+        )
+
+
+def parse_quote_push(rsp_pb: Any) -> Tuple[int, Any]:
+    """解析报价推送，返回记录列表"""
+    if rsp_pb.retType != RET_OK:
+        return RET_ERROR, rsp_pb.retMsg
+    return RET_OK, [FutuQuoteRecord.from_pb(pb) for pb in rsp_pb.s2c.basicQotList]
+
+
+def parse_orderbook_push(rsp_pb: Any) -> Tuple[int, Any]:
+    """解析盘口推送，返回单条记录"""
+    if rsp_pb.retType != RET_OK:
+        return RET_ERROR, rsp_pb.retMsg
+    return RET_OK, FutuOrderBookRecord.from_pb(rsp_pb.s2c)
+
+
+def parse_order_push(rsp_pb: Any) -> Tuple[int, Any]:
+    """解析委托推送，返回记录列表"""
+    if rsp_pb.retType != RET_OK:
+        return RET_ERROR, rsp_pb.retMsg
+    return RET_OK, [FutuOrderRecord.from_pb(rsp_pb.s2c.order)]
+
+
+def parse_deal_push(rsp_pb: Any) -> Tuple[int, Any]:
+    """解析成交推送，返回记录列表"""
+    if rsp_pb.retType != RET_OK:
+        return RET_ERROR, rsp_pb.retMsg
+    return RET_OK, [FutuDealRecord.from_pb(rsp_pb.s2c.orderFill)]
+
+
+def convert_records(data: Any, record_type: type) -> List[Any]:
+    """把SDK返回的DataFrame逐行转换为记录，不使用iterrows"""
+    return [record_type.from_dict(row) for row in data.to_dict("records")]
+
+
+def parse_push_datetime(date_bases: Dict[str, datetime], data_date: str, data_time: str) -> datetime:
+    """解析推送时间，交易日零点按日缓存在date_bases中，只解析当日时分秒"""
+    base: Any = date_bases.get(data_date, None)
+    if not base:
+        base = CHINA_TZ.localize(datetime.strptime(data_date, "%Y-%m-%d"))
+        date_bases.clear()
+        date_bases[data_date] = base
+
+    # data_time格式为HH:MM:SS或HH:MM:SS.fff，丢弃毫秒部分
+    return base.replace(
+        hour=int(data_time[0:2]),
+        minute=int(data_time[3:5]),
+        second=int(data_time[6:8])
+    )
+
+
+def update_tick_quote(tick: Any, record: FutuQuoteRecord, date_bases: Dict[str, datetime]) -> None:
+    """用报价记录更新Tick的时间、行情和涨跌停价格"""
+    if record.data_date and record.data_time:
+        tick.datetime = parse_push_datetime(date_bases, record.data_date, record.data_time)
+    else:
+        tick.datetime = datetime.now(CHINA_TZ)
+
+    # 按预编译的字段映射一次取出
+    tick.__dict__.update(zip(QUOTE_ATTRS, QUOTE_GETTER(record)))
+
+    spread: Any = record.price_spread
+    if spread is not None:
+        tick.limit_up = tick.last_price + spread * 10
+        tick.limit_down = tick.last_price - spread * 10
+
+
+def fill_tick_depth(
+    tick: Any,
+    bid_prices: list,
+    bid_volumes: list,
+    ask_prices: list,
+    ask_volumes: list
+) -> None:
+    """把不超过5档的价格和数量写入Tick，不足5档的补0"""
+    pad_bid: list = list(EMPTY_DEPTH[len(bid_prices):])
+    pad_ask: list = list(EMPTY_DEPTH[len(ask_prices):])
+
+    tick_dict: dict = tick.__dict__
+    tick_dict.update(zip(BID_PRICE_ATTRS, bid_prices + pad_bid))
+    tick_dict.update(zip(BID_VOLUME_ATTRS, bid_volumes + pad_bid))
+    tick_dict.update(zip(ASK_PRICE_ATTRS, ask_prices + pad_ask))
+    tick_dict.update(zip(ASK_VOLUME_ATTRS, ask_volumes + pad_ask))
@@ -0,0 +1,345 @@
+"""
+富途推送录制与回放
+
+录制的是推送解析后的记录（见push_parser），每种推送一个定长结构化格式，
+按接收日期和类型写入文件：
+    {YYYYMMDD}_quote.bin
+    {YYYYMMDD}_orderbook.bin
+    {YYYYMMDD}_order.bin
+    {YYYYMMDD}_deal.bin
+
+推送线程只把记录放入队列，由后台线程批量编码后追加写入。
+回放时内存映射文件，按接收时间合并各类型记录，
+再交给行情API和交易API的process_*_record方法处理。
+"""
+
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from queue import SimpleQueue, Empty
+from threading import Thread
+from time import time, sleep
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .push_parser import (
+    FutuQuoteRecord,
+    FutuOrderBookRecord,
+    FutuOrderRecord,
+    FutuDealRecord
+)
+
+
+RECORD_QUOTE: str = "quote"
+RECORD_ORDERBOOK: str = "orderbook"
+RECORD_ORDER: str = "order"
+RECORD_DEAL: str = "deal"
+
+RECORD_DEPTH: int = 10                  # 盘口记录保存的档位数，超出部分不录制
+RECORD_BATCH_SIZE: int = 10000          # 后台线程单次写入的最大记录数
+
+# 各类型的定长记录格式，recv_time为接收时的UTC时间
+QUOTE_RECORD_DTYPE: np.dtype = np.dtype([
+    ("recv_time", "datetime64[us]"),
+    ("code", "S24"),
+    ("data_date", "S10"),
+    ("data_time", "S12"),
+    ("last_price", "f8"),
+    ("open_price", "f8"),
+    ("high_price", "f8"),
+    ("low_price", "f8"),
+    ("prev_close_price", "f8"),
+    ("volume", "f8"),
+    ("turnover", "f8"),
+    ("price_spread", "f8"),
+])
+
+ORDERBOOK_RECORD_DTYPE: np.dtype = np.dtype([
+    ("recv_time", "datetime64[us]"),
+    ("code", "S24"),
+    ("bid_count", "i4"),
+    ("ask_count", "i4"),
+    ("bids", "f8", (RECORD_DEPTH, 3)),
+    ("asks", "f8", (RECORD_DEPTH, 3)),
+])
+
+ORDER_RECORD_DTYPE: np.dtype = np.dtype([
+    ("recv_time", "datetime64[us]"),
+    ("code", "S24"),
+    ("order_id", "S32"),
+    ("trd_side", "S16"),
+    ("order_status", "S24"),
+    ("price", "f8"),
+    ("qty", "f8"),
+    ("dealt_qty", "f8"),
+    ("create_time", "S26"),
+])
+
+DEAL_RECORD_DTYPE: np.dtype = np.dtype([
+    ("recv_time", "datetime64[us]"),
+    ("code", "S24"),
+    ("deal_id", "S32"),
+    ("order_id", "S32"),
+    ("trd_side", "S16"),
+    ("price", "f8"),
+    ("qty", "f8"),
+    ("create_time", "S26"),
+])
+
+RECORD_DTYPES: Dict[str, np.dtype] = {
+    RECORD_QUOTE: QUOTE_RECORD_DTYPE,
+    RECORD_ORDERBOOK: ORDERBOOK_RECORD_DTYPE,
+    RECORD_ORDER: ORDER_RECORD_DTYPE,
+    RECORD_DEAL: DEAL_RECORD_DTYPE,
+}
+
+
+def pad_levels(levels: list) -> list:
+    """盘口档位截断或补齐到RECORD_DEPTH档，每档只保留(价格, 数量, 订单数)"""
+    levels = [tuple(level[:3]) for level in levels[:RECORD_DEPTH]]
+    return levels + [(0, 0, 0)] * (RECORD_DEPTH - len(levels))
+
+
+def encode_quote(recv_time: int, r: FutuQuoteRecord) -> tuple:
+    """报价记录编码为定长格式"""
+    return (
+        recv_time, r.code, r.data_date, r.data_time, r.last_price, r.open_price, r.high_price,
+        r.low_price, r.prev_close_price, r.volume, r.turnover,
+        np.nan if r.price_spread is None else r.price_spread
+    )
+
+
+def encode_orderbook(recv_time: int, r: FutuOrderBookRecord) -> tuple:
+    """盘口记录编码为定长格式"""
+    return (
+        recv_time, r.code, min(len(r.bids), RECORD_DEPTH), min(len(r.asks), RECORD_DEPTH),
+        pad_levels(r.bids), pad_levels(r.asks)
+    )
+
+
+def encode_order(recv_time: int, r: FutuOrderRecord) -> tuple:
+    """委托记录编码为定长格式"""
+    return (
+        recv_time, r.code, r.order_id, r.trd_side, r.order_status,
+        r.price, r.qty, r.dealt_qty, r.create_time
+    )
+
+
+def encode_deal(recv_time: int, r: FutuDealRecord) -> tuple:
+    """成交记录编码为定长格式"""
+    return (
+        recv_time, r.code, r.deal_id, r.order_id, r.trd_side,
+        r.price, r.qty, r.create_time
+    )
+
+
+def decode_quote(row: np.void) -> FutuQuoteRecord:
+    """定长格式解码为报价记录"""
+    price_spread: float = float(row["price_spread"])
+    return FutuQuoteRecord(
+        row["code"].decode(),
+        row["data_date"].decode(),
+        row["data_time"].decode(),
+        float(row["last_price"]),
+        float(row["open_price"]),
+        float(row["high_price"]),
+        float(row["low_price"]),
+        float(row["prev_close_price"]),
+        float(row["volume"]),
+        float(row["turnover"]),
+        None if np.isnan(price_spread) else price_spread
+    )
+
+
+def decode_orderbook(row: np.void) -> FutuOrderBookRecord:
+    """定长格式解码为盘口记录"""
+    return FutuOrderBookRecord(
+        row["code"].decode(),
+        [tuple(level) for level in row["bids"][:row["bid_count"]].tolist()],
+        [tuple(level) for level in row["asks"][:row["ask_count"]].tolist()]
+    )
+
+
+def decode_order(row: np.void) -> FutuOrderRecord:
+    """定长格式解码为委托记录"""
+    return FutuOrderRecord(
+        row["code"].decode(),
+        row["order_id"].decode(),
+        row["trd_side"].decode(),
+        row["order_status"].decode(),
+        float(row["price"]),
+        float(row["qty"]),
+        float(row["dealt_qty"]),
+        row["create_time"].decode()
+    )
+
+
+def decode_deal(row: np.void) -> FutuDealRecord:
+    """定长格式解码为成交记录"""
+    return FutuDealRecord(
+        row["code"].decode(),
+        row["deal_id"].decode(),
+        row["order_id"].decode(),
+        row["trd_side"].decode(),
+        float(row["price"]),
+        float(row["qty"]),
+        row["create_time"].decode()
+    )
+
+
+ENCODERS: Dict[str, Callable[[int, Any], tuple]] = {
+    RECORD_QUOTE: encode_quote,
+    RECORD_ORDERBOOK: encode_orderbook,
+    RECORD_ORDER: encode_order,
+    RECORD_DEAL: encode_deal,
+}
+
+DECODERS: Dict[str, Callable[[np.void], Any]] = {
+    RECORD_QUOTE: decode_quote,
+    RECORD_ORDERBOOK: decode_orderbook,
+    RECORD_ORDER: decode_order,
+    RECORD_DEAL: decode_deal,
+}
+
+
+class FutuRecorder:
+    """推送录制，后台线程按日期和类型追加写入定长记录"""
+
+    def __init__(self, path: Path) -> None:
+        """构造函数，启动写入线程"""
+        self.path: Path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        self.queue: SimpleQueue = SimpleQueue()
+        self.active: bool = True
+
+        self.thread: Thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def record(self, kind: str, record: Any) -> None:
+        """记录一条推送，只放入队列"""
+        self.queue.put((kind, time(), record))
+
+    def run(self) -> None:
+        """写入线程，队列为空且已停止时退出"""
+        while True:
+            try:
+                items: List[Tuple[str, float, Any]] = [self.queue.get(timeout=0.5)]
+            except Empty:
+                if not self.active:
+                    return
+                continue
+
+            while len(items) < RECORD_BATCH_SIZE:
+                try:
+                    items.append(self.queue.get_nowait())
+                except Empty:
+                    break
+
+            self.write(items)
+
+    def write(self, items: List[Tuple[str, float, Any]]) -> None:
+        """按(日期, 类型)分组编码后追加到文件"""
+        groups: Dict[Tuple[str, str], List[tuple]] = {}
+
+        for kind, recv_time, record in items:
+            day: str = datetime.fromtimestamp(recv_time).strftime("%Y%m%d")
+            row: tuple = ENCODERS[kind](round(recv_time * 1_000_000), record)
+            groups.setdefault((day, kind), []).append(row)
+
+        for (day, kind), rows in groups.items():
+            array: np.ndarray = np.array(rows, dtype=RECORD_DTYPES[kind])
+            with open(self.path.joinpath(f"{day}_{kind}.bin"), "ab") as f:
+                f.write(array.tobytes())
+
+    def close(self) -> None:
+        """写完队列中剩余的记录后停止"""
+        self.active = False
+        self.thread.join()
+
+
+class FutuReplayer:
+    """录制文件回放"""
+
+    def __init__(self, path: Path) -> None:
+        """构造函数"""
+        self.path: Path = Path(path)
+
+    def load(self, day: date, kind: str) -> np.ndarray:
+        """内存映射某日某类型的录制文件，忽略末尾未写完整的记录"""
+        dtype: np.dtype = RECORD_DTYPES[kind]
+        file_path: Path = self.path.joinpath(f"{day:%Y%m%d}_{kind}.bin")
+        if not file_path.exists():
+            return np.empty(0, dtype=dtype)
+
+        count: int = file_path.stat().st_size // dtype.itemsize
+        if not count:
+            return np.empty(0, dtype=dtype)
+
+        return np.memmap(file_path, dtype=dtype, mode="r", shape=(count,))
+
+    def replay(
+        self,
+        start: date,
+        end: date,
+        quote_api: Any = None,
+        trade_api: Any = None,
+        speed: float = 0
+    ) -> int:
+        """
+        按接收时间顺序回放[start, end]日期的录制记录，返回回放条数。
+
+        报价和盘口交给quote_api，委托和成交交给trade_api，为None时跳过对应类型。
+        speed为0时尽快回放，为1时按原始间隔回放，大于1时按倍速回放。
+
+        回放会改写API内的Tick、委托、成交和账本状态并推送事件，
+        因此只接受单独创建的API，不能使用网关正在使用的quote_api和trade_api，
+        建议绑定到使用独立事件引擎的回放网关。
+        """
+        if quote_api and quote_api.gateway.quote_api is quote_api:
+            raise ValueError("回放不能使用网关正在使用的行情API，请传入单独创建的FutuQuoteApi")
+        if trade_api and trade_api.gateway.trade_api is trade_api:
+            raise ValueError("回放不能使用网关正在使用的交易API，请传入单独创建的FutuTradeApi")
+
+        handlers: Dict[str, Optional[Callable[[Any], None]]] = {
+            RECORD_QUOTE: quote_api.process_quote_record if quote_api else None,
+            RECORD_ORDERBOOK: quote_api.process_orderbook_record if quote_api else None,
+            RECORD_ORDER: trade_api.process_order_record if trade_api else None,
+            RECORD_DEAL: trade_api.process_deal_record if trade_api else None,
+        }
+        kinds: List[str] = [kind for kind, handler in handlers.items() if handler]
+
+        count: int = 0
+        first_time: Optional[int] = None
+        begin: float = time()
+
+        day: date = start
+        while day <= end:
+            arrays: List[np.ndarray] = [self.load(day, kind) for kind in kinds]
+            day += timedelta(days=1)
+
+            # 按接收时间稳定排序，合并各类型记录
+            times: np.ndarray = np.concatenate([a["recv_time"].astype(np.int64) for a in arrays])
+            if not len(times):
+                continue
+
+            sources: np.ndarray = np.concatenate([np.full(len(a), i) for i, a in enumerate(arrays)])
+            positions: np.ndarray = np.concatenate([np.arange(len(a)) for a in arrays])
+            order: np.ndarray = np.argsort(times, kind="stable")
+
+            for ix in order.tolist():
+                recv_time: int = int(times[ix])
+                kind: str = kinds[sources[ix]]
+
+                if speed > 0:
+                    if first_time is None:
+                        first_time = recv_time
+                    wait: float = (recv_time - first_time) / 1_000_000 / speed - (time() - begin)
+                    if wait > 0:
+                        sleep(wait)
+
+                row: np.void = arrays[sources[ix]][positions[ix]]
+                handlers[kind](DECODERS[kind](row))
+                count += 1
+
+        return count
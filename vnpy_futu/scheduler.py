@@ -0,0 +1,251 @@
+"""
+富途请求调度
+
+所有会触发OpenD频率限制的请求都提交到调度器，由固定数量的工作线程执行：
+    每个接口一个令牌桶，令牌在发放period秒后归还，与富途按30秒滑动窗口计数的规则一致；
+    请求按优先级排队（撤单 > 下单 > 查询 > 历史数据），同一优先级内同一接口先进先出；
+    工作线程只取令牌可用的请求，令牌不足的请求不占用线程，也不阻塞其他接口的请求；
+    预留部分工作线程只给撤单和下单使用，避免被耗时的查询占满。
+
+接口名称可以带".会话"后缀（如"place_order.HK"），不同会话各自计数，
+频率限制按"."之前的接口名称查找，未配置限制的接口不限频率。
+
+调度器关闭时取消排队中的请求（Future抛出CancelledError），
+关闭后提交的请求直接返回失败的Future，不再重新启动工作线程。
+"""
+
+from collections import deque
+from concurrent.futures import Future
+from threading import Thread, Condition
+from time import time
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+
+PRIORITY_CANCEL: int = 0        # 撤单
+PRIORITY_PLACE: int = 1         # 下单、改单
+PRIORITY_QUERY: int = 2         # 账户、持仓、委托、成交、合约信息查询
+PRIORITY_HISTORY: int = 3       # 历史数据
+PRIORITY_NAMES: Tuple[str, ...] = ("cancel", "place", "query", "history")
+
+SCHEDULER_WORKERS: int = 16     # 默认工作线程数
+SCHEDULER_RESERVED: int = 2     # 只给撤单和下单使用的工作线程数
+
+
+class FutuTokenBucket:
+    """令牌桶，窗口内最多发放limit个令牌，每个令牌在发放period秒后归还"""
+
+    def __init__(self, limit: int, period: float = 30) -> None:
+        """构造函数"""
+        self.limit: int = limit
+        self.period: float = period
+        self.records: Deque[float] = deque()
+
+    def wait_time(self, now: float) -> float:
+        """距离下一个令牌可用的秒数，有令牌时为0"""
+        while self.records and now - self.records[0] >= self.period:
+            self.records.popleft()
+
+        if len(self.records) < self.limit:
+            return 0
+        return self.period - (now - self.records[0])
+
+    def take(self, now: float) -> None:
+        """取走一个令牌"""
+        self.records.append(now)
+
+
+class FutuScheduledRequest:
+    """排队中的请求"""
+
+    __slots__ = ("endpoint", "priority", "func", "args", "kwargs", "future", "submit_time")
+
+    def __init__(
+        self,
+        endpoint: str,
+        priority: int,
+        func: Callable,
+        args: tuple,
+        kwargs: dict
+    ) -> None:
+        """构造函数"""
+        self.endpoint: str = endpoint
+        self.priority: int = priority
+        self.func: Callable = func
+        self.args: tuple = args
+        self.kwargs: dict = kwargs
+        self.future: Future = Future()
+        self.submit_time: float = time()
+
+
+class FutuRequestScheduler:
+    """按优先级和接口频率限制执行请求的调度器，工作线程在首次提交时启动"""
+
+    def __init__(
+        self,
+        limits: Dict[str, int],
+        period: float = 30,
+        workers: int = SCHEDULER_WORKERS,
+        reserved: int = SCHEDULER_RESERVED
+    ) -> None:
+        """构造函数"""
+        self.limits: Dict[str, int] = limits
+        self.period: float = period
+        self.workers: int = workers
+        self.reserved: int = min(reserved, workers - 1)
+
+        self.buckets: Dict[str, FutuTokenBucket] = {}
+        self.queues: List[Deque[FutuScheduledRequest]] = [deque() for _ in PRIORITY_NAMES]
+        self.condition: Condition = Condition()
+        self.threads: List[Thread] = []
+        self.idle: int = 0
+        self.active: bool = False
+        self.closed: bool = False
+
+        # 各优先级的统计：请求数、累计等待秒数、最长等待秒数
+        self.counts: List[int] = [0] * len(PRIORITY_NAMES)
+        self.wait_totals: List[float] = [0.0] * len(PRIORITY_NAMES)
+        self.wait_maxes: List[float] = [0.0] * len(PRIORITY_NAMES)
+
+    def submit(self, endpoint: str, priority: int, func: Callable, *args: Any, **kwargs: Any) -> Future:
+        """提交请求，返回Future，调度器已关闭时返回失败的Future"""
+        request: FutuScheduledRequest = FutuScheduledRequest(endpoint, priority, func, args, kwargs)
+
+        with self.condition:
+            if self.closed:
+                request.future.set_exception(RuntimeError(f"请求调度器已关闭: {endpoint}"))
+                return request.future
+
+            if not self.active:
+                self.start()
+
+            self.queues[priority].append(request)
+            self.condition.notify()
+
+        return request.future
+
+    def call(self, endpoint: str, priority: int, func: Callable, *args: Any, **kwargs: Any) -> Any:
+        """提交请求并等待返回"""
+        return self.submit(endpoint, priority, func, *args, **kwargs).result()
+
+    def start(self) -> None:
+        """启动工作线程，调用时已持有condition"""
+        self.active = True
+        self.idle = self.workers
+        self.threads = [Thread(target=self.run, daemon=True) for _ in range(self.workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def close(self) -> None:
+        """停止工作线程，取消尚未执行的请求，之后不再接受新请求"""
+        with self.condition:
+            self.closed = True
+            if not self.active:
+                return
+
+            self.active = False
+            for queue in self.queues:
+                while queue:
+                    queue.popleft().future.cancel()
+            self.condition.notify_all()
+
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def run(self) -> None:
+        """工作线程，取出令牌可用的最高优先级请求执行"""
+        while True:
+            with self.condition:
+                while True:
+                    if not self.active:
+                        return
+
+                    request, wait = self.pop_request(time())
+                    if request:
+                        break
+                    self.condition.wait(wait)
+
+                self.idle -= 1
+
+            if request.future.set_running_or_notify_cancel():
+                try:
+                    request.future.set_result(request.func(*request.args, **request.kwargs))
+                except BaseException as e:
+                    request.future.set_exception(e)
+
+            with self.condition:
+                self.idle += 1
+                self.condition.notify()
+
+    def pop_request(self, now: float) -> Tuple[Optional[FutuScheduledRequest], Optional[float]]:
+        """
+        取出可执行的请求，调用时已持有condition。
+
+        没有可执行的请求时返回(None, 等待秒数)，等待秒数为None时表示等到有新请求。
+        """
+        wait: Optional[float] = None
+        blocked: set = set()
+
+        for priority, queue in enumerate(self.queues):
+            # 空闲线程不多时只执行撤单和下单
+            if priority > PRIORITY_PLACE and self.idle <= self.reserved:
+                break
+
+            for request in queue:
+                if request.endpoint in blocked:
+                    continue
+
+                bucket: Optional[FutuTokenBucket] = self.get_bucket(request.endpoint)
+                if bucket:
+                    bucket_wait: float = bucket.wait_time(now)
+                    if bucket_wait:
+                        # 同一接口先进先出，令牌不足时跳过该接口后续的请求
+                        blocked.add(request.endpoint)
+                        wait = bucket_wait if wait is None else min(wait, bucket_wait)
+                        continue
+                    bucket.take(now)
+
+                queue.remove(request)
+                self.record_wait(priority, now - request.submit_time)
+                return request, None
+
+        return None, wait
+
+    def get_bucket(self, endpoint: str) -> Optional[FutuTokenBucket]:
+        """获取接口的令牌桶，未配置频率限制时返回None"""
+        bucket: Optional[FutuTokenBucket] = self.buckets.get(endpoint, None)
+        if bucket:
+            return bucket
+
+        limit: Optional[int] = self.limits.get(endpoint.split(".")[0], None)
+        if not limit:
+            return None
+
+        bucket = FutuTokenBucket(limit, self.period)
+        self.buckets[endpoint] = bucket
+        return bucket
+
+    def record_wait(self, priority: int, wait: float) -> None:
+        """记录请求的排队等待时间"""
+        self.counts[priority] += 1
+        self.wait_totals[priority] += wait
+        self.wait_maxes[priority] = max(self.wait_maxes[priority], wait)
+
+    def get_metrics(self) -> Dict[str, Dict[str, float]]:
+        """
+        各优先级的调度统计：
+            depth: 当前排队请求数
+            count: 已执行请求数
+            avg_wait: 平均排队等待秒数
+            max_wait: 最长排队等待秒数
+        """
+        with self.condition:
+            return {
+                name: {
+                    "depth": len(self.queues[priority]),
+                    "count": self.counts[priority],
+                    "avg_wait": self.wait_totals[priority] / self.counts[priority] if self.counts[priority] else 0,
+                    "max_wait": self.wait_maxes[priority],
+                }
+                for priority, name in enumerate(PRIORITY_NAMES)
+            }
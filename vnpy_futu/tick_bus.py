@@ -0,0 +1,176 @@
+"""
+富途行情共享内存总线
+
+共享内存布局：
+    [0, 64)     头部：已写入总条数(int64)、槽位数(int64)
+    [64, ...)   TICK_BUS_DTYPE结构的环形槽位数组
+
+发布方每写入一条，第n条(从1开始)写到槽位(n - 1) % 槽位数，
+写入前先把槽位序号清零，写完再填入n，最后更新头部总条数。
+读取方只读映射后按序号轮询，序号不符的槽位视为已被覆盖或正在写入。
+"""
+
+from threading import Lock
+from multiprocessing import shared_memory
+from multiprocessing import resource_tracker
+from typing import Tuple
+
+import numpy as np
+
+from vnpy.trader.object import TickData
+
+
+TICK_BUS_DEPTH: int = 5                 # 每条记录包含的盘口档位数
+TICK_BUS_CAPACITY: int = 65536          # 默认槽位数
+TICK_BUS_HEADER: int = 64               # 头部字节数，槽位数组从这里开始
+
+# 共享内存槽位格式，时间为UTC微秒
+TICK_BUS_DTYPE: np.dtype = np.dtype([
+    ("sequence", "i8"),
+    ("vt_symbol", "S32"),
+    ("datetime", "datetime64[us]"),
+    ("last_price", "f8"),
+    ("last_volume", "f8"),
+    ("volume", "f8"),
+    ("turnover", "f8"),
+    ("open_price", "f8"),
+    ("high_price", "f8"),
+    ("low_price", "f8"),
+    ("pre_close", "f8"),
+    ("bid_price", "f8", (TICK_BUS_DEPTH,)),
+    ("bid_volume", "f8", (TICK_BUS_DEPTH,)),
+    ("ask_price", "f8", (TICK_BUS_DEPTH,)),
+    ("ask_volume", "f8", (TICK_BUS_DEPTH,)),
+])
+
+# 除序号外的数据字段，写入数据时不改动序号
+TICK_BUS_FIELDS: list = list(TICK_BUS_DTYPE.names[1:])
+
+BID_PRICE_ATTRS: Tuple[str, ...] = tuple(f"bid_price_{n}" for n in range(1, TICK_BUS_DEPTH + 1))
+BID_VOLUME_ATTRS: Tuple[str, ...] = tuple(f"bid_volume_{n}" for n in range(1, TICK_BUS_DEPTH + 1))
+ASK_PRICE_ATTRS: Tuple[str, ...] = tuple(f"ask_price_{n}" for n in range(1, TICK_BUS_DEPTH + 1))
+ASK_VOLUME_ATTRS: Tuple[str, ...] = tuple(f"ask_volume_{n}" for n in range(1, TICK_BUS_DEPTH + 1))
+
+
+def attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """连接已存在的共享内存，不登记到resource_tracker，避免读取进程退出时删除共享内存"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm: shared_memory.SharedMemory = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class FutuTickBus:
+    """共享内存行情发布方，同一总线只能有一个发布方"""
+
+    def __init__(self, name: str, capacity: int = TICK_BUS_CAPACITY) -> None:
+        """构造函数，创建共享内存，同名的旧总线会被替换"""
+        self.name: str = name
+        self.capacity: int = capacity
+
+        size: int = TICK_BUS_HEADER + capacity * TICK_BUS_DTYPE.itemsize
+        try:
+            self.shm: shared_memory.SharedMemory = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            old: shared_memory.SharedMemory = shared_memory.SharedMemory(name)
+            old.close()
+            old.unlink()
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+
+        self.header: np.ndarray = np.ndarray(2, dtype=np.int64, buffer=self.shm.buf)
+        self.header[:] = (0, capacity)
+
+        self.slots: np.ndarray = np.ndarray(capacity, dtype=TICK_BUS_DTYPE, buffer=self.shm.buf, offset=TICK_BUS_HEADER)
+
+        self.lock: Lock = Lock()
+
+    def publish(self, tick: TickData) -> None:
+        """写入一条Tick"""
+        record: tuple = (
+            tick.vt_symbol.encode(),
+            np.datetime64(round(tick.datetime.timestamp() * 1_000_000), "us"),
+            tick.last_price,
+            tick.last_volume,
+            tick.volume,
+            tick.turnover,
+            tick.open_price,
+            tick.high_price,
+            tick.low_price,
+            tick.pre_close,
+            [getattr(tick, attr) for attr in BID_PRICE_ATTRS],
+            [getattr(tick, attr) for attr in BID_VOLUME_ATTRS],
+            [getattr(tick, attr) for attr in ASK_PRICE_ATTRS],
+            [getattr(tick, attr) for attr in ASK_VOLUME_ATTRS],
+        )
+
+        with self.lock:
+            n: int = int(self.header[0]) + 1
+            ix: int = (n - 1) % self.capacity
+
+            # 先单独把序号清零表示正在写入，再写入数据，最后填入序号
+            slot: np.ndarray = self.slots[ix:ix + 1]
+            slot["sequence"] = 0
+            slot[TICK_BUS_FIELDS] = record
+            slot["sequence"] = n
+            self.header[0] = n
+
+    def close(self) -> None:
+        """关闭并删除共享内存"""
+        del self.header
+        del self.slots
+        self.shm.close()
+        self.shm.unlink()
+
+
+class FutuTickBusReader:
+    """共享内存行情读取方，可在其他进程中使用"""
+
+    def __init__(self, name: str) -> None:
+        """构造函数，连接发布方创建的共享内存"""
+        self.name: str = name
+        self.shm: shared_memory.SharedMemory = attach_shared_memory(name)
+
+        self.header: np.ndarray = np.ndarray(2, dtype=np.int64, buffer=self.shm.buf)
+        self.capacity: int = int(self.header[1])
+
+        self.slots: np.ndarray = np.ndarray(
+            self.capacity, dtype=TICK_BUS_DTYPE, buffer=self.shm.buf, offset=TICK_BUS_HEADER
+        )
+        self.slots.flags.writeable = False
+
+        # 读取太慢被覆盖而丢失的记录数
+        self.dropped: int = 0
+
+    def get_sequence(self) -> int:
+        """获取发布方已写入的总条数"""
+        return int(self.header[0])
+
+    def read(self, sequence: int) -> Tuple[np.ndarray, int]:
+        """读取第sequence条之后的新记录，返回记录数组拷贝和下次读取的起点"""
+        head: int = int(self.header[0])
+        if head <= sequence:
+            return np.empty(0, dtype=TICK_BUS_DTYPE), sequence
+
+        # 落后超过一圈时，跳过已被覆盖的部分
+        start: int = max(sequence, head - self.capacity)
+        self.dropped += start - sequence
+
+        expected: np.ndarray = np.arange(start + 1, head + 1)
+        index: np.ndarray = (expected - 1) % self.capacity
+        records: np.ndarray = self.slots[index]
+
+        # 复制前后的序号都要符合，否则记录在复制期间被改写
+        valid: np.ndarray = (records["sequence"] == expected) & (self.slots["sequence"][index] == expected)
+        if not valid.all():
+            self.dropped += int((~valid).sum())
+            records = records[valid]
+
+        return records, head
+
+    def close(self) -> None:
+        """断开共享内存"""
+        del self.header
+        del self.slots
+        self.shm.close()